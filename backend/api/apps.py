@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals
+        signals.connect()
+        if settings.REQUEST_METRICS:
+            from . import metrics
+            connection_created.connect(metrics.install_wrapper)
+            if settings.SERIALIZER_METRICS:
+                metrics.instrument_serializers()
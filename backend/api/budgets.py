@@ -0,0 +1,139 @@
+from asgiref.sync import async_to_sync
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ingredients.models import Ingredient
+from recipes.models import IngredientInRecipe, Recipe
+from users.models import User
+
+# Запросы, на которых тесты проверяют число SQL-запросов, а
+# check_api_budget — время ответа на большой базе.
+# (имя, метод, URL, ожидаемый статус, максимум медианы времени в мс)
+ENDPOINTS = (
+    ('recipes_list', 'get', '/api/recipes/', 200, 150),
+    ('recipes_list_100', 'get', '/api/recipes/?limit=100', 200, 600),
+    ('recipes_list_anonymous', 'get', '/api/recipes/?limit=100',
+     200, 600),
+    ('recipes_filtered', 'get',
+     '/api/recipes/?is_favorited=1&is_in_shopping_cart=1', 200, 200),
+    ('recipes_search', 'get', '/api/recipes/?search={word}',
+     200, 200),
+    ('recipes_by_ingredients', 'get',
+     '/api/recipes/?ingredients={ingredient}&exclude_ingredients={other}',
+     200, 200),
+    ('recipes_cook_with', 'get',
+     '/api/recipes/?cook_with={ingredient},{other}', 200, 300),
+    ('recipe_detail', 'get', '/api/recipes/{recipe}/', 200, 50),
+    ('subscriptions', 'get',
+     '/api/users/subscriptions/?recipes_limit=3', 200, 300),
+    ('ingredients_search', 'get', '/api/ingredients/?name={prefix}',
+     200, 50),
+    ('download_shopping_cart', 'get',
+     '/api/recipes/download_shopping_cart/', 200, 300),
+    ('download_shopping_cart_pdf', 'get',
+     '/api/recipes/download_shopping_cart/?format=pdf', 200, 500),
+    ('favorite_add', 'post', '/api/recipes/{recipe}/favorite/',
+     201, 50),
+    ('favorite_remove', 'delete', '/api/recipes/{recipe}/favorite/',
+     204, 50),
+    ('shopping_cart_add', 'post', '/api/recipes/{recipe}/shopping_cart/',
+     201, 50),
+    ('shopping_cart_remove', 'delete',
+     '/api/recipes/{recipe}/shopping_cart/', 204, 50),
+    ('subscribe', 'post', '/api/users/{author}/subscribe/?recipes_limit=3',
+     201, 50),
+    ('unsubscribe', 'delete', '/api/users/{author}/subscribe/',
+     204, 50),
+    ('favorite_bulk_add', 'post', '/api/recipes/favorite/', 200, 100),
+    ('favorite_bulk_remove', 'delete', '/api/recipes/favorite/',
+     200, 100),
+    ('shopping_cart_bulk_add', 'post', '/api/recipes/shopping_cart/',
+     200, 200),
+    ('shopping_cart_bulk_remove', 'delete', '/api/recipes/shopping_cart/',
+     200, 200),
+    ('subscribe_bulk', 'post', '/api/users/subscribe/', 200, 100),
+    ('unsubscribe_bulk', 'delete', '/api/users/subscribe/', 200, 100),
+)
+# Тела пакетных запросов: ключ контекста со списком id.
+REQUEST_BODIES = {
+    'favorite_bulk_add': 'recipes',
+    'favorite_bulk_remove': 'recipes',
+    'shopping_cart_bulk_add': 'recipes',
+    'shopping_cart_bulk_remove': 'recipes',
+    'subscribe_bulk': 'authors',
+    'unsubscribe_bulk': 'authors',
+}
+BULK_SIZE = 20
+
+
+def endpoint_context(reader):
+    """Значения для подстановки в URL и тела запросов.
+
+    Рецепты и авторы выбираются вне избранного, корзины и подписок
+    читателя, поэтому добавление и следующее за ним удаление проходят.
+    Фильтры по ингредиентам берут самые частые, чтобы выборки не были
+    пустыми и на маленькой базе.
+    """
+    token, _ = Token.objects.get_or_create(user=reader)
+    popular = IngredientInRecipe.objects.values('ingredient').annotate(
+        uses=Count('pk')
+    ).order_by('-uses', 'ingredient').values_list('ingredient', flat=True)
+    ingredient, other = popular[:2]
+    name = Ingredient.objects.get(pk=ingredient).name
+    targets = list(Recipe.objects.exclude(
+        favorite_by__user=reader
+    ).exclude(
+        in_shopping_carts__user=reader
+    ).values_list('pk', flat=True)[:BULK_SIZE + 1])
+    authors = list(User.objects.exclude(pk=reader.pk).exclude(
+        follower_set__follower=reader
+    ).filter(recipes__isnull=False).distinct().values_list(
+        'pk', flat=True
+    )[:BULK_SIZE + 1])
+    return {
+        'token': token.key,
+        'recipe': targets[0],
+        'author': authors[0],
+        'recipes': targets[1:],
+        'authors': authors[1:],
+        'prefix': name[:2],
+        # Полнотекстовый поиск PostgreSQL ищет слова, а не их начала.
+        'word': name.split()[0],
+        'ingredient': ingredient,
+        'other': other,
+    }
+
+
+def read_streaming(response):
+    if not response.is_async:
+        return b''.join(response.streaming_content)
+
+    async def read():
+        return b''.join([chunk async for chunk in response.streaming_content])
+    return async_to_sync(read)()
+
+
+class EndpointClient:
+    """Выполняет запросы из ENDPOINTS от имени читателя или анонима."""
+
+    def __init__(self, context):
+        self.context = context
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {context["token"]}'
+        )
+        self.anonymous = APIClient()
+
+    def request(self, name, method, url):
+        """Выполняет запрос и дочитывает потоковый ответ."""
+        api = self.anonymous if name.endswith('anonymous') else self.client
+        data = None
+        if name in REQUEST_BODIES:
+            data = {'ids': self.context[REQUEST_BODIES[name]]}
+        response = getattr(api, method)(
+            url.format(**self.context), data, format='json'
+        )
+        if response.streaming:
+            read_streaming(response)
+        return response
@@ -0,0 +1,145 @@
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+from django.db.models.constants import OnConflict
+from django.db.models.sql import InsertQuery
+from rest_framework import serializers, status
+
+from constants import BULK_ACTION_LIMIT
+
+from .counters import related_count
+
+
+def insert_or_ignore(obj):
+    """Вставляет строку одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Возвращает число вставленных строк: 0, если такая связь уже есть.
+    В отличие от bulk_create(ignore_conflicts=True), по результату
+    видно, была ли запись, и гонка двух запросов не приводит к
+    IntegrityError.
+    """
+    model = type(obj)
+    using = router.db_for_write(model)
+    query = InsertQuery(model, on_conflict=OnConflict.IGNORE)
+    query.insert_values(
+        [field for field in model._meta.local_concrete_fields
+         if not field.primary_key],
+        [obj],
+    )
+    inserted = 0
+    with connections[using].cursor() as cursor:
+        for sql, params in query.get_compiler(using=using).as_sql():
+            cursor.execute(sql, params)
+            inserted += cursor.rowcount
+    return inserted
+
+
+def lock_rows(queryset):
+    """Блокирует строки queryset до конца текущей транзакции.
+
+    Строки берутся по возрастанию pk, чтобы две транзакции, которым
+    нужны одни и те же строки, не ждали друг друга по кругу. В SQLite
+    запись и так идёт по очереди, select_for_update() там ничего не
+    делает.
+    """
+    list(queryset.select_for_update().order_by('pk').values_list(
+        'pk', flat=True
+    ))
+
+
+class BulkIdsSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_ACTION_LIMIT,
+        error_messages={
+            'max_length': 'Не больше {max_length} объектов за запрос.',
+        },
+    )
+
+    def validate_ids(self, value):
+        return list(dict.fromkeys(value))
+
+
+class BulkLinks:
+    """Пакетное добавление и удаление связей пользователя с объектами.
+
+    targets — объекты, на которые ссылаются связи (рецепты, авторы);
+    links — связи текущего пользователя, field — поле связи с объектом,
+    counter — счётчик объекта, который пересчитывается после записи.
+    messages задают тексты ошибок: not_found, exists и absent.
+    owner — строки, которые блокируются на время записи, чтобы запросы
+    одного пользователя шли по очереди; on_change(changed, add)
+    вызывается в той же транзакции после записи.
+    """
+
+    def __init__(self, targets, links, field, counter, messages,
+                 rejected=None, owner=None, on_change=None):
+        self.targets = targets
+        self.links = links
+        self.field = field
+        self.counter = counter
+        self.messages = messages
+        self.rejected = rejected or {}
+        self.owner = owner
+        self.on_change = on_change
+
+    def states(self, ids):
+        """Существующие объекты из ids и есть ли уже связь, одним запросом."""
+        return dict(self.targets.filter(pk__in=ids).annotate(
+            linked=Exists(self.links.filter(**{self.field: OuterRef('pk')}))
+        ).values_list('pk', 'linked'))
+
+    def apply(self, ids, add, build=None):
+        """Добавляет или удаляет связи и возвращает результат по каждому id.
+
+        Результат повторяет ответы одиночных эндпоинтов: 201 или 204 при
+        изменении, 400 и 404 с сообщением об ошибке.
+        """
+        with transaction.atomic():
+            if self.owner is not None:
+                # Под блокировкой состояния связей не меняются до записи,
+                # поэтому on_change получает ровно изменённые id.
+                lock_rows(self.owner)
+            results, changed = self.write(ids, add, build)
+        return results, changed
+
+    def write(self, ids, add, build):
+        states = self.states(ids)
+        results, changed = [], []
+        for pk in ids:
+            if pk in self.rejected:
+                results.append(self.error(pk, self.rejected[pk]))
+            elif pk not in states:
+                results.append(self.error(
+                    pk, self.messages['not_found'], status.HTTP_404_NOT_FOUND
+                ))
+            elif states[pk] == add:
+                results.append(self.error(
+                    pk, self.messages['exists' if add else 'absent']
+                ))
+            else:
+                changed.append(pk)
+                results.append({'id': pk, 'status': (
+                    status.HTTP_201_CREATED if add
+                    else status.HTTP_204_NO_CONTENT
+                )})
+        if changed:
+            if add:
+                self.links.model.objects.bulk_create(
+                    [build(pk) for pk in changed], ignore_conflicts=True
+                )
+            else:
+                self.links.filter(
+                    **{f'{self.field}__in': changed}
+                ).delete()
+            # Счётчики пересчитываются, а не сдвигаются: строки,
+            # пропущенные ignore_conflicts, не должны их увеличить.
+            self.targets.model.objects.filter(pk__in=changed).update(**{
+                self.counter: related_count(self.links.model, self.field)
+            })
+            if self.on_change is not None:
+                self.on_change(changed, add)
+        return results, changed
+
+    def error(self, pk, detail, code=status.HTTP_400_BAD_REQUEST):
+        return {'id': pk, 'status': code, 'detail': detail}
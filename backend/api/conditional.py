@@ -0,0 +1,85 @@
+from hashlib import md5
+
+from django.db.models import Count, Max, Value
+from django.utils.cache import (
+    get_conditional_response, patch_vary_headers, quote_etag
+)
+from django.utils.http import http_date
+from rest_framework import status
+
+
+def get_changes(**sources):
+    """Считает число строк и время последнего изменения наборов.
+
+    Каждый набор передаётся парой (queryset, поле даты); все наборы
+    считаются одним запросом UNION ALL. Для таблиц, где строки только
+    добавляются и удаляются, пара (число, максимум даты) меняется при
+    любом изменении.
+    """
+    return sorted(_changes_query(sources))
+
+
+async def aget_changes(**sources):
+    return sorted([row async for row in _changes_query(sources)])
+
+
+def _changes_query(sources):
+    queries = [
+        queryset.order_by().annotate(
+            source=Value(name)
+        ).values('source').annotate(
+            total=Count('pk'), changed_at=Max(date_field)
+        ).values_list('source', 'total', 'changed_at')
+        for name, (queryset, date_field) in sources.items()
+    ]
+    first, *rest = queries
+    if rest:
+        first = first.union(*rest, all=True)
+    return first
+
+
+def conditional_get(request, get_response, etag_source, last_modified=None):
+    """Отвечает 304 до сериализации, если валидаторы клиента совпали.
+
+    ETag строится из адреса запроса и etag_source — значений, от которых
+    зависит представление ответа.
+    """
+    etag, timestamp = _validators(request, etag_source, last_modified)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp
+    )
+    if response is None:
+        response = get_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    return _set_validators(response, etag, timestamp)
+
+
+async def aconditional_get(request, aget_response, etag_source,
+                           last_modified=None):
+    """То же, что conditional_get(), для корутины aget_response."""
+    etag, timestamp = _validators(request, etag_source, last_modified)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=timestamp
+    )
+    if response is None:
+        response = await aget_response()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+    return _set_validators(response, etag, timestamp)
+
+
+def _validators(request, etag_source, last_modified):
+    etag = quote_etag(md5(
+        repr((request.build_absolute_uri(), etag_source)).encode()
+    ).hexdigest())
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return etag, timestamp
+
+
+def _set_validators(response, etag, timestamp):
+    if timestamp is not None and response.status_code == status.HTTP_200_OK:
+        response['Last-Modified'] = http_date(timestamp)
+    response['ETag'] = etag
+    patch_vary_headers(response, ('Authorization',))
+    return response
@@ -0,0 +1,60 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+# Ограничивает число параметров IN в одном UPDATE.
+RECONCILE_BATCH_SIZE = 1000
+
+
+def change_counter(queryset, field, delta):
+    """Атомарно меняет счётчик у строк queryset одним UPDATE."""
+    if delta:
+        queryset.update(**{field: Greatest(F(field) + delta, 0)})
+
+
+def related_count(model, field, **filters):
+    """Подзапрос с числом строк model, ссылающихся на внешнюю строку."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}, **filters
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+def reconcile_counters(queryset, expected, dry_run=False):
+    """Сверяет счётчики с подзапросами expected и исправляет расхождения.
+
+    Возвращает число строк, в которых хотя бы один счётчик не совпал.
+    """
+    drifted = queryset.alias(**{
+        f'expected_{field}': value for field, value in expected.items()
+    }).exclude(**{
+        field: F(f'expected_{field}') for field in expected
+    }).values_list('pk', flat=True)
+    drifted = list(drifted)
+    if not dry_run:
+        for start in range(0, len(drifted), RECONCILE_BATCH_SIZE):
+            queryset.model.objects.filter(
+                pk__in=drifted[start:start + RECONCILE_BATCH_SIZE]
+            ).update(**expected)
+    return len(drifted)
+
+
+class DerivedFieldsMixin:
+    """Не даёт save() затереть поля, которые пересчитываются отдельно.
+
+    Счётчики, наборы и поисковые векторы меняются только своими UPDATE,
+    поэтому при сохранении существующей строки они исключаются из
+    UPDATE и не откатываются к значениям из устаревшего экземпляра.
+    """
+    derived_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.derived_fields
+            ]
+        super().save(*args, **kwargs)
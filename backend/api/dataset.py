@@ -0,0 +1,139 @@
+import csv
+import io
+import json
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.test.utils import (
+    override_settings, setup_test_environment, teardown_test_environment,
+)
+from PIL import Image
+
+from constants import RECIPE_IMAGE_UPLOAD_PATH
+from ingredients.models import Ingredient
+from recipes.models import (
+    FavoriteRecipe, IngredientInRecipe, Recipe, ShoppingCart,
+    ShoppingListItem,
+)
+from users.models import Follow, User
+
+from .storage import image_storage
+
+
+@contextmanager
+def test_database():
+    """Создаёт временную тестовую базу и каталог медиафайлов."""
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(
+        verbosity=0, autoclobber=True, serialize=False
+    )
+    try:
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def load_ingredients():
+    csv_path = Path(settings.BASE_DIR).parent / 'data' / 'ingredients.csv'
+    if csv_path.exists():
+        with open(csv_path, encoding='utf-8') as csv_file:
+            rows = [row for row in csv.reader(csv_file) if len(row) == 2]
+    else:
+        json_path = Path(settings.BASE_DIR) / 'ingredients.json'
+        with open(json_path, encoding='utf-8') as json_file:
+            rows = [
+                (item['name'], item['measurement_unit'])
+                for item in json.load(json_file)
+            ]
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=name, measurement_unit=unit) for name, unit in rows],
+        ignore_conflicts=True,
+    )
+    return list(Ingredient.objects.all())
+
+
+def save_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'PNG')
+    return image_storage().save(
+        f'{RECIPE_IMAGE_UPLOAD_PATH}/dataset.png',
+        ContentFile(buffer.getvalue()),
+    )
+
+
+def seed_dataset(rng, users_count, recipes_count, follows_count):
+    """Наполняет базу данными и возвращает (читатель, рецепты, ингредиенты).
+
+    Читатель и ещё сто пользователей получают подписки, избранное и
+    корзины; половина корзины каждого совпадает с его избранным.
+    """
+    ingredients = load_ingredients()
+    password = make_password('dataset-password')
+    users = User.objects.bulk_create(
+        User(
+            email=f'user{idx}@dataset.local',
+            username=f'user{idx}',
+            first_name='Имя',
+            last_name='Фамилия',
+            password=password,
+        ) for idx in range(users_count)
+    )
+    image = save_image()
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author=rng.choice(users),
+            name=f'Рецепт {idx}',
+            text='Описание рецепта. ' * 10,
+            cooking_time=rng.randint(5, 180),
+            image=image,
+        ) for idx in range(recipes_count)
+    )
+    IngredientInRecipe.objects.bulk_create(
+        (
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=rng.randint(1, 500),
+            )
+            for recipe in recipes
+            for ingredient in rng.sample(ingredients, rng.randint(3, 10))
+        ),
+        batch_size=1000,
+    )
+
+    reader, *others = users
+    Follow.objects.bulk_create(
+        Follow(follower=follower, following=following)
+        for follower in [reader] + others[:100]
+        for following in rng.sample(
+            others, min(follows_count, len(others))
+        )
+        if follower != following
+    )
+    favorites, carts = [], []
+    for user in [reader] + others[:100]:
+        chosen = rng.sample(recipes, 45)
+        # Половина корзины взята из избранного, чтобы выборка
+        # is_favorited=1&is_in_shopping_cart=1 не была пустой.
+        favorites.extend(
+            FavoriteRecipe(user=user, recipe=recipe) for recipe in chosen[:30]
+        )
+        carts.extend(
+            ShoppingCart(user=user, recipe=recipe) for recipe in chosen[15:]
+        )
+    FavoriteRecipe.objects.bulk_create(favorites)
+    ShoppingCart.objects.bulk_create(carts)
+    ShoppingListItem.objects.refresh()
+    Recipe.objects.reconcile_counters()
+    Recipe.objects.update_search_vector()
+    Recipe.objects.update_ingredient_ids()
+    User.objects.reconcile_counters()
+    return reader, recipes, ingredients
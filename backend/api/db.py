@@ -0,0 +1,23 @@
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+@contextmanager
+def no_statement_timeout():
+    """Снимает DB_STATEMENT_TIMEOUT на время команды обслуживания.
+
+    Ограничение рассчитано на запросы API, а пересчёт по всей базе идёт
+    дольше. Вне PostgreSQL ничего не делает.
+    """
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('SET statement_timeout = 0')
+    try:
+        yield
+    finally:
+        # Возвращает значение из параметров подключения.
+        with connection.cursor() as cursor:
+            cursor.execute('RESET statement_timeout')
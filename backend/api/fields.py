@@ -0,0 +1,150 @@
+import binascii
+import logging
+import tempfile
+import time
+import uuid
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, UnidentifiedImageError
+from rest_framework import serializers
+
+from constants import BASE64_CHUNK_SIZE
+
+from .prometheus import IMAGE_UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Сигнатуры в начале файла и расширения для разрешённых форматов.
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG', 'png'),
+    (b'GIF87a', 'GIF', 'gif'),
+    (b'GIF89a', 'GIF', 'gif'),
+    (b'RIFF', 'WEBP', 'webp'),
+)
+# Форматы Pillow, которые приходят под сигнатурой другого формата:
+# MPO (снимки с телефонов и стереокамер) — это JPEG с доп. кадрами.
+FORMAT_ALIASES = {'MPO': 'JPEG'}
+# Сколько первых байтов нужно, чтобы узнать формат.
+SIGNATURE_SIZE = 16
+WHITESPACE = str.maketrans('', '', ' \t\r\n')
+
+
+def detect_format(head):
+    for signature, image_format, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            if image_format == 'WEBP' and head[8:12] != b'WEBP':
+                return None
+            return image_format, extension
+    return None
+
+
+class StreamingBase64ImageField(serializers.ImageField):
+    """Изображение в base64, декодируемое по частям во временный файл.
+
+    В памяти одновременно держится только строка из запроса и один
+    кусок декодированных данных. Размер проверяется до декодирования,
+    формат — по первым байтам, размеры в пикселях — по заголовку без
+    распаковки изображения.
+    """
+    default_error_messages = {
+        'invalid_base64': 'Изображение должно быть строкой base64.',
+        'invalid_image': 'Загрузите корректное изображение.',
+        'invalid_type': 'Допустимые форматы: JPEG, PNG, GIF, WebP.',
+        'too_large': 'Размер изображения больше {max_bytes} байт.',
+        'too_many_pixels': 'Изображение больше {max_pixels} пикселей.',
+    }
+
+    def to_internal_value(self, data):
+        if data in (None, ''):
+            return None
+        if not isinstance(data, str):
+            self.fail('invalid_base64')
+        payload_start = data.find(';base64,')
+        payload_start = 0 if payload_start == -1 else payload_start + 8
+        max_bytes = settings.IMAGE_MAX_BYTES
+        if (len(data) - payload_start) * 3 // 4 > max_bytes + 2:
+            self.fail('too_large', max_bytes=max_bytes)
+
+        started = time.perf_counter()
+        # Безымянный файл удаляется системой при закрытии, хранилище
+        # копирует его содержимое, а не переносит файл.
+        upload = UploadedFile(tempfile.TemporaryFile(), name=f'{uuid.uuid4()}')
+        try:
+            image_format, extension = self.decode(
+                data, payload_start, upload, max_bytes
+            )
+            upload.size = upload.tell()
+            upload.seek(0)
+            self.check_image(upload, image_format)
+        except Exception:
+            upload.close()
+            raise
+        upload.name = f'{upload.name}.{extension}'
+        upload.content_type = f'image/{image_format.lower()}'
+        upload.seek(0)
+        IMAGE_UPLOAD_BYTES.labels(image_format.lower()).observe(upload.size)
+        logger.info(
+            'Изображение %s: %d байт за %.1f мс',
+            upload.name, upload.size, (time.perf_counter() - started) * 1000,
+        )
+        return serializers.FileField.to_internal_value(self, upload)
+
+    def decode(self, data, start, output, max_bytes):
+        detected = None
+        rest = ''
+        # Начало файла, пока его не хватает для сигнатуры: первый кусок
+        # после удаления пробелов может оказаться короче неё.
+        head = b''
+        written = 0
+        for offset in range(start, len(data), BASE64_CHUNK_SIZE):
+            chunk = rest + data[
+                offset:offset + BASE64_CHUNK_SIZE
+            ].translate(WHITESPACE)
+            aligned = len(chunk) // 4 * 4
+            rest = chunk[aligned:]
+            try:
+                decoded = binascii.a2b_base64(
+                    chunk[:aligned], strict_mode=True
+                )
+            except binascii.Error:
+                self.fail('invalid_base64')
+            if detected is None and len(head) < SIGNATURE_SIZE:
+                head += decoded[:SIGNATURE_SIZE]
+                if len(head) >= SIGNATURE_SIZE:
+                    detected = self.detect(head)
+            written += len(decoded)
+            if written > max_bytes:
+                self.fail('too_large', max_bytes=max_bytes)
+            output.write(decoded)
+        if rest:
+            self.fail('invalid_base64')
+        if detected is None:
+            detected = self.detect(head) if head else None
+        if detected is None:
+            self.fail('invalid_image')
+        return detected
+
+    def detect(self, head):
+        detected = detect_format(head)
+        if detected is None:
+            self.fail('invalid_type')
+        return detected
+
+    def check_image(self, upload, image_format):
+        try:
+            with Image.open(upload) as image:
+                # open() читает только заголовок, пиксели не распаковываются.
+                opened = FORMAT_ALIASES.get(image.format, image.format)
+                if opened != image_format:
+                    self.fail('invalid_type')
+                if image.width * image.height > settings.IMAGE_MAX_PIXELS:
+                    self.fail(
+                        'too_many_pixels',
+                        max_pixels=settings.IMAGE_MAX_PIXELS,
+                    )
+                image.verify()
+        except (UnidentifiedImageError, Image.DecompressionBombError,
+                OSError, SyntaxError):
+            self.fail('invalid_image')
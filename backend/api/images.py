@@ -0,0 +1,136 @@
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.utils import timezone
+from PIL import Image, features
+
+from constants import IMAGE_VARIANT_FORMATS, IMAGE_VARIANT_WIDTHS
+
+from .storage import image_storage, variants_of
+
+logger = logging.getLogger(__name__)
+
+# Параметры сохранения для форматов вариантов.
+SAVE_OPTIONS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60},
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def supported_formats():
+    return [fmt for fmt in IMAGE_VARIANT_FORMATS if features.check(fmt)]
+
+
+def render_variants(name):
+    """Сохраняет уменьшенные копии изображения и возвращает их описание.
+
+    Результат вида {'source': name, 'webp': {'320': 'путь', ...}}.
+    Копии шире оригинала не создаются, но хотя бы одна есть всегда.
+    """
+    storage = image_storage()
+    with storage.open(name) as source:
+        image = Image.open(source)
+        image.draft('RGB', (max(IMAGE_VARIANT_WIDTHS),) * 2)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    widths = [width for width in IMAGE_VARIANT_WIDTHS if width < image.width]
+    widths = widths or [min(image.width, min(IMAGE_VARIANT_WIDTHS))]
+    directory, prefix = variants_of(name)
+    variants = {'source': name}
+    for fmt in supported_formats():
+        variants[fmt] = {}
+        for width in widths:
+            resized = image.copy()
+            resized.thumbnail((width, image.height), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            resized.save(buffer, **SAVE_OPTIONS[fmt])
+            variants[fmt][str(width)] = storage.save(
+                f'{directory}/{prefix}{width}.{fmt}',
+                ContentFile(buffer.getvalue()),
+            )
+    return variants
+
+
+def variant_names(variants):
+    return [
+        name
+        for fmt, sizes in variants.items() if fmt != 'source'
+        for name in sizes.values()
+    ]
+
+
+def process_image(model, pk, field, variants_field, on_ready=None,
+                  force=False):
+    """Строит варианты изображения и сохраняет их во все строки с ним.
+
+    Одинаковые загрузки хранятся одним файлом, поэтому готовые варианты
+    другой строки переиспользуются без пересборки, если не задан force.
+    Если пока шла обработка изображение заменили, новые варианты
+    удаляются, а строки не меняются. Варианты прежнего изображения
+    удаляются вместе с ним, см. api.storage.release().
+    """
+    name = model.objects.filter(pk=pk).values_list(field, flat=True).first()
+    if not name:
+        return
+    targets = model.objects.filter(**{field: name})
+    variants = None
+    if not force:
+        variants = targets.filter(
+            **{f'{variants_field}__source': name}
+        ).values_list(variants_field, flat=True).first()
+    rendered = variants is None
+    if rendered:
+        variants = render_variants(name)
+    previous = list(targets.values_list('pk', variants_field))
+    updated = targets.update(**{
+        variants_field: variants, 'updated_at': timezone.now(),
+    })
+    if not updated:
+        stale = variant_names(variants) if rendered else ()
+    else:
+        stale = {
+            stale_name
+            for _, old in previous if (old or {}).get('source') == name
+            for stale_name in variant_names(old)
+        } - set(variant_names(variants))
+    storage = image_storage()
+    for stale_name in stale:
+        storage.delete(stale_name)
+    if updated and on_ready:
+        on_ready(*[row_pk for row_pk, _ in previous])
+
+
+def _run(func, *args, **kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Ошибка обработки изображения')
+    finally:
+        connections.close_all()
+
+
+def schedule(func, *args, **kwargs):
+    """Выполняет задачу в фоновом пуле или сразу, если пул отключён."""
+    global _executor
+    if not settings.IMAGE_WORKERS:
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception('Ошибка обработки изображения')
+        return
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='images',
+            )
+    _executor.submit(_run, func, *args, **kwargs)
@@ -0,0 +1,104 @@
+import gc
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.budgets import ENDPOINTS, EndpointClient, endpoint_context
+from api.dataset import seed_dataset, test_database
+
+
+class Command(BaseCommand):
+    help = ('Наполняет тестовую базу данными и проверяет время ответа '
+            'эндпоинтов API; число запросов проверяют тесты')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--follows', type=int, default=200,
+                            help='Подписок у проверяемого пользователя')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--report', type=Path,
+                            help='Путь для JSON-отчёта')
+        parser.add_argument('--no-fail', action='store_true',
+                            help='Не завершаться ошибкой при превышении')
+
+    def handle(self, *args, **options):
+        with test_database():
+            self.stdout.write('Наполнение базы...')
+            reader, _, _ = seed_dataset(
+                random.Random(options['seed']),
+                options['users'],
+                options['recipes'],
+                options['follows'],
+            )
+            context = endpoint_context(reader)
+            # Иначе полная сборка мусора обходит все объекты наполнения и
+            # добавляет к случайному эндпоинту сотню миллисекунд.
+            gc.collect()
+            gc.freeze()
+            results = self.run_checks(context, options['repeat'])
+
+        self.print_results(results)
+        if options['report']:
+            options['report'].write_text(
+                json.dumps(results, ensure_ascii=False, indent=2),
+                encoding='utf-8',
+            )
+        failed = [item['name'] for item in results if not item['passed']]
+        if failed and not options['no_fail']:
+            raise CommandError(
+                f'Превышены бюджеты: {", ".join(failed)}'
+            )
+
+    def run_checks(self, context, repeat):
+        client = EndpointClient(context)
+        measurements = {name: ([], []) for name, *_ in ENDPOINTS}
+        # Первый проход прогревает кэши процесса и не учитывается.
+        for round_idx in range(repeat + 1):
+            for name, method, url, expected, _ in ENDPOINTS:
+                # Число запросов попадает в отчёт для сравнения между
+                # прогонами, а лимиты на него проверяют тесты.
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    response = client.request(name, method, url)
+                    elapsed = (time.perf_counter() - started) * 1000
+                if response.status_code != expected:
+                    raise CommandError(
+                        f'{name}: ожидался статус {expected}, '
+                        f'получен {response.status_code}'
+                    )
+                if not round_idx:
+                    continue
+                measurements[name][0].append(len(queries))
+                measurements[name][1].append(elapsed)
+
+        results = []
+        for name, method, url, _, max_ms in ENDPOINTS:
+            queries, durations = measurements[name]
+            median_ms = round(statistics.median(durations), 2)
+            results.append({
+                'name': name,
+                'method': method.upper(),
+                'url': url,
+                'queries': max(queries),
+                'median_ms': median_ms,
+                'max_ms': max_ms,
+                'passed': median_ms <= max_ms,
+            })
+        return results
+
+    def print_results(self, results):
+        for item in results:
+            style = self.style.SUCCESS if item['passed'] else self.style.ERROR
+            self.stdout.write(style(
+                f'{item["name"]:<26} '
+                f'запросов {item["queries"]:>3} '
+                f'{item["median_ms"]:>8.2f}/{item["max_ms"]} мс'
+            ))
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+
+from api.storage import (
+    file_age, image_fields, image_storage, variants_of,
+)
+from constants import CONTENT_IMAGE_DIR, IMAGE_GC_GRACE
+
+
+class Command(BaseCommand):
+    help = ('Удаляет фотографии и их уменьшенные копии, на которые не '
+            'ссылается ни один рецепт или пользователь')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=IMAGE_GC_GRACE,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+
+    def handle(self, *args, **options):
+        storage = image_storage()
+        referenced = set()
+        roots = {CONTENT_IMAGE_DIR}
+        for model, field in image_fields():
+            referenced.update(
+                model._default_manager.exclude(**{field: ''}).exclude(
+                    **{f'{field}__isnull': True}
+                ).values_list(field, flat=True).iterator()
+            )
+            roots.add(model._meta.get_field(field).upload_to.rstrip('/'))
+        sources = {variants_of(name) for name in referenced}
+
+        removed = freed = 0
+        for name in self.walk(storage, roots):
+            directory, filename = name.rsplit('/', 1)
+            if name in referenced or (
+                directory.endswith('/variants')
+                and (directory, filename.rsplit('-', 1)[0] + '-') in sources
+            ):
+                continue
+            if file_age(storage, name) < options['min_age']:
+                continue
+            removed += 1
+            freed += storage.size(name)
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+        verb = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {removed}, {freed / 1024 / 1024:.1f} МБ'
+        ))
+
+    def walk(self, storage, roots):
+        pending = [root for root in roots if storage.exists(root)]
+        while pending:
+            directory = pending.pop()
+            directories, files = storage.listdir(directory)
+            pending.extend(f'{directory}/{name}' for name in directories)
+            yield from (f'{directory}/{name}' for name in files)
@@ -0,0 +1,105 @@
+import random
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.dataset import seed_dataset, test_database
+from ingredients.models import Ingredient
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from users.models import Follow
+
+# (имя, таблица, которую нельзя читать целиком, построитель запроса)
+HOT_QUERIES = (
+    ('recipe_feed', 'recipes_recipe',
+     lambda ctx: Recipe.objects.order_by('-created_at', '-id')[:6]),
+    ('recipes_by_author', 'recipes_recipe',
+     lambda ctx: Recipe.objects.filter(author=ctx['author'])[:6]),
+    ('favorites_of_user', 'recipes_favoriterecipe',
+     lambda ctx: Recipe.objects.filter(favorite_by__user=ctx['reader'])),
+    ('favorited_by', 'recipes_favoriterecipe',
+     lambda ctx: FavoriteRecipe.objects.filter(recipe=ctx['recipe'])),
+    ('cart_of_user', 'recipes_shoppingcart',
+     lambda ctx: Recipe.objects.filter(
+         in_shopping_carts__user=ctx['reader']
+     )),
+    ('in_carts_of', 'recipes_shoppingcart',
+     lambda ctx: ShoppingCart.objects.filter(recipe=ctx['recipe'])),
+    ('subscriptions', 'users_follow',
+     lambda ctx: Follow.objects.filter(follower=ctx['reader'])[:6]),
+    ('followers_of_author', 'users_follow',
+     lambda ctx: Follow.objects.filter(following=ctx['author'])),
+)
+# SQLite не умеет искать по индексу без учёта регистра, а полнотекстовый
+# поиск в нём идёт по индексу в памяти.
+POSTGRESQL_QUERIES = (
+    ('ingredient_prefix', 'ingredients_ingredient',
+     lambda ctx: Ingredient.objects.filter(name__istartswith='абр')),
+    ('recipe_search', 'recipes_recipe',
+     lambda ctx: Recipe.objects.search('абрикос')[:6]),
+    ('recipes_with_ingredients', 'recipes_recipe',
+     lambda ctx: Recipe.objects.with_ingredients(ctx['ingredients'])[:6]),
+    ('recipes_cook_with', 'recipes_recipe',
+     lambda ctx: Recipe.objects.cook_with(ctx['ingredients'])[:6]),
+)
+
+
+class Command(BaseCommand):
+    help = ('Наполняет тестовую базу и проверяет по EXPLAIN, что горячие '
+            'запросы используют индексы, а не полное чтение таблиц')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5000)
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--verbose-plans', action='store_true',
+                            help='Печатать планы целиком')
+
+    def handle(self, *args, **options):
+        with test_database():
+            self.stdout.write('Наполнение базы...')
+            reader, recipes, _ = seed_dataset(
+                random.Random(options['seed']),
+                options['users'],
+                options['recipes'],
+                options['follows'],
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            context = {
+                'ingredients': list(
+                    recipes[0].ingredients_in_recipe.values_list(
+                        'ingredient', flat=True
+                    )[:2]
+                ),
+                'reader': reader,
+                'recipe': recipes[0],
+                'author': recipes[0].author,
+            }
+            failed = self.explain_all(context, options['verbose_plans'])
+        if failed:
+            raise CommandError(
+                f'Полное чтение таблиц в запросах: {", ".join(failed)}'
+            )
+
+    def explain_all(self, context, verbose):
+        queries = HOT_QUERIES
+        if connection.vendor == 'postgresql':
+            queries += POSTGRESQL_QUERIES
+        failed = []
+        for name, table, build in queries:
+            plan = build(context).explain()
+            if self.is_full_scan(plan, table):
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: полное чтение'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: индекс'))
+            if verbose or name in failed:
+                self.stdout.write(plan)
+        return failed
+
+    def is_full_scan(self, plan, table):
+        if connection.vendor == 'postgresql':
+            return f'Seq Scan on {table}' in plan
+        return re.search(rf'\bSCAN {table}\b(?! USING)', plan) is not None
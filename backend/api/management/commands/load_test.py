@@ -0,0 +1,358 @@
+import http.client
+import json
+import random
+import re
+import statistics
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import quote, urlsplit
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# (имя, URL, нужен ли токен)
+LOAD_ENDPOINTS = (
+    ('recipes_list', '/api/recipes/', False),
+    ('recipe_detail', '/api/recipes/{{firstRecipeId}}/', False),
+    ('ingredients_search',
+     '/api/ingredients/?name={{ingredientNameFirstLatter}}', False),
+    ('download_shopping_cart', '/api/recipes/download_shopping_cart/', True),
+)
+POSTMAN_COLLECTION = (
+    settings.BASE_DIR.parent
+    / 'postman_collection' / 'foodgram.postman_collection.json'
+)
+VARIABLE = re.compile(r'{{(\w+)}}')
+EXPECTED_STATUS = re.compile(r'код\D{0,30}([1-5]\d\d)')
+# Метрики, по которым результат сравнивается с эталоном.
+LATENCY_KEYS = ('p50', 'p95')
+
+
+def walk(items):
+    for item in items:
+        if 'item' in item:
+            yield from walk(item['item'])
+        else:
+            yield item
+
+
+class Command(BaseCommand):
+    help = ('Нагружает запущенный сервер сценариями чтения (горячими '
+            'эндпоинтами или GET-запросами коллекции Postman), сравнивает '
+            'несколько серверов и результат с сохранённым эталоном')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', action='append', dest='urls',
+            help='Адрес сервера; можно указать несколько раз',
+        )
+        parser.add_argument(
+            '--scenarios', choices=('hot', 'postman'), default='hot',
+            help='hot — горячие чтения, postman — GET-запросы коллекции',
+        )
+        parser.add_argument('--collection', type=Path,
+                            default=POSTMAN_COLLECTION)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument(
+            '--duration', type=float, default=10,
+            help='Секунд нагрузки на каждый эндпоинт, а с --mixed — всего',
+        )
+        parser.add_argument(
+            '--mixed', action='store_true',
+            help='Нагружать все сценарии одновременно вперемешку',
+        )
+        parser.add_argument(
+            '--token', action='append', dest='tokens', default=[],
+            help='Токен пользователя; несколько токенов делят нагрузку',
+        )
+        parser.add_argument(
+            '--anonymous-share', type=float,
+            help='Доля запросов без токена в режиме --mixed; по умолчанию '
+                 'сценарии выбираются равновероятно',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='мо',
+                            help='Начало названия для поиска ингредиентов')
+        parser.add_argument('--report', type=Path,
+                            help='Путь для JSON-отчёта')
+        parser.add_argument(
+            '--baseline', type=Path,
+            help='Эталонный отчёт: сравнить с ним первый сервер',
+        )
+        parser.add_argument(
+            '--save-baseline', action='store_true',
+            help='Записать результат первого сервера в --baseline',
+        )
+        parser.add_argument(
+            '--max-regression', type=float, default=0.2,
+            help='Допустимый рост p50/p95 и падение запр/с, доля',
+        )
+
+    def handle(self, *args, **options):
+        urls = options['urls'] or ['http://127.0.0.1:8000']
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline требует --baseline')
+        scenarios = self.scenarios(options)
+        results = {}
+        for url in urls:
+            self.stdout.write(f'Нагрузка на {url}...')
+            results[url] = self.run(url, scenarios, options)
+        self.print_results(results)
+
+        report = {'settings': self.run_settings(options), 'results': results}
+        if options['report']:
+            self.write_json(options['report'], report)
+        if not options['baseline']:
+            return
+        endpoints = results[urls[0]]
+        if options['save_baseline']:
+            self.write_json(options['baseline'], {
+                'settings': report['settings'], 'endpoints': endpoints,
+            })
+            self.stdout.write(f'Эталон записан в {options["baseline"]}')
+            return
+        regressions = self.compare(
+            json.loads(options['baseline'].read_text(encoding='utf-8')),
+            report['settings'], endpoints, options['max_regression'],
+        )
+        if regressions:
+            raise CommandError(
+                'Хуже эталона: ' + '; '.join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS('Не хуже эталона'))
+
+    def run_settings(self, options):
+        return {
+            key: options[key] for key in (
+                'scenarios', 'concurrency', 'duration', 'mixed',
+                'anonymous_share', 'seed', 'prefix',
+            )
+        } | {'users': len(options['tokens'])}
+
+    def scenarios(self, options):
+        if options['scenarios'] == 'hot':
+            return [
+                {'name': name, 'path': path, 'auth': auth, 'expected': 200}
+                for name, path, auth in LOAD_ENDPOINTS
+            ]
+        try:
+            collection = json.loads(
+                options['collection'].read_text(encoding='utf-8')
+            )
+        except OSError as error:
+            raise CommandError(f'Нет коллекции Postman: {error}')
+        scenarios, names = [], Counter()
+        for item in walk(collection['item']):
+            request = item['request']
+            if request['method'] != 'GET':
+                continue
+            url = request['url']
+            url = url['raw'] if isinstance(url, dict) else url
+            tests = '\n'.join(
+                line for event in item.get('event', ())
+                if event['listen'] == 'test'
+                for line in event['script']['exec']
+            )
+            expected = EXPECTED_STATUS.search(tests)
+            name = re.sub(r'\s*//\s*', ' // ', item['name'].strip())
+            names[name] += 1
+            if names[name] > 1:
+                name = f'{name} #{names[name]}'
+            scenarios.append({
+                'name': name,
+                'path': url.replace('{{baseUrl}}', ''),
+                'auth': (request.get('auth') or {}).get('type') == 'apikey',
+                'expected': int(expected.group(1)) if expected else 200,
+            })
+        return scenarios
+
+    def run(self, url, scenarios, options):
+        target = urlsplit(url)
+        tokens = options['tokens']
+        context = self.probe(target, tokens, options['prefix'])
+        runnable = []
+        for scenario in scenarios:
+            missing = set(VARIABLE.findall(scenario['path'])) - set(context)
+            if scenario['auth'] and not tokens:
+                missing.add('token')
+            if missing:
+                self.stdout.write(
+                    f'Пропущен {scenario["name"]}: нет {", ".join(missing)}'
+                )
+                continue
+            runnable.append(scenario | {'path': VARIABLE.sub(
+                lambda match: context[match.group(1)], scenario['path']
+            )})
+        if not runnable:
+            raise CommandError(f'{url}: нет сценариев для нагрузки')
+        if options['mixed']:
+            return self.load(target, runnable, tokens, options)
+        results = {}
+        for scenario in runnable:
+            results.update(self.load(target, [scenario], tokens, options))
+        return results
+
+    def probe(self, target, tokens, prefix):
+        """Значения переменных коллекции на нагружаемом сервере."""
+        status, body = self.request(target, '/api/recipes/?limit=1')
+        if status != 200 or not json.loads(body)['results']:
+            raise CommandError(
+                f'{target.geturl()}: нет рецептов для нагрузки'
+            )
+        context = {
+            'firstRecipeId': str(json.loads(body)['results'][0]['id']),
+            'ingredientNameFirstLatter': quote(prefix),
+        }
+        status, body = self.request(
+            target, f'/api/ingredients/?name={quote(prefix)}'
+        )
+        if status == 200 and json.loads(body):
+            context['firstIndredientId'] = str(json.loads(body)[0]['id'])
+        if tokens:
+            status, body = self.request(
+                target, '/api/users/me/', self.headers(tokens[0])
+            )
+            if status != 200:
+                raise CommandError(f'{target.geturl()}: токен не подходит')
+            context['userId'] = str(json.loads(body)['id'])
+        return context
+
+    def headers(self, token):
+        return {'Authorization': f'Token {token}'} if token else {}
+
+    def request(self, target, path, headers=None, connection=None):
+        connection = connection or http.client.HTTPConnection(
+            target.hostname, target.port or 80, timeout=30
+        )
+        connection.request('GET', path, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.read()
+
+    def pick(self, rng, scenarios, anonymous_share):
+        if anonymous_share is None:
+            return rng.choice(scenarios)
+        anonymous = [item for item in scenarios if not item['auth']]
+        authorized = [item for item in scenarios if item['auth']]
+        if not anonymous or not authorized:
+            return rng.choice(scenarios)
+        return rng.choice(
+            anonymous if rng.random() < anonymous_share else authorized
+        )
+
+    def load(self, target, scenarios, tokens, options):
+        latencies, errors = defaultdict(list), Counter()
+        lock = threading.Lock()
+        deadline = time.perf_counter() + options['duration']
+
+        def worker(index):
+            # Соединение переиспользуется, если сервер держит keep-alive.
+            connection = http.client.HTTPConnection(
+                target.hostname, target.port or 80, timeout=30
+            )
+            rng = random.Random(options['seed'] + index)
+            token = tokens[index % len(tokens)] if tokens else None
+            done, failed = defaultdict(list), Counter()
+            while time.perf_counter() < deadline:
+                scenario = self.pick(
+                    rng, scenarios, options['anonymous_share']
+                )
+                headers = self.headers(token) if scenario['auth'] else {}
+                started = time.perf_counter()
+                try:
+                    status, _ = self.request(
+                        target, scenario['path'], headers, connection
+                    )
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    status = None
+                if status == scenario['expected']:
+                    done[scenario['name']].append(
+                        (time.perf_counter() - started) * 1000
+                    )
+                else:
+                    failed[scenario['name']] += 1
+            connection.close()
+            with lock:
+                for name, values in done.items():
+                    latencies[name].extend(values)
+                errors.update(failed)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+            for future in [
+                pool.submit(worker, index)
+                for index in range(options['concurrency'])
+            ]:
+                future.result()
+        elapsed = time.perf_counter() - started
+        return {
+            scenario['name']: self.summarize(
+                latencies[scenario['name']], errors[scenario['name']],
+                elapsed,
+            )
+            for scenario in scenarios
+        }
+
+    def summarize(self, latencies, errors, elapsed):
+        percentiles = (
+            statistics.quantiles(latencies, n=100)
+            if len(latencies) > 1 else [0] * 99
+        )
+        return {
+            'requests': len(latencies),
+            'rps': round(len(latencies) / elapsed, 1),
+            'p50': round(percentiles[49], 1),
+            'p95': round(percentiles[94], 1),
+            'p99': round(percentiles[98], 1),
+            'errors': errors,
+        }
+
+    def compare(self, baseline, current_settings, endpoints, tolerance):
+        if baseline['settings'] != current_settings:
+            self.stdout.write(self.style.WARNING(
+                'Параметры отличаются от эталона, сравнение неточное'
+            ))
+        regressions = []
+        for name, expected in baseline['endpoints'].items():
+            actual = endpoints.get(name)
+            if actual is None:
+                regressions.append(f'{name}: не выполнялся')
+                continue
+            if actual['errors'] and not expected['errors']:
+                regressions.append(f'{name}: ошибок {actual["errors"]}')
+            for key in LATENCY_KEYS:
+                if actual[key] > expected[key] * (1 + tolerance):
+                    regressions.append(
+                        f'{name}: {key} {expected[key]} → {actual[key]} мс'
+                    )
+            if actual['rps'] < expected['rps'] * (1 - tolerance):
+                regressions.append(
+                    f'{name}: {expected["rps"]} → {actual["rps"]} запр/с'
+                )
+        return regressions
+
+    def write_json(self, path, data):
+        path.write_text(
+            json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8'
+        )
+
+    def print_results(self, results):
+        names = list(dict.fromkeys(
+            name for endpoints in results.values() for name in endpoints
+        ))
+        for name in names:
+            for url, endpoints in results.items():
+                if name not in endpoints:
+                    continue
+                item = endpoints[name]
+                style = (
+                    self.style.ERROR if item['errors'] else self.style.SUCCESS
+                )
+                self.stdout.write(style(
+                    f'{name:<48} {url:<24} {item["rps"]:>8.1f} запр/с  '
+                    f'p50 {item["p50"]:>7.1f}  p95 {item["p95"]:>7.1f}  '
+                    f'p99 {item["p99"]:>7.1f} мс  ошибок {item["errors"]}'
+                ))
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import versions
+from api.db import no_statement_timeout
+from recipes import cache
+from recipes.models import Recipe
+from users.models import User
+from users.signals import USERS_VERSION_KEY
+
+
+class Command(BaseCommand):
+    help = ('Сверяет счётчики избранного, корзин, рецептов и подписчиков '
+            'с фактическими данными и исправляет расхождения')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только найти расхождения, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['verify']
+        with no_statement_timeout():
+            drifted = {
+                'рецептов': Recipe.objects.reconcile_counters(dry_run),
+                'пользователей': User.objects.reconcile_counters(dry_run),
+            }
+        summary = ', '.join(
+            f'{name}: {count}' for name, count in drifted.items()
+        )
+        if not dry_run:
+            # Счётчики правятся через update() без сигналов, поэтому
+            # кэш ответов и версии для ETag сдвигаются здесь.
+            cache.invalidate()
+            cache.touch_counters()
+            versions.bump(USERS_VERSION_KEY)
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлены счётчики у {summary}'
+            ))
+        elif any(drifted.values()):
+            raise CommandError(f'Расхождения в счётчиках у {summary}')
+        else:
+            self.stdout.write(self.style.SUCCESS('Счётчики совпадают'))
@@ -0,0 +1,300 @@
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, router, transaction
+from django.utils import timezone
+
+from api.dataset import load_ingredients, save_image
+from api.db import no_statement_timeout
+from constants import RECIPE_NAME_MAX_LENGTH
+from recipes import cache
+from recipes.models import (
+    FavoriteRecipe, IngredientInRecipe, Recipe, ShoppingCart,
+    ShoppingListItem,
+)
+from users.models import Follow, User
+
+# Строк в одном bulk_create.
+BATCH_SIZE = 5000
+# Количество ингредиента по единице измерения: (от, до, шаг).
+AMOUNTS = {'г': (10, 1000, 10), 'мл': (10, 1000, 10)}
+DEFAULT_AMOUNT = (1, 10, 1)
+DISHES = (
+    'Суп', 'Салат', 'Пирог', 'Запеканка', 'Рагу', 'Каша', 'Соус',
+    'Десерт', 'Омлет', 'Паста',
+)
+
+
+def zipf(population, rng, exponent):
+    """Перемешанная популяция и накопленные веса закона Ципфа для неё.
+
+    Популярность не совпадает с порядком id: самые частые элементы
+    разбросаны по всей таблице, как в настоящих данных.
+    """
+    population = list(population)
+    rng.shuffle(population)
+    return population, list(accumulate(
+        1 / rank ** exponent for rank in range(1, len(population) + 1)
+    ))
+
+
+def sample(rng, weighted, count):
+    """До count разных элементов, чаще популярные."""
+    population, cum_weights = weighted
+    return dict.fromkeys(
+        rng.choices(population, cum_weights=cum_weights, k=count)
+    )
+
+
+def skewed_count(rng, mean):
+    """Случайное число со средним mean: у большинства мало, у единиц много."""
+    return round(rng.expovariate(1 / mean)) if mean > 0 else 0
+
+
+def batched(objects):
+    batch = []
+    for obj in objects:
+        batch.append(obj)
+        if len(batch) == BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу синтетическими пользователями, рецептами, '
+            'подписками, избранным и корзинами для профилирования')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=10,
+            help='Среднее число ингредиентов в рецепте',
+        )
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--favorites', type=int, default=15,
+                            help='Среднее число рецептов в избранном')
+        parser.add_argument('--cart', type=int, default=3,
+                            help='Среднее число рецептов в корзине')
+        parser.add_argument(
+            '--skew', type=float, default=1.0,
+            help='Показатель закона Ципфа для популярности авторов, '
+                 'рецептов и ингредиентов',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--prefix', default='seed',
+                            help='Начало логинов и адресов пользователей')
+        parser.add_argument('--password', default='foodgram-seed')
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f'Пользователи с логином на «{prefix}» уже есть: укажите '
+                'другой --prefix'
+            )
+        self.rng = random.Random(options['seed'])
+        self.skew = options['skew']
+        started = time.perf_counter()
+        with no_statement_timeout(), transaction.atomic():
+            ingredients = self.stage('Ингредиенты', load_ingredients)
+            users = self.stage('Пользователи', self.create_users, options)
+            recipes = self.stage(
+                'Рецепты', self.create_recipes, users, ingredients, options
+            )
+            self.stage(
+                'Ингредиенты рецептов', self.create_ingredients_in_recipes
+            )
+            self.stage('Подписки', self.create_follows, users, options)
+            for model, mean in (
+                (FavoriteRecipe, options['favorites']),
+                (ShoppingCart, options['cart']),
+            ):
+                self.stage(
+                    str(model._meta.verbose_name_plural).capitalize(),
+                    self.create_links, model, users, recipes, mean,
+                )
+            self.stage('Счётчики и производные поля', self.update_derived)
+        cache.invalidate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово за {time.perf_counter() - started:.1f} с. Вход: '
+            f'{prefix}0@foodgram.local, пароль {options["password"]}'
+        ))
+
+    def stage(self, title, build, *args):
+        started = time.perf_counter()
+        self.title = title
+        result = build(*args)
+        count = len(result) if isinstance(result, list) else result
+        count = '' if count is None else f': {count}'
+        self.stdout.write(
+            f'\r{title}{count} за {time.perf_counter() - started:.1f} с'
+        )
+        return result
+
+    def progress(self, done, total):
+        if self.stdout.isatty():
+            self.stdout.write(f'\r{self.title}: {done}/{total}', ending='')
+            self.stdout.flush()
+
+    def insert(self, model, objects, total):
+        """Пишет объекты пачками и возвращает их id."""
+        ids = []
+        for batch in batched(objects):
+            ids.extend(obj.pk for obj in model.objects.bulk_create(batch))
+            self.progress(len(ids), total)
+        return ids
+
+    def insert_rows(self, model, fields, rows, total):
+        """Пишет кортежи значений fields пачками через executemany.
+
+        Для связующих таблиц на миллионы строк bulk_create слишком
+        медленный: почти всё время уходит на подготовку каждого значения
+        компилятором ORM. В PostgreSQL строки идут через COPY. Поля
+        auto_now_add получают одно время на всех.
+        """
+        meta = model._meta
+        stamps = [
+            field for field in meta.local_concrete_fields
+            if getattr(field, 'auto_now_add', False)
+        ]
+        connection = connections[router.db_for_write(model)]
+        quote = connection.ops.quote_name
+        columns = ', '.join(quote(column) for column in [
+            meta.get_field(name).column for name in fields
+        ] + [field.column for field in stamps])
+        table = quote(meta.db_table)
+        placeholders = ', '.join(['%s'] * (len(fields) + len(stamps)))
+        now = (
+            connection.ops.adapt_datetimefield_value(timezone.now()),
+        ) * len(stamps)
+        done = 0
+        with connection.cursor() as cursor:
+            for batch in batched(rows):
+                # copy() есть только у курсора psycopg 3.
+                if hasattr(cursor, 'copy'):
+                    with cursor.copy(
+                        f'COPY {table} ({columns}) FROM STDIN'
+                    ) as copy:
+                        for row in batch:
+                            copy.write_row(row + now)
+                else:
+                    cursor.executemany(
+                        f'INSERT INTO {table} ({columns}) '
+                        f'VALUES ({placeholders})',
+                        [row + now for row in batch],
+                    )
+                done += len(batch)
+                self.progress(done, total)
+        return done
+
+    def create_users(self, options):
+        prefix = options['prefix']
+        password = make_password(options['password'])
+        return self.insert(User, (
+            User(
+                email=f'{prefix}{idx}@foodgram.local',
+                username=f'{prefix}{idx}',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            ) for idx in range(options['users'])
+        ), options['users'])
+
+    def create_recipes(self, users, ingredients, options):
+        """Рецепты и их ингредиенты.
+
+        Несколько авторов пишут большую часть рецептов, а немногие
+        ингредиенты встречаются в рецептах намного чаще остальных.
+        """
+        rng, total = self.rng, options['recipes']
+        authors = zipf(users, rng, self.skew)
+        catalog = zipf(ingredients, rng, self.skew)
+        image = save_image()
+        mean = options['ingredients_per_recipe']
+        recipes, compositions = [], []
+        while len(recipes) < total:
+            size = min(BATCH_SIZE, total - len(recipes))
+            batch = []
+            for _ in range(size):
+                composition = list(sample(
+                    rng, catalog, max(1, round(rng.gauss(mean, mean / 3)))
+                ))
+                compositions.append(composition)
+                name = (f'{rng.choice(DISHES)}: {composition[0].name} '
+                        f'№{len(recipes) + len(batch) + 1}')
+                batch.append(Recipe(
+                    author_id=next(iter(sample(rng, authors, 1))),
+                    name=name[:RECIPE_NAME_MAX_LENGTH],
+                    text='Описание рецепта. ' * 10,
+                    cooking_time=rng.randint(5, 180),
+                    image=image,
+                ))
+            recipes.extend(obj.pk for obj in Recipe.objects.bulk_create(batch))
+            self.progress(len(recipes), total)
+        self.compositions = list(zip(recipes, compositions))
+        return recipes
+
+    def create_ingredients_in_recipes(self):
+        rng, compositions = self.rng, self.compositions
+
+        def rows():
+            for recipe_id, composition in compositions:
+                for ingredient in composition:
+                    start, stop, step = AMOUNTS.get(
+                        ingredient.measurement_unit, DEFAULT_AMOUNT
+                    )
+                    yield (
+                        recipe_id, ingredient.pk,
+                        rng.randrange(start, stop + 1, step),
+                    )
+
+        return self.insert_rows(
+            IngredientInRecipe, ('recipe', 'ingredient', 'amount'), rows(),
+            sum(len(composition) for _, composition in compositions),
+        )
+
+    def create_follows(self, users, options):
+        """Подписки со степенным распределением числа подписчиков."""
+        rng = self.rng
+        authors = zipf(users, rng, self.skew)
+        follows = [
+            (follower, following)
+            for follower in users
+            for following in sample(
+                rng, authors, skewed_count(rng, options['follows'])
+            ) if following != follower
+        ]
+        return self.insert_rows(
+            Follow, ('follower', 'following'), follows, len(follows)
+        )
+
+    def create_links(self, model, users, recipes, mean):
+        """Избранное или корзины: популярные рецепты выбирают чаще."""
+        rng = self.rng
+        popular = zipf(recipes, rng, self.skew)
+        links = [
+            (user, recipe)
+            for user in users
+            for recipe in sample(rng, popular, skewed_count(rng, mean))
+        ]
+        return self.insert_rows(
+            model, ('user', 'recipe'), links, len(links)
+        )
+
+    def update_derived(self):
+        # Без статистики по только что залитым таблицам планировщик
+        # выбирает полные чтения для подзапросов пересчёта.
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        ShoppingListItem.objects.refresh()
+        Recipe.objects.reconcile_counters()
+        Recipe.objects.update_search_vector()
+        Recipe.objects.update_ingredient_ids()
+        User.objects.reconcile_counters()
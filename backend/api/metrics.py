@@ -0,0 +1,177 @@
+import contextvars
+import threading
+import time
+from collections import Counter
+
+from rest_framework.serializers import BaseSerializer
+
+# Верхние границы корзин гистограммы задержек, мс.
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Замеры одного запроса: SQL, сериализация и общее время.
+
+    Считает запросы, их время и повторы одинаковых SELECT — признак N+1.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_ms = 0.0
+        self.serializer_ms = 0.0
+        self.serializing = False
+        self.selects = Counter()
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_ms += (time.perf_counter() - started) * 1000
+            self.queries += 1
+            if sql.lstrip()[:6].upper() == 'SELECT':
+                self.selects[sql] += 1
+
+    @property
+    def total_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.selects.values())
+
+    def top_duplicate(self):
+        if not self.duplicates:
+            return None
+        sql, count = self.selects.most_common(1)[0]
+        return {'sql': sql, 'count': count}
+
+
+def activate(metrics):
+    return _current.set(metrics)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    return metrics.execute(execute, sql, params, many, context)
+
+
+def install_wrapper(sender, connection, **kwargs):
+    """Подключает замеры к новому соединению с базой.
+
+    Обёртка остаётся на соединении навсегда и берёт замеры текущего
+    запроса из contextvars: так учитываются и запросы асинхронных
+    представлений, которые идут в потоках sync_to_async со своими
+    соединениями.
+    """
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_wrapper)
+
+
+def instrument_serializers():
+    """Учитывает время BaseSerializer.data в замерах текущего запроса.
+
+    Вложенные сериализаторы не считаются повторно: время идёт только
+    у самого внешнего .data. Ленивые queryset'ы, которые выполняются при
+    сериализации, попадают и сюда, и во время SQL.
+    """
+    data = BaseSerializer.data.fget
+    if getattr(data, 'instrumented', False):
+        return
+
+    def timed_data(serializer):
+        metrics = _current.get()
+        if metrics is None or metrics.serializing:
+            return data(serializer)
+        metrics.serializing = True
+        started = time.perf_counter()
+        try:
+            return data(serializer)
+        finally:
+            metrics.serializing = False
+            metrics.serializer_ms += (time.perf_counter() - started) * 1000
+
+    timed_data.instrumented = True
+    BaseSerializer.data = property(timed_data)
+
+
+class RequestStats:
+    """Сводка замеров по представлениям в памяти процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.views = {}
+
+    def record(self, view, metrics, total_ms, status_code):
+        with self.lock:
+            stats = self.views.setdefault(view, {
+                'count': 0,
+                'errors': 0,
+                'total_ms': 0.0,
+                'sql_ms': 0.0,
+                'serializer_ms': 0.0,
+                'queries': 0,
+                'max_queries': 0,
+                'duplicates': 0,
+                'buckets': [0] * (len(LATENCY_BUCKETS) + 1),
+            })
+            stats['count'] += 1
+            stats['errors'] += status_code >= 500
+            stats['total_ms'] += total_ms
+            stats['sql_ms'] += metrics.sql_ms
+            stats['serializer_ms'] += metrics.serializer_ms
+            stats['queries'] += metrics.queries
+            stats['max_queries'] = max(stats['max_queries'], metrics.queries)
+            stats['duplicates'] += metrics.duplicates
+            stats['buckets'][bucket_index(total_ms)] += 1
+
+    def snapshot(self):
+        with self.lock:
+            views = {view: dict(stats) for view, stats in self.views.items()}
+        return {view: summarize(stats) for view, stats in sorted(
+            views.items()
+        )}
+
+    def reset(self):
+        with self.lock:
+            self.views.clear()
+
+
+def bucket_index(total_ms):
+    for index, bound in enumerate(LATENCY_BUCKETS):
+        if total_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS)
+
+
+def summarize(stats):
+    count = stats['count']
+    histogram, cumulative = {}, 0
+    for bound, hits in zip(
+        [*map(str, LATENCY_BUCKETS), '+Inf'], stats['buckets']
+    ):
+        cumulative += hits
+        histogram[bound] = cumulative
+    return {
+        'count': count,
+        'errors': stats['errors'],
+        'avg_ms': round(stats['total_ms'] / count, 2),
+        'avg_sql_ms': round(stats['sql_ms'] / count, 2),
+        'avg_serializer_ms': round(stats['serializer_ms'] / count, 2),
+        'avg_queries': round(stats['queries'] / count, 2),
+        'max_queries': stats['max_queries'],
+        'duplicates': stats['duplicates'],
+        'latency_ms': histogram,
+    }
+
+
+request_stats = RequestStats()
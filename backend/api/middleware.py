@@ -0,0 +1,99 @@
+import json
+import logging
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import RequestMetrics, activate, deactivate, request_stats
+from .prometheus import observe_request
+
+logger = logging.getLogger(__name__)
+
+
+def view_name(request):
+    """Имя представления и действия DRF, например RecipeViewSet.list."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = match.func
+    cls = getattr(view, 'cls', None)
+    if cls is None:
+        return f'{view.__module__}.{view.__name__}'
+    method = request.method.lower()
+    actions = getattr(view, 'actions', None) or {}
+    return f'{cls.__name__}.{actions.get(method, method)}'
+
+
+class RequestMetricsMiddleware:
+    """Замеряет запросы к API и отдаёт итог в заголовке Server-Timing.
+
+    Считает SQL-запросы, их время и повторы, время сериализации (при
+    SERIALIZER_METRICS) и общее время ответа. Заголовок получают только
+    администраторы и все при DEBUG: по нему видно устройство запросов к
+    базе. Middleware копит сводку по представлениям (см. api.metrics и
+    api.prometheus) и пишет в лог запросы медленнее SLOW_REQUEST_MS.
+    У потоковых ответов учитывается только подготовка: тело отдаётся
+    уже после middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = activate(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            deactivate(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = activate(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            deactivate(token)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        total_ms = metrics.total_ms
+        view = view_name(request)
+        request_stats.record(view, metrics, total_ms, response.status_code)
+        observe_request(
+            view, request.method, response.status_code, total_ms, metrics
+        )
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or getattr(user, 'is_staff', False):
+            response['Server-Timing'] = self.server_timing(metrics, total_ms)
+        if total_ms >= settings.SLOW_REQUEST_MS:
+            logger.warning('Медленный запрос: %s', json.dumps({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'view': view,
+                'status': response.status_code,
+                'user': getattr(user, 'pk', None),
+                'total_ms': round(total_ms, 1),
+                'sql_ms': round(metrics.sql_ms, 1),
+                'serializer_ms': round(metrics.serializer_ms, 1),
+                'queries': metrics.queries,
+                'duplicates': metrics.duplicates,
+                'top_duplicate': metrics.top_duplicate(),
+            }, ensure_ascii=False))
+        return response
+
+    def server_timing(self, metrics, total_ms):
+        timings = [
+            f'db;dur={metrics.sql_ms:.1f};desc="{metrics.queries} queries, '
+            f'{metrics.duplicates} duplicates"',
+        ]
+        if settings.SERIALIZER_METRICS:
+            timings.append(f'serializer;dur={metrics.serializer_ms:.1f}')
+        timings.append(f'total;dur={total_ms:.1f}')
+        return ', '.join(timings)
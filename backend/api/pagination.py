@@ -0,0 +1,22 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CursorPaginationMixin:
+    """Включает курсорную пагинацию, если в запросе передан cursor.
+
+    Без параметра остаётся постраничная пагинация page/limit.
+    """
+
+    cursor_pagination_class = None
+    cursor_actions = ('list',)
+
+    @property
+    def paginator(self):
+        if (
+            not hasattr(self, '_paginator')
+            and self.action in self.cursor_actions
+            and CursorPagination.cursor_query_param
+            in self.request.query_params
+        ):
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
@@ -0,0 +1,16 @@
+from hmac import compare_digest
+
+from django.conf import settings
+from rest_framework import permissions
+
+
+class IsAdminOrMetricsToken(permissions.BasePermission):
+    """Администратор или запрос с токеном METRICS_TOKEN."""
+
+    def has_permission(self, request, view):
+        if request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        return bool(token) and compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {token}'
+        )
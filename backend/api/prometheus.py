@@ -0,0 +1,121 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,
+    Histogram, generate_latest, multiprocess,
+)
+
+# Под Gunicorn каждый воркер пишет значения в файлы каталога
+# PROMETHEUS_MULTIPROC_DIR, а /api/metrics складывает их по всем
+# процессам. Без переменной метрики живут в памяти процесса.
+MULTIPROCESS_DIR_ENV = 'PROMETHEUS_MULTIPROC_DIR'
+
+# Границы корзин гистограмм.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+IMAGE_SIZE_BUCKETS = tuple(2 ** power * 1024 for power in range(4, 15, 2))
+EXPORT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время ответа API по представлениям',
+    ['view', 'method'],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS = Counter(
+    'foodgram_requests',
+    'Ответы API по представлениям и статусам',
+    ['view', 'method', 'status'],
+)
+DB_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'Число SQL-запросов на один запрос к API',
+    ['view'],
+    buckets=QUERY_COUNT_BUCKETS,
+)
+DB_DURATION = Histogram(
+    'foodgram_db_duration_seconds',
+    'Время SQL-запросов за один запрос к API',
+    ['view'],
+    buckets=LATENCY_BUCKETS,
+)
+DB_DUPLICATES = Counter(
+    'foodgram_db_duplicate_queries',
+    'Повторы одинаковых SELECT в одном запросе к API',
+    ['view'],
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests',
+    'Обращения к кэшу ответов',
+    ['cache', 'result'],
+)
+IMAGE_UPLOAD_BYTES = Histogram(
+    'foodgram_image_upload_bytes',
+    'Размер загруженных изображений',
+    ['format'],
+    buckets=IMAGE_SIZE_BUCKETS,
+)
+SHOPPING_LIST_EXPORT = Histogram(
+    'foodgram_shopping_list_export_seconds',
+    'Время выгрузки списка покупок целиком',
+    ['format'],
+    buckets=EXPORT_BUCKETS,
+)
+WORKER_STARTS = Counter(
+    'foodgram_worker_starts',
+    'Запуски воркеров Gunicorn',
+)
+WORKER_EXITS = Counter(
+    'foodgram_worker_exits',
+    'Завершения воркеров Gunicorn',
+)
+WORKERS = Gauge(
+    'foodgram_workers',
+    'Живые воркеры Gunicorn',
+    multiprocess_mode='livesum',
+)
+
+
+def observe_request(view, method, status_code, total_ms, metrics):
+    REQUEST_DURATION.labels(view, method).observe(total_ms / 1000)
+    REQUESTS.labels(view, method, status_code).inc()
+    DB_QUERIES.labels(view).observe(metrics.queries)
+    DB_DURATION.labels(view).observe(metrics.sql_ms / 1000)
+    if metrics.duplicates:
+        DB_DUPLICATES.labels(view).inc(metrics.duplicates)
+
+
+def timed_stream(content, histogram):
+    """Отдаёт content без изменений и замеряет, за сколько он отдан.
+
+    Прерванные клиентом выгрузки не учитываются.
+    """
+    if hasattr(content, '__aiter__'):
+        return _atimed_stream(content, histogram)
+    return _timed_stream(content, histogram)
+
+
+def _timed_stream(content, histogram):
+    started = time.perf_counter()
+    yield from content
+    histogram.observe(time.perf_counter() - started)
+
+
+async def _atimed_stream(content, histogram):
+    started = time.perf_counter()
+    async for chunk in content:
+        yield chunk
+    histogram.observe(time.perf_counter() - started)
+
+
+def render():
+    """Метрики в текстовом формате Prometheus и их тип содержимого."""
+    if os.environ.get(MULTIPROCESS_DIR_ENV):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,49 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from .storage import image_fields, release
+
+
+def remember_replaced_images(sender, instance, update_fields=None,
+                             **kwargs):
+    if instance._state.adding:
+        return
+    changed = []
+    for model, field in image_fields():
+        if model is not sender:
+            continue
+        if update_fields is not None and field not in update_fields:
+            continue
+        value = getattr(instance, field)
+        # Загруженная, но не сохранённая ещё картинка или очищенное поле;
+        # неизменённое поле не стоит лишнего запроса.
+        if value and value._committed:
+            continue
+        changed.append(field)
+    if not changed:
+        return
+    old = sender._default_manager.filter(pk=instance.pk).values(
+        *changed
+    ).first() or {}
+    instance._replaced_images = [name for name in old.values() if name]
+
+
+def release_replaced_images(sender, instance, **kwargs):
+    # Освобождать можно только после UPDATE: вне транзакции on_commit
+    # выполняется сразу.
+    for name in instance.__dict__.pop('_replaced_images', ()):
+        transaction.on_commit(lambda name=name: release(name))
+
+
+def release_deleted_images(sender, instance, **kwargs):
+    for model, field in image_fields():
+        name = getattr(instance, field).name if model is sender else None
+        if name:
+            transaction.on_commit(lambda name=name: release(name))
+
+
+def connect():
+    for model in {model for model, _ in image_fields()}:
+        pre_save.connect(remember_replaced_images, sender=model)
+        post_save.connect(release_replaced_images, sender=model)
+        post_delete.connect(release_deleted_images, sender=model)
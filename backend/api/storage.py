@@ -0,0 +1,106 @@
+import hashlib
+import logging
+import os
+import time
+from functools import cache
+from pathlib import PurePosixPath
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage, storages
+from django.db.models import FileField
+
+from constants import CONTENT_IMAGE_DIR, IMAGE_GC_GRACE
+
+logger = logging.getLogger(__name__)
+
+# Каталог уменьшенных копий рядом с оригиналом, см. variants_of().
+VARIANTS_DIR = 'variants'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла — SHA-256 его содержимого.
+
+    Одинаковые загрузки получают одно имя images/ab/<хэш>.<расширение>,
+    и повторная запись пропускается. Удалять такие файлы напрямую нельзя:
+    на них могут ссылаться несколько строк, см. release(). Уменьшенные
+    копии сохраняются под своими именами.
+    """
+
+    def _save(self, name, content):
+        if PurePosixPath(name).parent.name == VARIANTS_DIR:
+            # Имена копий выводятся из имени оригинала.
+            return super()._save(name, content)
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = PurePosixPath(name).suffix.lower()
+        name = f'{CONTENT_IMAGE_DIR}/{digest[:2]}/{digest}{extension}'
+        if self.exists(name):
+            # Обновляем время, чтобы release() и сборщик мусора не удалили
+            # файл, пока строка с новой ссылкой ещё не сохранена.
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
+
+
+def image_storage():
+    return storages['images']
+
+
+@cache
+def image_fields():
+    """Поля моделей, которые хранят файлы в image_storage()."""
+    storage = image_storage()
+    return [
+        (model, field.name)
+        for model in apps.get_models()
+        for field in model._meta.concrete_fields
+        if isinstance(field, FileField) and field.storage is storage
+    ]
+
+
+def count_references(name):
+    return sum(
+        model._default_manager.filter(**{field: name}).count()
+        for model, field in image_fields()
+    )
+
+
+def variants_of(name):
+    """Каталог уменьшенных копий файла и общий префикс их имён."""
+    path = PurePosixPath(name)
+    return str(path.parent / VARIANTS_DIR), f'{path.stem}-'
+
+
+def file_age(storage, name):
+    return time.time() - storage.get_modified_time(name).timestamp()
+
+
+def delete_with_variants(storage, name):
+    storage.delete(name)
+    directory, prefix = variants_of(name)
+    if not storage.exists(directory):
+        return
+    for variant in storage.listdir(directory)[1]:
+        if variant.startswith(prefix):
+            storage.delete(f'{directory}/{variant}')
+
+
+def release(name):
+    """Удаляет файл и его копии, если на него больше никто не ссылается.
+
+    Недавно записанные файлы не трогает: параллельный запрос мог только
+    что получить то же имя и ещё не сохранить строку. Их уберёт
+    команда collect_images.
+    """
+    storage = image_storage()
+    if not name or count_references(name) or not storage.exists(name):
+        return
+    if file_age(storage, name) < IMAGE_GC_GRACE:
+        return
+    try:
+        delete_with_variants(storage, name)
+    except OSError:
+        logger.exception('Не удалось удалить изображение %s', name)
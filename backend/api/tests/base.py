@@ -0,0 +1,105 @@
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ingredients.models import Ingredient
+from recipes.models import IngredientInRecipe, Recipe, ShoppingListItem
+from users.models import User
+
+PASSWORD = 'test-password-42'
+IMAGE_NAME = 'images/te/test.png'
+# PNG 2x2 в том виде, в каком его присылает фронтенд.
+IMAGE_DATA = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAIAAAACCAIAAAD91JpzAAAAFk'
+    'lEQVR4nGM8oaHBwMDAxMDAwMDAAAAN6gEcJJUQNAAAAABJRU5ErkJggg=='
+)
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-test-media-')
+
+
+@override_settings(IMAGE_WORKERS=0, RECIPE_INDEX_BACKGROUND=False,
+                   MEDIA_ROOT=MEDIA_ROOT)
+class FoodgramTestCase(TestCase):
+    """Общие фабрики данных и проверки производных таблиц.
+
+    Данные создаются напрямую через ORM, а счётчики и списки покупок
+    пересчитываются один раз в finish_test_data(). Загруженные в тестах
+    файлы попадают во временный MEDIA_ROOT.
+    """
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    @classmethod
+    def create_ingredient(cls, name, unit='г'):
+        return Ingredient.objects.create(name=name, measurement_unit=unit)
+
+    @classmethod
+    def create_user(cls, username, **fields):
+        return User.objects.create_user(
+            email=f'{username}@test.local',
+            username=username,
+            first_name='Имя',
+            last_name='Фамилия',
+            password=PASSWORD,
+            **fields,
+        )
+
+    @classmethod
+    def create_recipe(cls, author, amounts, name=None):
+        """Рецепт с ингредиентами {ингредиент: количество}.
+
+        Варианты фотографии помечены готовыми, поэтому сохранение рецепта
+        не запускает их построение для несуществующего файла.
+        """
+        recipe = Recipe.objects.create(
+            author=author,
+            name=name or f'Рецепт {Recipe.objects.count() + 1}',
+            text='Описание',
+            cooking_time=10,
+            image=IMAGE_NAME,
+            image_variants={'source': IMAGE_NAME},
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(recipe=recipe, ingredient=ingredient,
+                               amount=amount)
+            for ingredient, amount in amounts.items()
+        )
+        return recipe
+
+    @classmethod
+    def finish_test_data(cls):
+        Recipe.objects.update_ingredient_ids()
+        Recipe.objects.reconcile_counters()
+        User.objects.reconcile_counters()
+        ShoppingListItem.objects.refresh()
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def assert_shopping_lists_consistent(self):
+        """Списки покупок совпадают с пересчётом по корзинам."""
+        call_command('rebuild_shopping_lists', verify=True, stdout=StringIO())
+
+    def assert_counters_consistent(self):
+        """Счётчики совпадают с пересчётом по связанным строкам."""
+        call_command('reconcile_counters', verify=True, stdout=StringIO())
+
+    def shopping_list(self, user):
+        return dict(ShoppingListItem.objects.filter(user=user).values_list(
+            'ingredient__name', 'total_amount'
+        ))
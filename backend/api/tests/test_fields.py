@@ -0,0 +1,119 @@
+import base64
+import io
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.fields import StreamingBase64ImageField
+
+
+def image_bytes(image_format, size=(2, 2), **params):
+    output = io.BytesIO()
+    image = Image.new('RGB', size, (200, 40, 40))
+    image.save(output, image_format, **params)
+    return output.getvalue()
+
+
+def encode(raw, mime='image/png'):
+    return f'data:{mime};base64,{base64.b64encode(raw).decode()}'
+
+
+class StreamingBase64ImageFieldTest(SimpleTestCase):
+    """Декодер base64 принимает изображения и отклоняет всё остальное."""
+
+    def setUp(self):
+        self.field = StreamingBase64ImageField()
+
+    def decode(self, data):
+        upload = self.field.to_internal_value(data)
+        self.addCleanup(upload.close)
+        return upload
+
+    def assertRejected(self, data, code):
+        with self.assertRaises(ValidationError) as raised:
+            self.field.to_internal_value(data)
+        self.assertEqual(raised.exception.detail[0].code, code)
+
+    def test_png(self):
+        raw = image_bytes('PNG')
+        upload = self.decode(encode(raw))
+        self.assertTrue(upload.name.endswith('.png'))
+        self.assertEqual(upload.content_type, 'image/png')
+        self.assertEqual(upload.read(), raw)
+
+    def test_payload_without_data_uri_prefix(self):
+        raw = image_bytes('GIF')
+        upload = self.decode(base64.b64encode(raw).decode())
+        self.assertTrue(upload.name.endswith('.gif'))
+
+    def test_mpo_is_accepted_as_jpeg(self):
+        image = Image.new('RGB', (4, 4))
+        raw = image_bytes('MPO', save_all=True, append_images=[image])
+        upload = self.decode(encode(raw, 'image/jpeg'))
+        self.assertTrue(upload.name.endswith('.jpg'))
+        self.assertEqual(upload.content_type, 'image/jpeg')
+
+    def test_whitespace_across_chunk_boundaries(self):
+        raw = image_bytes('PNG', size=(16, 16))
+        payload = base64.b64encode(raw).decode()
+        # Переводы строк через каждые 3 символа при кусках по 5 символов
+        # попадают и внутрь четвёрок base64, и на стыки кусков.
+        wrapped = '\r\n'.join(
+            payload[idx:idx + 3] for idx in range(0, len(payload), 3)
+        )
+        with mock.patch('api.fields.BASE64_CHUNK_SIZE', 5):
+            upload = self.decode('data:image/png;base64,' + wrapped)
+        self.assertEqual(upload.read(), raw)
+
+    def test_not_a_string(self):
+        self.assertRejected(b'abc', 'invalid_base64')
+
+    def test_bad_alphabet(self):
+        self.assertRejected('data:image/png;base64,iVBO!!!!', 'invalid_base64')
+
+    def test_truncated_payload(self):
+        data = encode(image_bytes('PNG'))
+        self.assertRejected(data[:-3], 'invalid_base64')
+
+    def test_unknown_signature(self):
+        self.assertRejected(
+            encode(b'<svg xmlns="http://www.w3.org/2000/svg"/>'),
+            'invalid_type',
+        )
+
+    def test_riff_without_webp(self):
+        self.assertRejected(
+            encode(b'RIFF\x00\x00\x00\x00WAVEfmt ' + b'\x00' * 16),
+            'invalid_type',
+        )
+
+    def test_signature_with_broken_body(self):
+        self.assertRejected(
+            encode(b'\x89PNG\r\n\x1a\n' + b'\x00' * 64), 'invalid_image'
+        )
+
+    def test_signature_differs_from_content(self):
+        # Сигнатура JPEG, за которой идёт PNG: Pillow его не узнает.
+        raw = b'\xff\xd8\xff' + image_bytes('PNG')
+        self.assertRejected(encode(raw), 'invalid_image')
+
+    def test_too_large_before_decoding(self):
+        data = encode(image_bytes('PNG', size=(64, 64)))
+        with override_settings(IMAGE_MAX_BYTES=len(data) // 4):
+            self.assertRejected(data, 'too_large')
+
+    def test_too_large_while_decoding(self):
+        raw = image_bytes('PNG', size=(64, 64))
+        # Оценка по длине строки проходит, превышение видно только после
+        # декодирования.
+        with override_settings(IMAGE_MAX_BYTES=len(raw) - 1):
+            self.assertRejected(encode(raw), 'too_large')
+
+    @override_settings(IMAGE_MAX_PIXELS=15)
+    def test_too_many_pixels(self):
+        self.assertRejected(
+            encode(image_bytes('PNG', size=(4, 4))), 'too_many_pixels'
+        )
+        self.decode(encode(image_bytes('PNG', size=(3, 5))))
@@ -0,0 +1,78 @@
+import random
+
+from api.budgets import ENDPOINTS, EndpointClient, endpoint_context
+from api.dataset import seed_dataset
+from api.tests.base import FoodgramTestCase
+from recipes import cache
+
+# Число SQL-запросов каждого эндпоинта из ENDPOINTS. Оно не должно
+# зависеть от объёма данных, поэтому проверяется на маленькой базе.
+QUERY_BUDGETS = {
+    'recipes_list': 6,
+    'recipes_list_100': 6,
+    'recipes_list_anonymous': 4,
+    'recipes_filtered': 6,
+    'recipes_search': 6,
+    'recipes_by_ingredients': 6,
+    'recipes_cook_with': 6,
+    'recipe_detail': 6,
+    'subscriptions': 4,
+    'ingredients_search': 1,
+    'download_shopping_cart': 2,
+    'download_shopping_cart_pdf': 2,
+    'favorite_add': 6,
+    'favorite_remove': 5,
+    'shopping_cart_add': 10,
+    'shopping_cart_remove': 9,
+    'subscribe': 7,
+    'unsubscribe': 5,
+    'favorite_bulk_add': 6,
+    'favorite_bulk_remove': 6,
+    'shopping_cart_bulk_add': 11,
+    'shopping_cart_bulk_remove': 11,
+    'subscribe_bulk': 6,
+    'unsubscribe_bulk': 6,
+}
+
+
+class EndpointQueriesTest(FoodgramTestCase):
+    """Число SQL-запросов эндпоинтов API на прогретых кэшах процесса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        reader, _, _ = seed_dataset(
+            random.Random(42), users_count=40, recipes_count=120,
+            follows_count=10,
+        )
+        cls.context = endpoint_context(reader)
+
+    def test_every_endpoint_has_a_budget(self):
+        self.assertEqual(
+            set(QUERY_BUDGETS), {name for name, *_ in ENDPOINTS}
+        )
+
+    def test_query_counts(self):
+        client = EndpointClient(self.context)
+        # Первый проход строит индексы поиска и версии кэша, которые в
+        # работающем процессе уже готовы. Добавления и удаления идут
+        # парами, поэтому второй проход видит те же данные.
+        for name, method, url, expected, _ in ENDPOINTS:
+            response = client.request(name, method, url)
+            self.assertEqual(response.status_code, expected, name)
+        for name, method, url, expected, _ in ENDPOINTS:
+            if name.endswith('anonymous'):
+                # Ответ из прошлого прохода лежит в кэше, а проверяется
+                # его построение.
+                cache.invalidate()
+            with self.subTest(name), \
+                    self.assertNumQueries(QUERY_BUDGETS[name]):
+                response = client.request(name, method, url)
+            self.assertEqual(response.status_code, expected, name)
+
+    def test_cached_anonymous_list(self):
+        client = EndpointClient(self.context)
+        url = '/api/recipes/?limit=100'
+        client.request('recipes_list_anonymous', 'get', url)
+        with self.assertNumQueries(0):
+            response = client.request('recipes_list_anonymous', 'get', url)
+        self.assertEqual(response.status_code, 200)
@@ -1,18 +1,34 @@
+from django.conf import settings
 from django.urls import include, path
 
 from rest_framework.routers import DefaultRouter
 
-from ingredients.views import IngredientCatalogView
-from recipes.views import RecipeViewSet
+from ingredients.views import (
+    AsyncIngredientCatalogView, IngredientCatalogView,
+)
+from recipes.views import AsyncRecipeViewSet, RecipeViewSet
 from users.views import ExtendedUserViewSet
 
+from .views import MetricsView, RequestStatsView
+
+# Под ASGI горячие чтения обслуживают асинхронные варианты представлений.
+if settings.ASYNC_VIEWS:
+    ingredient_views = AsyncIngredientCatalogView
+    recipe_views = AsyncRecipeViewSet
+else:
+    ingredient_views = IngredientCatalogView
+    recipe_views = RecipeViewSet
 
 router = DefaultRouter()
 router.register(r'users', ExtendedUserViewSet, basename='users')
-router.register(r'ingredients', IngredientCatalogView, basename='ingredients')
-router.register(r'recipes', RecipeViewSet, basename='recipes')
+router.register(r'ingredients', ingredient_views, basename='ingredients')
+router.register(r'recipes', recipe_views, basename='recipes')
 
 urlpatterns = [
     path('', include(router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path(
+        'request-stats/', RequestStatsView.as_view(), name='request_stats'
+    ),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
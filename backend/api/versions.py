@@ -0,0 +1,36 @@
+import time
+
+from django.core.cache import cache
+
+
+def fresh():
+    # Версия из текущего времени больше любой выданной раньше, поэтому
+    # вытесненный из кэша ключ версии не возвращает в оборот старые
+    # записи, как вернул бы сброс на 1.
+    return time.time_ns()
+
+
+def get(key):
+    """Текущая версия набора данных из общего кэша."""
+    return cache.get_or_set(key, fresh, None)
+
+
+async def aget(key):
+    return await cache.aget_or_set(key, fresh, None)
+
+
+def bump(*keys):
+    """Сдвигает версии после изменения данных.
+
+    Версии лежат в кэше, поэтому при нескольких воркерах кэш должен быть
+    общим (Redis, файлы): иначе сдвиг увидит только один воркер.
+    Возвращает новые версии в порядке ключей.
+    """
+    bumped = []
+    for key in keys:
+        try:
+            bumped.append(cache.incr(key))
+        except ValueError:
+            bumped.append(fresh())
+            cache.set(key, bumped[-1], None)
+    return bumped
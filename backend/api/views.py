@@ -0,0 +1,29 @@
+from django.http import HttpResponse
+from rest_framework import permissions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import prometheus
+from .metrics import request_stats
+from .permissions import IsAdminOrMetricsToken
+
+
+class RequestStatsView(APIView):
+    """Сводка замеров запросов по представлениям текущего процесса."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(request_stats.snapshot(), status=status.HTTP_200_OK)
+
+    def delete(self, request):
+        request_stats.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MetricsView(APIView):
+    """Метрики в текстовом формате Prometheus по всем воркерам."""
+    permission_classes = [IsAdminOrMetricsToken]
+
+    def get(self, request):
+        content, content_type = prometheus.render()
+        return HttpResponse(content, content_type=content_type)
@@ -10,3 +10,18 @@ MAX_EMAIL_LENGTH = 254
 MAX_NAME_LENGTH = 150
 USER_PAGE_SIZE = 6
 RECIPE_PAGE_SIZE = 6
+SHOPPING_LIST_CHUNK_SIZE = 2000
+INGREDIENT_SEARCH_LIMIT = 50
+INGREDIENT_INDEX_TTL = 300
+RECIPE_CACHE_TIMEOUT = 300
+SEARCH_CONFIG = 'russian'
+RECIPE_SEARCH_LIMIT = 1000
+RECIPE_INDEX_MAX_CHANGES = 1000
+RECIPE_INDEX_CHANGES_TIMEOUT = 60 * 60
+INGREDIENT_FILTER_LIMIT = 50
+IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+IMAGE_VARIANT_FORMATS = ('webp', 'avif')
+BASE64_CHUNK_SIZE = 64 * 1024
+CONTENT_IMAGE_DIR = 'images'
+IMAGE_GC_GRACE = 10 * 60
+BULK_ACTION_LIMIT = 100
@@ -6,11 +6,26 @@ python manage.py collectstatic --noinput
 echo "Running makemigrations..."
 python manage.py makemigrations
 
+# Миграции данных на большой базе идут дольше ограничения на запрос.
 echo "Running migrate..."
-python manage.py migrate
+DB_STATEMENT_TIMEOUT=0 python manage.py migrate
 
 echo "Importing ingredients..."
 python manage.py import_ingredients
 
+# Воркеры Gunicorn пишут метрики в общий каталог, /api/metrics складывает
+# их по всем процессам. Значения прошлого запуска удаляются.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/foodgram-metrics}"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+rm -f "$PROMETHEUS_MULTIPROC_DIR"/*.db
+
+# SERVER_MODE=asgi запускает воркеры uvicorn с асинхронными представлениями.
+# Число воркеров и прочие параметры задаются через GUNICORN_CMD_ARGS.
+if [ "$SERVER_MODE" = "asgi" ]; then
+    echo "Starting Gunicorn with Uvicorn workers..."
+    exec gunicorn foodgram_backend.asgi:application \
+        --worker-class uvicorn_worker.UvicornWorker --bind 0.0.0.0:8000
+fi
+
 echo "Starting Gunicorn..."
 exec gunicorn foodgram_backend.wsgi:application --bind 0.0.0.0:8000
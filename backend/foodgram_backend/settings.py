@@ -56,6 +56,18 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Замеры запросов: заголовок Server-Timing, сводка по представлениям в
+# /api/request-stats/ и журнал запросов медленнее SLOW_REQUEST_MS.
+REQUEST_METRICS = env.bool('REQUEST_METRICS', default=True)
+SLOW_REQUEST_MS = env.int('SLOW_REQUEST_MS', default=500)
+# Время сериализации в замерах; включает обёртку BaseSerializer.data.
+SERIALIZER_METRICS = env.bool('SERIALIZER_METRICS', default=False)
+if REQUEST_METRICS:
+    MIDDLEWARE.insert(0, 'api.middleware.RequestMetricsMiddleware')
+# Токен, с которым Prometheus читает /api/metrics (Authorization: Bearer).
+# Без него метрики доступны только администраторам.
+METRICS_TOKEN = env.str('METRICS_TOKEN', default='')
+
 ROOT_URLCONF = 'foodgram_backend.urls'
 
 TEMPLATES = [
@@ -87,6 +99,23 @@ if USE_SQLITE:
         }
     }
 else:
+    # DB_POOL=True держит в каждом воркере пул соединений psycopg, иначе
+    # соединение переживает запрос и закрывается через DB_CONN_MAX_AGE
+    # секунд простоя. Под ASGI постоянные соединения копятся по потокам,
+    # поэтому asgi.py по умолчанию их отключает: там нужен пул.
+    DB_POOL = env.bool('DB_POOL', default=False)
+    # Запросы дольше DB_STATEMENT_TIMEOUT мс PostgreSQL прерывает; 0 —
+    # без ограничения.
+    DB_STATEMENT_TIMEOUT = env.int('DB_STATEMENT_TIMEOUT', default=30000)
+    db_options = {}
+    if DB_STATEMENT_TIMEOUT:
+        db_options['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT}'
+    if DB_POOL:
+        db_options['pool'] = {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=1),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=4),
+            'timeout': env.float('DB_POOL_TIMEOUT', default=10),
+        }
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.postgresql',
@@ -95,9 +124,25 @@ else:
             'PASSWORD': env('PG_DB_PASSWORD'),
             'HOST': env('PG_DB_HOST'),
             'PORT': env('PG_DB_PORT'),
+            # Пул сам проверяет соединения и несовместим с CONN_MAX_AGE.
+            'CONN_MAX_AGE': (
+                0 if DB_POOL else env.int('DB_CONN_MAX_AGE', default=60)
+            ),
+            'CONN_HEALTH_CHECKS': not DB_POOL,
+            'OPTIONS': db_options,
         }
     }
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# CACHE_URL=redis://redis:6379/1 переключает кэш на Redis. Кэш в памяти
+# процесса годится только для одного воркера: версии, по которым
+# сбрасываются ответы, должны быть общими (см. gunicorn.conf.py).
+
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -134,6 +179,33 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+    # Фотографии рецептов и аватары: одно содержимое — один файл.
+    'images': {
+        'BACKEND': 'api.storage.ContentAddressedStorage',
+    },
+}
+
+# Потоки для построения уменьшенных копий изображений; 0 — строить
+# копии сразу в запросе.
+IMAGE_WORKERS = env.int('IMAGE_WORKERS', default=2)
+# Перестраивать поисковый индекс SQLite в фоновом потоке, отвечая до
+# замены по старому; False — перестраивать прямо в запросе.
+RECIPE_INDEX_BACKGROUND = env.bool('RECIPE_INDEX_BACKGROUND', default=True)
+# Ограничения на загружаемые изображения (рецепты и аватары).
+IMAGE_MAX_BYTES = env.int('IMAGE_MAX_BYTES', default=10 * 1024 * 1024)
+IMAGE_MAX_PIXELS = env.int('IMAGE_MAX_PIXELS', default=40_000_000)
+
+# Асинхронные представления для горячих чтений; asgi.py включает их по
+# умолчанию, под WSGI они только добавили бы цикл событий на запрос.
+ASYNC_VIEWS = env.bool('ASYNC_VIEWS', default=False)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
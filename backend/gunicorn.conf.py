@@ -0,0 +1,36 @@
+# Gunicorn читает этот файл из рабочего каталога при каждом запуске.
+# Хуки ведут счётчики воркеров для /api/metrics, см. api/prometheus.py,
+# и не дают запустить несколько воркеров с кэшем в памяти процесса.
+import os
+
+from prometheus_client import multiprocess
+
+LOCAL_CACHE_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def on_starting(server):
+    os.environ.setdefault(
+        'DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings'
+    )
+    from django.conf import settings
+    # Версии кэша ответов в памяти воркера: сброс после записи дошёл бы
+    # только до одного из них, остальные отдавали бы устаревшие данные.
+    if (server.cfg.workers > 1
+            and settings.CACHES['default']['BACKEND'] == LOCAL_CACHE_BACKEND):
+        raise RuntimeError(
+            'Несколько воркеров требуют общего кэша: задайте CACHE_URL, '
+            'например redis://redis:6379/1 или filecache:///tmp/foodgram-cache'
+        )
+
+
+def post_fork(server, worker):
+    from api.prometheus import WORKER_STARTS, WORKERS
+    WORKER_STARTS.inc()
+    WORKERS.set(1)
+
+
+def child_exit(server, worker):
+    from api.prometheus import MULTIPROCESS_DIR_ENV, WORKER_EXITS
+    if os.environ.get(MULTIPROCESS_DIR_ENV):
+        multiprocess.mark_process_dead(worker.pid)
+    WORKER_EXITS.inc()
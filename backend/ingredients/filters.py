@@ -1,11 +0,0 @@
-from django_filters import rest_framework as filters
-
-from .models import Ingredient
-
-
-class IngredientSearchFilter(filters.FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='istartswith')
-
-    class Meta:
-        model = Ingredient
-        fields = ['name']
@@ -1,54 +1,143 @@
+import csv
+import io
 import json
+import time
 from pathlib import Path
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
 
 from ingredients.models import Ingredient
+from ingredients.search import ingredient_index
 
 
 class Command(BaseCommand):
-    help = 'Загружает ингредиенты из JSON-файла в базу данных'
+    help = 'Загружает ингредиенты из JSON- или CSV-файла в базу данных'
     file_name = 'ingredients.json'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            type=Path,
+            help='Путь к файлу .json или .csv (по умолчанию ingredients.json)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только посчитать новые записи, ничего не сохраняя',
+        )
+
     def handle(self, *args, **options):
-        file_path = self.get_ingredient_file_path()
+        file_path = options['path'] or self.get_ingredient_file_path()
 
         if not file_path.exists():
             self.report_file_missing(file_path)
             return
 
+        started = time.perf_counter()
         try:
-            items = self.read_json_data(file_path)
-            inserted = self.insert_ingredients(items)
-            self.stdout.write(self.style.SUCCESS(
-                f'Добавлено новых записей: {inserted}'
-            ))
+            with transaction.atomic():
+                read, inserted = self.insert_ingredients(
+                    self.read_rows(file_path),
+                    options['batch_size'],
+                    options['dry_run'],
+                )
         except Exception as exc:
             self.stderr.write(self.style.ERROR(
                 f'Произошла ошибка во время обработки: {exc}'
             ))
+            return
+        if inserted and not options['dry_run']:
+            ingredient_index.invalidate()
+
+        elapsed = time.perf_counter() - started
+        prefix = 'Будет добавлено' if options['dry_run'] else 'Добавлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{prefix} новых записей: {inserted}'
+        ))
+        self.stdout.write(
+            f'Прочитано строк: {read}, время: {elapsed:.2f} с, '
+            f'{read / elapsed if elapsed else read:.0f} строк/с'
+        )
 
     def get_ingredient_file_path(self):
         return Path(settings.BASE_DIR) / self.file_name
 
-    def read_json_data(self, path):
-        with open(path, encoding='utf-8') as json_file:
-            return json.load(json_file)
-
-    def insert_ingredients(self, ingredients):
-        added_count = 0
-        for entry in ingredients:
-            name = entry.get('name', '').strip()
-            unit = entry.get('measurement_unit', '').strip()
-            if name and unit:
-                _, created = Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=unit
+    def read_rows(self, path):
+        with open(path, encoding='utf-8') as data_file:
+            if path.suffix == '.csv':
+                entries = (
+                    {'name': row[0], 'measurement_unit': row[1]}
+                    for row in csv.reader(data_file) if len(row) == 2
                 )
-                if created:
-                    added_count += 1
-        return added_count
+            else:
+                entries = json.load(data_file)
+            for entry in entries:
+                name = entry.get('name', '').strip()
+                unit = entry.get('measurement_unit', '').strip()
+                if name and unit:
+                    yield name, unit
+
+    def insert_ingredients(self, rows, batch_size, dry_run):
+        seen = set(
+            Ingredient.objects.values_list('name', 'measurement_unit')
+        )
+        read = added_count = 0
+        batch = []
+        for key in rows:
+            read += 1
+            if key in seen:
+                continue
+            seen.add(key)
+            batch.append(key)
+            if len(batch) == batch_size:
+                added_count += self.flush(batch, dry_run)
+                batch = []
+        if batch:
+            added_count += self.flush(batch, dry_run)
+        return read, added_count
+
+    def flush(self, batch, dry_run):
+        if dry_run:
+            return len(batch)
+        with connection.cursor() as cursor:
+            # COPY доступен только в PostgreSQL: copy() в psycopg 3 и
+            # copy_expert() в psycopg2.
+            if hasattr(cursor, 'copy') or hasattr(cursor, 'copy_expert'):
+                return self.copy_batch(cursor, batch)
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=unit)
+             for name, unit in batch],
+            ignore_conflicts=True,
+        )
+        return len(batch)
+
+    def copy_batch(self, cursor, batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        cursor.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS ingredients_import '
+            '(name text, measurement_unit text) ON COMMIT DROP'
+        )
+        sql = ('COPY ingredients_import (name, measurement_unit) '
+               'FROM STDIN WITH (FORMAT csv)')
+        if hasattr(cursor, 'copy'):
+            with cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+        else:
+            cursor.copy_expert(sql, buffer)
+        cursor.execute(
+            f'INSERT INTO {Ingredient._meta.db_table} '
+            '(name, measurement_unit) '
+            'SELECT name, measurement_unit FROM ingredients_import '
+            'ON CONFLICT DO NOTHING'
+        )
+        inserted = cursor.rowcount
+        cursor.execute('TRUNCATE ingredients_import')
+        return inserted
 
     def report_file_missing(self, path):
         self.stderr.write(f'Файл не найден: {path}')
@@ -0,0 +1,33 @@
+# Generated by Django 5.2 on 2026-10-18 18:12
+
+from django.db import migrations
+
+INDEX_NAME = 'ingredient_name_upper_like_idx'
+
+
+def create_name_prefix_index(apps, schema_editor):
+    # name__istartswith в PostgreSQL превращается в UPPER(name) LIKE 'X%',
+    # такой запрос может использовать только индекс с text_pattern_ops.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+        'ON ingredients_ingredient (UPPER(name) text_pattern_ops)'
+    )
+
+
+def drop_name_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ingredients', '0003_alter_ingredient_measurement_unit'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_prefix_index, drop_name_prefix_index),
+    ]
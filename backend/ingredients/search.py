@@ -0,0 +1,96 @@
+import threading
+import time
+from bisect import bisect_left
+from hashlib import md5
+
+from asgiref.sync import sync_to_async
+
+from constants import INGREDIENT_INDEX_TTL
+
+from .models import Ingredient
+from .serializers import IngredientSerializer
+
+
+class IngredientIndex:
+    """Отсортированный по названию каталог ингредиентов в памяти процесса.
+
+    Строится при первом обращении и сбрасывается сигналами модели
+    Ingredient; TTL ограничивает устаревание в других процессах.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = None
+        self._items = None
+        self._version = None
+        self._built_at = 0
+
+    def invalidate(self):
+        with self._lock:
+            self._keys = self._items = None
+
+    def _is_stale(self):
+        return (
+            self._items is None
+            or time.monotonic() - self._built_at > INGREDIENT_INDEX_TTL
+        )
+
+    def _load(self):
+        with self._lock:
+            if self._is_stale():
+                items = sorted(
+                    IngredientSerializer(
+                        Ingredient.objects.all(), many=True
+                    ).data,
+                    key=lambda item: item['name'].casefold(),
+                )
+                self._keys = [item['name'].casefold() for item in items]
+                self._items = items
+                self._version = md5(repr(items).encode()).hexdigest()
+                self._built_at = time.monotonic()
+            return self._keys, self._items, self._version
+
+    async def _aload(self):
+        """То же, что _load(), но к базе обращается только при пересборке."""
+        with self._lock:
+            if not self._is_stale():
+                return self._keys, self._items, self._version
+        return await sync_to_async(self._load)()
+
+    @property
+    def version(self):
+        """Хэш содержимого каталога, меняется при любой его правке."""
+        return self._load()[2]
+
+    def all(self):
+        return self._load()[1]
+
+    def search(self, name, limit):
+        """Ищет по началу названия, а если совпадений нет — по вхождению."""
+        return self._search(*self._load()[:2], name, limit)
+
+    async def aversion(self):
+        return (await self._aload())[2]
+
+    async def aall(self):
+        return (await self._aload())[1]
+
+    async def asearch(self, name, limit):
+        return self._search(*(await self._aload())[:2], name, limit)
+
+    def _search(self, keys, items, name, limit):
+        prefix = name.casefold()
+        start = bisect_left(keys, prefix)
+        found = []
+        for idx in range(start, len(keys)):
+            if len(found) == limit or not keys[idx].startswith(prefix):
+                break
+            found.append(items[idx])
+        if found:
+            return found
+        return [
+            item for key, item in zip(keys, items) if prefix in key
+        ][:limit]
+
+
+ingredient_index = IngredientIndex()
@@ -1,14 +1,59 @@
-from django_filters.rest_framework import DjangoFilterBackend
+from adrf.viewsets import GenericViewSet as AsyncGenericViewSet
+from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
-from .filters import IngredientSearchFilter
+from api.conditional import aconditional_get, conditional_get
+from constants import INGREDIENT_SEARCH_LIMIT
+
 from .models import Ingredient
+from .search import ingredient_index
 from .serializers import IngredientSerializer
 
 
 class IngredientCatalogView(ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = [DjangoFilterBackend]
-    filterset_class = IngredientSearchFilter
     pagination_class = None
+
+    def list(self, request, *args, **kwargs):
+        return conditional_get(
+            request,
+            lambda: self._build_list(request),
+            ingredient_index.version,
+        )
+
+    def _build_list(self, request):
+        name = request.query_params.get('name')
+        if name:
+            return Response(
+                ingredient_index.search(name, INGREDIENT_SEARCH_LIMIT)
+            )
+        return Response(ingredient_index.all())
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_get(
+            request,
+            lambda: super(IngredientCatalogView, self).retrieve(
+                request, *args, **kwargs
+            ),
+            ingredient_index.version,
+        )
+
+
+class AsyncIngredientCatalogView(AsyncGenericViewSet, IngredientCatalogView):
+    """Каталог для режима ASGI: поиск идёт по индексу без потока воркера."""
+
+    async def list(self, request, *args, **kwargs):
+        return await aconditional_get(
+            request,
+            lambda: self._abuild_list(request),
+            await ingredient_index.aversion(),
+        )
+
+    async def _abuild_list(self, request):
+        name = request.query_params.get('name')
+        if name:
+            return Response(
+                await ingredient_index.asearch(name, INGREDIENT_SEARCH_LIMIT)
+            )
+        return Response(await ingredient_index.aall())
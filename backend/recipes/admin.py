@@ -1,7 +1,10 @@
 from django.contrib import admin
+from django.db import transaction
 
+from . import cache
 from .models import (Recipe, IngredientInRecipe, FavoriteRecipe,
-                     ShoppingCart)
+                     ShoppingCart, ShoppingListItem)
+from .signals import ingredients_changed
 
 
 class IngredientInRecipeInline(admin.TabularInline):
@@ -12,13 +15,23 @@ class IngredientInRecipeInline(admin.TabularInline):
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'cooking_time',
-                    'created_at', 'image_tag')
+    list_display = ('name', 'author', 'cooking_time', 'favorites_count',
+                    'in_carts_count', 'created_at', 'image_tag')
     search_fields = ('name', 'author__username', 'author__email')
     list_filter = ('author', 'created_at')
     ordering = ('-created_at',)
     inlines = [IngredientInRecipeInline]
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        ingredients_changed(form.instance.pk)
+
+    def delete_model(self, request, obj):
+        Recipe.objects.filter(pk=obj.pk).delete_with_derived()
+
+    def delete_queryset(self, request, queryset):
+        queryset.delete_with_derived()
+
 
 @admin.register(IngredientInRecipe)
 class IngredientInRecipeAdmin(admin.ModelAdmin):
@@ -27,9 +40,59 @@ class IngredientInRecipeAdmin(admin.ModelAdmin):
     list_filter = ('ingredient',)
     ordering = ('-created_at',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Строку могли перенести в другой рецепт, пересобираются оба.
+        ingredients_changed(
+            obj.recipe_id, form.initial.get('recipe', obj.recipe_id)
+        )
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        ingredients_changed(obj.recipe_id)
+
+    def delete_queryset(self, request, queryset):
+        recipe_ids = list(queryset.values_list('recipe', flat=True))
+        super().delete_queryset(request, queryset)
+        ingredients_changed(*recipe_ids)
+
+
+class RecipeLinkAdmin(admin.ModelAdmin):
+    """Правки избранного и корзин пересчитывают счётчики рецептов.
+
+    Пересчёт идёт подзапросом по связанным строкам, поэтому строка,
+    перенесённая в другой рецепт, правит счётчики обоих.
+    """
+
+    def links_changed(self, users, recipes):
+        Recipe.objects.filter(pk__in=recipes).reconcile_counters()
+        transaction.on_commit(cache.touch_counters)
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            self.links_changed(
+                {obj.user_id, form.initial.get('user', obj.user_id)},
+                {obj.recipe_id, form.initial.get('recipe', obj.recipe_id)},
+            )
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            self.links_changed([obj.user_id], [obj.recipe_id])
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            users, recipes = set(), set()
+            for user, recipe in queryset.values_list('user', 'recipe'):
+                users.add(user)
+                recipes.add(recipe)
+            super().delete_queryset(request, queryset)
+            self.links_changed(users, recipes)
+
 
 @admin.register(FavoriteRecipe)
-class FavoriteRecipeAdmin(admin.ModelAdmin):
+class FavoriteRecipeAdmin(RecipeLinkAdmin):
     list_display = ('user', 'recipe', 'added_at')
     search_fields = ('user__username', 'recipe__name')
     list_filter = ('added_at',)
@@ -37,8 +100,20 @@ class FavoriteRecipeAdmin(admin.ModelAdmin):
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(RecipeLinkAdmin):
     list_display = ('user', 'recipe', 'added_at')
     search_fields = ('user__username', 'recipe__name')
     list_filter = ('added_at',)
     ordering = ('-added_at',)
+
+    # Списки покупок затронутых пользователей пересчитываются целиком:
+    # правки в админке редки, а прежний владелец строки мог смениться.
+    def links_changed(self, users, recipes):
+        super().links_changed(users, recipes)
+        ShoppingListItem.objects.refresh(users)
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'total_amount')
+    search_fields = ('user__username', 'ingredient__name')
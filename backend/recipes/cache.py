@@ -0,0 +1,127 @@
+from hashlib import md5
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+
+from api import versions
+from api.prometheus import CACHE_REQUESTS
+from constants import RECIPE_CACHE_TIMEOUT
+
+LIST_VERSION_KEY = 'recipes:list:version'
+DETAIL_VERSION_KEY = 'recipes:detail:{}:version'
+COUNTERS_VERSION_KEY = 'recipes:counters:version'
+STATS_KEY = 'recipes:cache:{}'
+
+
+def _request_hash(request):
+    query = urlencode(sorted(request.query_params.lists()), doseq=True)
+    uri = request.build_absolute_uri(request.path)
+    return md5(f'{uri}?{query}'.encode()).hexdigest()
+
+
+def _count(name):
+    CACHE_REQUESTS.labels('recipes', name).inc()
+    key = STATS_KEY.format(name)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+async def _acount(name):
+    CACHE_REQUESTS.labels('recipes', name).inc()
+    key = STATS_KEY.format(name)
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aset(key, 1, None)
+
+
+def list_state(request):
+    """Версии, от которых зависит список рецептов по этому запросу.
+
+    Счётчики избранного и корзин меняются без сброса кэша, но от них
+    зависит порядок ?ordering, поэтому у таких запросов своя версия.
+    """
+    keys = [LIST_VERSION_KEY]
+    if 'ordering' in request.query_params:
+        keys.append(COUNTERS_VERSION_KEY)
+    return tuple(versions.get(key) for key in keys)
+
+
+async def alist_state(request):
+    keys = [LIST_VERSION_KEY]
+    if 'ordering' in request.query_params:
+        keys.append(COUNTERS_VERSION_KEY)
+    return tuple([await versions.aget(key) for key in keys])
+
+
+def list_key(request, state=None):
+    version = '.'.join(map(str, state or list_state(request)))
+    return f'recipes:list:{version}:{_request_hash(request)}'
+
+
+def detail_key(request, pk):
+    version = versions.get(DETAIL_VERSION_KEY.format(pk))
+    return f'recipes:detail:{pk}:{version}:{_request_hash(request)}'
+
+
+async def alist_key(request, state=None):
+    version = '.'.join(map(str, state or await alist_state(request)))
+    return f'recipes:list:{version}:{_request_hash(request)}'
+
+
+async def adetail_key(request, pk):
+    version = await versions.aget(DETAIL_VERSION_KEY.format(pk))
+    return f'recipes:detail:{pk}:{version}:{_request_hash(request)}'
+
+
+def get_or_build(key, build):
+    """Возвращает данные ответа из кэша или строит и кэширует их."""
+    data = cache.get(key)
+    if data is not None:
+        _count('hits')
+        return data
+    _count('misses')
+    data = build()
+    cache.set(key, data, RECIPE_CACHE_TIMEOUT)
+    return data
+
+
+async def aget_or_build(key, abuild):
+    """То же, что get_or_build(), для корутины abuild."""
+    data = await cache.aget(key)
+    if data is not None:
+        await _acount('hits')
+        return data
+    await _acount('misses')
+    data = await abuild()
+    await cache.aset(key, data, RECIPE_CACHE_TIMEOUT)
+    return data
+
+
+def invalidate(*recipe_ids):
+    """Сбрасывает кэш списков и деталей указанных рецептов.
+
+    Ключи не удаляются, а уходят из оборота вместе с версией.
+    """
+    versions.bump(LIST_VERSION_KEY, *[
+        DETAIL_VERSION_KEY.format(pk) for pk in recipe_ids
+    ])
+
+
+def touch_counters():
+    """Отмечает изменение счётчиков избранного и корзин."""
+    versions.bump(COUNTERS_VERSION_KEY)
+
+
+def stats():
+    hits, misses = (
+        cache.get(STATS_KEY.format(name), 0) for name in ('hits', 'misses')
+    )
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 4) if total else None,
+    }
@@ -0,0 +1,78 @@
+from django.db import models
+
+
+class IntegerSetField(models.Field):
+    """Отсортированный набор целых чисел в одном столбце.
+
+    В PostgreSQL хранится как integer[] и ищется по GIN-индексу; в
+    остальных базах столбец хранит строку "1,5,9", а поиска по нему нет.
+    """
+    description = 'Набор целых чисел'
+
+    def db_type(self, connection):
+        if connection.vendor == 'postgresql':
+            return 'integer[]'
+        return 'text'
+
+    def from_db_value(self, value, expression, connection):
+        return self.to_python(value)
+
+    def to_python(self, value):
+        if value is None:
+            return []
+        if isinstance(value, str):
+            return [int(item) for item in value.split(',') if item]
+        return list(value)
+
+    def get_prep_value(self, value):
+        return sorted({int(item) for item in value or ()})
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if connection.vendor == 'postgresql':
+            return value
+        return ','.join(map(str, value))
+
+
+class IntegerSetLookup(models.Lookup):
+    """Сравнение наборов операторами массивов PostgreSQL."""
+    operator = None
+
+    def as_sql(self, compiler, connection):
+        lhs, params = self.process_lhs(compiler, connection)
+        return f'{lhs} {self.operator} %s::integer[]', (*params, self.rhs)
+
+
+@IntegerSetField.register_lookup
+class ContainsAll(IntegerSetLookup):
+    lookup_name = 'contains_all'
+    operator = '@>'
+
+
+@IntegerSetField.register_lookup
+class Overlaps(IntegerSetLookup):
+    lookup_name = 'overlaps'
+    operator = '&&'
+
+
+class MatchedCount(models.Func):
+    """Число элементов набора, входящих в переданный список."""
+    output_field = models.IntegerField()
+
+    def __init__(self, expression, items):
+        super().__init__(expression)
+        self.items = sorted(set(items))
+
+    def as_sql(self, compiler, connection):
+        lhs, params = compiler.compile(self.source_expressions[0])
+        return (
+            f'cardinality(ARRAY(SELECT unnest({lhs}) '
+            'INTERSECT SELECT unnest(%s::integer[])))',
+            (*params, self.items),
+        )
+
+
+class SetSize(models.Func):
+    function = 'cardinality'
+    output_field = models.IntegerField()
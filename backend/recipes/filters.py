@@ -1,17 +1,71 @@
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
+
+from constants import INGREDIENT_FILTER_LIMIT
 
 from .models import Recipe
 
 
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
+
+
+class RecipeOrderingFilter(filters.OrderingFilter):
+
+    def filter(self, queryset, value):
+        queryset = super().filter(queryset, value)
+        if value:
+            # Равные счётчики не должны перемешиваться между страницами.
+            queryset = queryset.order_by(*queryset.query.order_by, '-id')
+        return queryset
+
+
 class RecipeFilter(filters.FilterSet):
+    search = filters.CharFilter(method='filter_search')
+    ingredients = NumberInFilter(method='filter_ingredients')
+    exclude_ingredients = NumberInFilter(method='filter_exclude_ingredients')
+    cook_with = NumberInFilter(method='filter_cook_with')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = RecipeOrderingFilter(
+        fields=(
+            ('favorites_count', 'popular'),
+            ('in_carts_count', 'in_carts'),
+            ('created_at', 'created'),
+        ),
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author', 'search', 'ingredients', 'exclude_ingredients',
+            'cook_with', 'is_favorited', 'is_in_shopping_cart', 'ordering',
+        )
+
+    def filter_search(self, queryset, name, value):
+        if not value.strip():
+            return queryset
+        return queryset.search(value)
+
+    def get_ingredient_ids(self, name, value):
+        if len(value) > INGREDIENT_FILTER_LIMIT:
+            raise ValidationError({
+                name: f'Не больше {INGREDIENT_FILTER_LIMIT} ингредиентов.'
+            })
+        return [int(item) for item in value]
+
+    def filter_ingredients(self, queryset, name, value):
+        return queryset.with_ingredients(self.get_ingredient_ids(name, value))
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        return queryset.without_ingredients(
+            self.get_ingredient_ids(name, value)
+        )
+
+    def filter_cook_with(self, queryset, name, value):
+        return queryset.cook_with(self.get_ingredient_ids(name, value))
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
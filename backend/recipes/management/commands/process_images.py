@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from api.db import no_statement_timeout
+from api.images import process_image
+from recipes import cache
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии фотографий рецептов, которых ещё нет'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересобрать копии для всех рецептов',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'pk', 'image', 'image_variants'
+        )
+        processed = 0
+        # Одинаковые фотографии хранятся одним файлом и обрабатываются
+        # за один вызов сразу для всех рецептов с ними.
+        seen = set()
+        with no_statement_timeout():
+            for recipe in recipes.iterator(chunk_size=500):
+                if recipe.image.name in seen or (
+                    recipe.image_variants_ready and not options['all']
+                ):
+                    continue
+                seen.add(recipe.image.name)
+                process_image(
+                    Recipe, recipe.pk, 'image', 'image_variants',
+                    on_ready=cache.invalidate, force=options['all'],
+                )
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано фотографий: {processed}'
+        ))
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.db import no_statement_timeout
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает или проверяет сохранённые списки покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сравнить списки с корзинами, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        with no_statement_timeout():
+            if options['verify']:
+                self.verify()
+                return
+            ShoppingListItem.objects.refresh()
+            total = ShoppingListItem.objects.count()
+        self.stdout.write(self.style.SUCCESS(
+            f'Позиций в списках покупок: {total}'
+        ))
+
+    def verify(self):
+        expected = {
+            (row['user'], row['ingredient']): row['total_amount']
+            for row in ShoppingListItem.objects.calculate().iterator()
+        }
+        stored = {
+            (user, ingredient): total_amount
+            for user, ingredient, total_amount
+            in ShoppingListItem.objects.values_list(
+                'user', 'ingredient', 'total_amount'
+            ).iterator()
+        }
+        mismatches = {
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        for user, ingredient in sorted(mismatches):
+            self.stderr.write(
+                f'Пользователь {user}, ингредиент {ingredient}: '
+                f'ожидалось {expected.get((user, ingredient))}, '
+                f'сохранено {stored.get((user, ingredient))}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('Списки покупок совпадают'))
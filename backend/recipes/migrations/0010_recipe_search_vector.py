@@ -0,0 +1,76 @@
+# Generated by Django 5.2 on 2026-10-18 18:13
+
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import OuterRef, Subquery, TextField, Value
+from django.db.models.functions import Coalesce
+
+INDEX_NAME = 'recipe_search_vector_idx'
+# Копия SEARCH_CONFIG на момент миграции.
+SEARCH_CONFIG = 'russian'
+
+
+def recipe_search_vector(ingredient_in_recipe):
+    """Выражение recipes.models.recipe_search_vector на момент миграции.
+
+    Миграция не импортирует модели приложения: их дальнейшие правки не
+    должны менять уже применённую схему.
+    """
+    from django.contrib.postgres.aggregates import StringAgg
+
+    ingredient_names = ingredient_in_recipe.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(
+        names=StringAgg('ingredient__name', delimiter=' ')
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(
+                Subquery(ingredient_names), Value(''),
+                output_field=TextField(),
+            ),
+            weight='B',
+            config=SEARCH_CONFIG,
+        )
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+def create_search_index(apps, schema_editor):
+    # Столбец tsvector и GIN-индекс имеют смысл только в PostgreSQL,
+    # в SQLite поиск идёт по индексу в памяти.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    apps.get_model('recipes', 'Recipe').objects.update(
+        search_vector=recipe_search_vector(
+            apps.get_model('recipes', 'IngredientInRecipe')
+        )
+    )
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+        'ON recipes_recipe USING gin (search_vector)'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recipe_favorites_count_recipe_in_carts_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2 on 2026-10-18 18:19
+
+import recipes.fields
+from collections import defaultdict
+
+from django.db import migrations
+
+INDEX_NAME = 'recipe_ingredient_ids_idx'
+
+
+def fill_ingredient_ids(apps, schema_editor):
+    # Набор id используется фильтрами только в PostgreSQL.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('recipes', 'Recipe')
+    ingredient_ids = defaultdict(list)
+    for recipe_id, ingredient_id in apps.get_model(
+        'recipes', 'IngredientInRecipe'
+    ).objects.values_list('recipe', 'ingredient').iterator(chunk_size=2000):
+        ingredient_ids[recipe_id].append(ingredient_id)
+    Recipe.objects.bulk_update(
+        [Recipe(pk=pk, ingredient_ids=ids) for pk, ids in ingredient_ids.items()],
+        ['ingredient_ids'],
+        batch_size=1000,
+    )
+    schema_editor.execute(
+        f'CREATE INDEX IF NOT EXISTS {INDEX_NAME} '
+        'ON recipes_recipe USING gin (ingredient_ids)'
+    )
+
+
+def drop_ingredient_ids_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {INDEX_NAME}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredient_ids',
+            field=recipes.fields.IntegerSetField(editable=False, null=True, verbose_name='Id ингредиентов'),
+        ),
+        migrations.RunPython(fill_ingredient_ids, drop_ingredient_ids_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 20:06
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_image_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(db_index=True, storage=api.storage.image_storage, upload_to='recipe_image', verbose_name='Фотография'),
+        ),
+    ]
@@ -1,8 +1,19 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (
+    SearchQuery, SearchRank, SearchVector, SearchVectorField,
+)
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (
+    CharField, Count, Exists, F, FloatField, Func, IntegerField, OuterRef,
+    Subquery, Sum, TextField, Value,
+)
+from django.db.models.functions import Cast, Coalesce, Concat, NullIf
 from django.utils.safestring import mark_safe
 
+from api.bulk import lock_rows
+from api.counters import DerivedFieldsMixin, reconcile_counters, related_count
+from api.storage import image_storage
 from ingredients.models import Ingredient
 from users.models import User
 from constants import (
@@ -10,10 +21,205 @@ from constants import (
     RECIPE_NAME_MAX_LENGTH,
     RECIPE_IMAGE_UPLOAD_PATH,
     MIN_INGREDIENT_AMOUNT,
+    RECIPE_SEARCH_LIMIT,
+    SEARCH_CONFIG,
 )
 
+from .fields import IntegerSetField, MatchedCount, SetSize
+
+
+def recipe_search_vector(ingredient_in_recipe):
+    """Поисковый вектор рецепта: название, ингредиенты, описание."""
+    # Агрегаты contrib.postgres требуют psycopg, нужного только PostgreSQL.
+    from django.contrib.postgres.aggregates import StringAgg
+
+    ingredient_names = ingredient_in_recipe.objects.filter(
+        recipe=OuterRef('pk')
+    ).order_by().values('recipe').annotate(
+        names=StringAgg('ingredient__name', delimiter=' ')
+    ).values('names')
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(
+            Coalesce(
+                Subquery(ingredient_names), Value(''),
+                output_field=TextField(),
+            ),
+            weight='B',
+            config=SEARCH_CONFIG,
+        )
+        + SearchVector('text', weight='C', config=SEARCH_CONFIG)
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+
+    def minified(self):
+        """Только поля, которые выводит RecipeMinifiedSerializer.
+
+        author нужен менеджеру author.recipes и prefetch_related, иначе
+        каждый рецепт догружает его отдельным запросом.
+        """
+        return self.only(
+            'id', 'author', 'name', 'image', 'image_variants', 'cooking_time'
+        )
+
+    def with_user_flags(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False),
+                is_in_shopping_cart=Value(False),
+            )
+        return self.annotate(
+            is_favorited=Exists(
+                FavoriteRecipe.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+        )
+
+    def reconcile_counters(self, dry_run=False):
+        return reconcile_counters(self, {
+            'favorites_count': related_count(FavoriteRecipe, 'recipe'),
+            'in_carts_count': related_count(ShoppingCart, 'recipe'),
+        }, dry_run)
+
+    def search(self, value):
+        """Полнотекстовый поиск, упорядоченный по релевантности.
+
+        В PostgreSQL используется search_vector с GIN-индексом, в
+        остальных базах — индекс в памяти процесса, который отдаёт не
+        больше RECIPE_SEARCH_LIMIT лучших рецептов.
+        """
+        if self._is_postgresql():
+            query = SearchQuery(
+                value, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return self.filter(search_vector=query).annotate(
+                rank=SearchRank(F('search_vector'), query)
+            ).order_by('-rank', '-id')
+        from .search import recipe_index
+        ranked = recipe_index.search(value, RECIPE_SEARCH_LIMIT)
+        if not ranked:
+            return self.none()
+        # Место id в строке ",id1,id2,...," задаёт порядок релевантности
+        # одним параметром вместо CASE на каждый найденный рецепт.
+        positions = ',{},'.format(','.join(str(pk) for pk, _ in ranked))
+        return self.filter(pk__in=[pk for pk, _ in ranked]).annotate(
+            rank=-Func(
+                Value(positions),
+                Concat(Value(','), Cast('pk', CharField()), Value(',')),
+                function='INSTR',
+                output_field=IntegerField(),
+            )
+        ).order_by('-rank', '-id')
+
+    def with_ingredients(self, ingredient_ids):
+        if self._is_postgresql():
+            return self.filter(ingredient_ids__contains_all=ingredient_ids)
+        return self.filter(pk__in=IngredientInRecipe.objects.filter(
+            ingredient__in=ingredient_ids
+        ).values('recipe').annotate(found=Count('pk')).filter(
+            found=len(set(ingredient_ids))
+        ).values('recipe'))
+
+    def without_ingredients(self, ingredient_ids):
+        if self._is_postgresql():
+            return self.exclude(ingredient_ids__overlaps=ingredient_ids)
+        return self.exclude(pk__in=IngredientInRecipe.objects.filter(
+            ingredient__in=ingredient_ids
+        ).values('recipe'))
 
-class Recipe(models.Model):
+    def cook_with(self, ingredient_ids):
+        """Рецепты хотя бы с одним из ингредиентов, упорядоченные по
+        доле ингредиентов рецепта, которые уже есть."""
+        if self._is_postgresql():
+            queryset = self.filter(
+                ingredient_ids__overlaps=ingredient_ids
+            ).annotate(
+                matched_ingredients=MatchedCount(
+                    'ingredient_ids', ingredient_ids
+                ),
+                total_ingredients=SetSize('ingredient_ids'),
+            )
+        else:
+            queryset = self.filter(pk__in=IngredientInRecipe.objects.filter(
+                ingredient__in=ingredient_ids
+            ).values('recipe')).annotate(
+                matched_ingredients=related_count(
+                    IngredientInRecipe, 'recipe', ingredient__in=ingredient_ids
+                ),
+                total_ingredients=related_count(IngredientInRecipe, 'recipe'),
+            )
+        return queryset.annotate(
+            coverage=Cast('matched_ingredients', FloatField()) / NullIf(
+                'total_ingredients', 0
+            ),
+        ).order_by('-coverage', '-matched_ingredients', '-id')
+
+    def update_ingredient_ids(self):
+        """Пересобирает ingredient_ids по таблице IngredientInRecipe.
+
+        В других базах фильтры по ингредиентам идут по индексам
+        IngredientInRecipe, и столбец не заполняется.
+        """
+        if not self._is_postgresql():
+            return
+        ingredient_ids = {pk: [] for pk in self.values_list('pk', flat=True)}
+        for recipe_id, ingredient_id in IngredientInRecipe.objects.filter(
+            recipe__in=self.values('pk')
+        ).values_list('recipe', 'ingredient').order_by().iterator(
+            chunk_size=2000
+        ):
+            ingredient_ids[recipe_id].append(ingredient_id)
+        Recipe.objects.bulk_update(
+            [Recipe(pk=pk, ingredient_ids=ids)
+             for pk, ids in ingredient_ids.items()],
+            ['ingredient_ids'],
+            batch_size=1000,
+        )
+
+    def _is_postgresql(self):
+        return connections[self.db].vendor == 'postgresql'
+
+    def update_search_vector(self):
+        if self._is_postgresql():
+            self.update(search_vector=recipe_search_vector(IngredientInRecipe))
+
+    def delete_with_derived(self):
+        """Удаляет рецепты и правит данные, которые от них зависят.
+
+        Каскад снимает рецепты из чужих корзин, поэтому списки покупок
+        владельцев корзин пересчитываются по ингредиентам рецептов, а у
+        авторов пересчитывается recipes_count. Через этот метод идут все
+        удаления: API, админка и удаление автора.
+        """
+        pks = list(self.values_list('pk', flat=True))
+        if not pks:
+            return
+        with transaction.atomic():
+            users = list(ShoppingCart.objects.filter(
+                recipe__in=pks
+            ).values_list('user', flat=True).distinct())
+            # Корзины удаляются каскадом, поэтому владельцы блокируются
+            # раньше, в том же порядке, что и при изменении корзины.
+            lock_rows(User.objects.filter(pk__in=users))
+            ingredients = list(IngredientInRecipe.objects.filter(
+                recipe__in=pks
+            ).values_list('ingredient', flat=True).distinct())
+            authors = list(self.model.objects.filter(
+                pk__in=pks
+            ).values_list('author', flat=True).distinct())
+            self.model.objects.filter(pk__in=pks).delete()
+            User.objects.filter(pk__in=authors).update(
+                recipes_count=related_count(self.model, 'author')
+            )
+            if users:
+                ShoppingListItem.objects.refresh(users, ingredients)
+
+
+class Recipe(DerivedFieldsMixin, models.Model):
     author = models.ForeignKey(
         get_user_model(),
         on_delete=models.CASCADE,
@@ -31,6 +237,9 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to=RECIPE_IMAGE_UPLOAD_PATH,
+        storage=image_storage,
+        # По имени файла ищутся строки, которые на него ссылаются.
+        db_index=True,
         verbose_name="Фотография",
     )
     text = models.TextField(
@@ -44,18 +253,93 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name="Дата создания",
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name="Дата изменения",
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="В избранном",
+    )
+    in_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name="В корзинах",
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        editable=False,
+        verbose_name="Уменьшенные копии фотографии",
+    )
+    ingredient_ids = IntegerSetField(
+        null=True,
+        editable=False,
+        verbose_name="Id ингредиентов",
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name="Поисковый вектор",
+    )
+
+    objects = RecipeQuerySet.as_manager()
+    derived_fields = (
+        "favorites_count", "in_carts_count", "image_variants",
+        "ingredient_ids", "search_vector",
+    )
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ("-created_at",)
+        indexes = [
+            models.Index(
+                fields=("-created_at", "-id"),
+                name="recipe_created_at_id_idx",
+            ),
+            models.Index(
+                fields=("author", "-created_at"),
+                name="recipe_author_created_at_idx",
+            ),
+            models.Index(
+                fields=("-favorites_count", "-id"),
+                name="recipe_favorites_count_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @property
+    def image_variants_ready(self):
+        return self.image_variants.get("source") == self.image.name
+
+    def image_srcset(self, build_url=str):
+        """Варианты фотографии по форматам в виде значений srcset."""
+        if not self.image_variants_ready:
+            return {}
+        storage = image_storage()
+        return {
+            fmt: ", ".join(
+                f"{build_url(storage.url(sizes[width]))} {width}w"
+                for width in sorted(sizes, key=int)
+            )
+            for fmt, sizes in self.image_variants.items() if fmt != "source"
+        }
+
+    def image_thumb_url(self):
+        """Самая маленькая копия фотографии, пока её нет — оригинал."""
+        if not self.image:
+            return ""
+        sizes = self.image_variants.get("webp")
+        if self.image_variants_ready and sizes:
+            return image_storage().url(sizes[min(sizes, key=int)])
+        return self.image.url
+
     def image_tag(self):
         if self.image:
-            return mark_safe(f'<img src="{self.image.url}" width="80" '
+            return mark_safe(f'<img src="{self.image_thumb_url()}" width="80" '
                              f'height="80" style="object-fit: cover;" />')
         return "Нет изображения"
 
@@ -125,6 +409,12 @@ class FavoriteRecipe(models.Model):
                 name='unique_favorite'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='favorite_recipe_user_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user.username} добавил {self.recipe.name} в избранное'
@@ -157,7 +447,122 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'],
+                name='shopping_cart_recipe_user_idx',
+            ),
+        ]
 
     def __str__(self):
         return (f'{self.user.username} добавил {self.recipe.name} '
                 f'в список покупок')
+
+
+class ShoppingListItemManager(models.Manager):
+
+    def calculate(self, users=None, ingredients=None):
+        """Считает суммы ингредиентов по корзинам пользователей."""
+        lookups = {'recipe__in_shopping_carts__isnull': False}
+        if users is not None:
+            lookups['recipe__in_shopping_carts__user__in'] = users
+        if ingredients is not None:
+            lookups['ingredient__in'] = ingredients
+        # Все условия по корзинам передаются одним filter(), чтобы
+        # values() переиспользовал тот же JOIN.
+        return IngredientInRecipe.objects.filter(**lookups).values(
+            'ingredient', user=F('recipe__in_shopping_carts__user')
+        ).annotate(total_amount=Sum('amount')).order_by()
+
+    def refresh(self, users=None, ingredients=None):
+        """Пересчитывает позиции списков покупок по корзинам.
+
+        Без аргументов пересобирает таблицу целиком, иначе только строки
+        указанных пользователей и ингредиентов.
+        """
+        items = self.all()
+        if users is not None:
+            items = items.filter(user__in=users)
+        if ingredients is not None:
+            items = items.filter(ingredient__in=ingredients)
+        totals = self.calculate(users, ingredients)
+
+        with transaction.atomic():
+            if users is not None:
+                # Иначе параллельное изменение корзины вставит строку
+                # между удалением и вставкой и получит IntegrityError.
+                lock_rows(User.objects.filter(pk__in=users))
+            items.delete()
+            self.bulk_create(
+                (ShoppingListItem(
+                    user_id=row['user'],
+                    ingredient_id=row['ingredient'],
+                    total_amount=row['total_amount'],
+                ) for row in totals.iterator()),
+                batch_size=1000,
+            )
+
+    def change(self, user, recipes, add):
+        """Прибавляет или вычитает ингредиенты рецептов в списке покупок.
+
+        Меняются только позиции ингредиентов этих рецептов, без пересчёта
+        всей корзины. Вызывается в транзакции, которая записала корзину и
+        заблокировала строку пользователя, иначе два одновременных
+        изменения потеряют друг друга.
+        """
+        amounts = dict(IngredientInRecipe.objects.filter(
+            recipe__in=recipes
+        ).order_by().values('ingredient').annotate(
+            amount=Sum('amount')
+        ).values_list('ingredient', 'amount'))
+        sign = 1 if add else -1
+        kept, emptied = [], []
+        for item in self.filter(user=user, ingredient__in=list(amounts)):
+            item.total_amount += sign * amounts.pop(item.ingredient_id)
+            if item.total_amount > 0:
+                kept.append(item)
+            else:
+                emptied.append(item.pk)
+        if kept:
+            self.bulk_update(kept, ['total_amount'])
+        if emptied:
+            self.filter(pk__in=emptied).delete()
+        if add and amounts:
+            self.bulk_create(
+                ShoppingListItem(
+                    user_id=user.pk, ingredient_id=ingredient,
+                    total_amount=amount,
+                ) for ingredient, amount in amounts.items()
+            )
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списков покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user.username}: {self.ingredient} - {self.total_amount}'
@@ -1,4 +1,5 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from constants import RECIPE_PAGE_SIZE
 
@@ -6,3 +7,34 @@ from constants import RECIPE_PAGE_SIZE
 class RecipesPagination(PageNumberPagination):
     page_size = RECIPE_PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class RecipesCursorPagination(CursorPagination):
+    """Курсор по (-created_at, -id).
+
+    Курсор задаёт порядок сам, поэтому параметры со своим порядком
+    (ordering, кроме -created, релевантность search и доля ингредиентов
+    cook_with) с ним отклоняются, а не молча теряют порядок.
+    """
+    page_size = RECIPE_PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-created_at', '-id')
+    ordering_params = {'ordering': ('', '-created')}
+    conflicting_params = ('search', 'cook_with')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        conflicts = [
+            name for name, allowed in self.ordering_params.items()
+            if params.get(name, '') not in allowed
+        ] + [
+            name for name in self.conflicting_params
+            if params.get(name, '').strip()
+        ]
+        if conflicts:
+            raise ValidationError({
+                name: 'Не поддерживается вместе с cursor, используйте '
+                      'постраничную пагинацию.'
+                for name in conflicts
+            })
+        return super().paginate_queryset(queryset, request, view)
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+from pathlib import Path
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# Встроенные шрифты PDF не содержат кириллицы, поэтому шрифт лежит в
+# репозитории и встраивается в файл только нужными символами.
+PDF_FONT = 'DejaVuSans'
+PDF_FONT_PATH = Path(__file__).resolve().parent / 'fonts' / 'DejaVuSans.ttf'
+PDF_FONT_SIZE = 11
+PDF_TITLE_SIZE = 16
+PDF_LINE_HEIGHT = PDF_FONT_SIZE * 1.4
+PDF_MARGIN = 20 * mm
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_line(values):
+    return csv.writer(Echo()).writerow(values)
+
+
+class ShoppingListRowsMixin:
+    """Отдаёт список покупок по строкам для потокового ответа.
+
+    Наследники задают начало, строку и конец списка; render_rows
+    принимает обычный итератор, arender_rows — асинхронный.
+    """
+    header = ''
+    footer = ''
+
+    def render_row(self, idx, item):
+        raise NotImplementedError
+
+    def render_rows(self, rows):
+        yield self.header
+        for idx, item in enumerate(rows, 1):
+            yield self.render_row(idx, item)
+        yield self.footer
+
+    async def arender_rows(self, rows):
+        yield self.header
+        idx = 0
+        async for item in rows:
+            idx += 1
+            yield self.render_row(idx, item)
+        yield self.footer
+
+
+class ShoppingListTextRenderer(ShoppingListRowsMixin, BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+    header = 'Список покупок:\n\n'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            return '\n'.join(str(value) for value in data.values())
+        return str(data)
+
+    def render_row(self, idx, item):
+        return (f"{idx}. {item['ingredient__name']} - "
+                f"{item['total_amount']} "
+                f"{item['ingredient__measurement_unit']}\n")
+
+
+class ShoppingListCSVRenderer(ShoppingListTextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+    header = csv_line(('Ингредиент', 'Количество', 'Единица'))
+
+    def render_row(self, idx, item):
+        return csv_line((
+            item['ingredient__name'],
+            item['total_amount'],
+            item['ingredient__measurement_unit'],
+        ))
+
+
+class ShoppingListJSONRenderer(ShoppingListRowsMixin, JSONRenderer):
+    format = 'json'
+    header = '['
+    footer = ']'
+
+    def render_row(self, idx, item):
+        return (',' if idx > 1 else '') + json.dumps({
+            'name': item['ingredient__name'],
+            'amount': item['total_amount'],
+            'measurement_unit': item['ingredient__measurement_unit'],
+        }, ensure_ascii=False)
+
+
+class ShoppingListPDF:
+    """PDF со строками текста, которые переносятся по ширине страницы.
+
+    Страница закрывается, как только заполнится, поэтому в памяти
+    держится сжатый PDF, а не все строки списка.
+    """
+
+    def __init__(self, title):
+        if PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(PDF_FONT, PDF_FONT_PATH))
+        self.output = io.BytesIO()
+        self.canvas = Canvas(self.output, pagesize=A4, pageCompression=1)
+        self.canvas.setTitle(title)
+        self.width, self.height = A4
+        self.y = self.height - PDF_MARGIN
+        self.canvas.setFont(PDF_FONT, PDF_TITLE_SIZE)
+        self.canvas.drawString(PDF_MARGIN, self.y, title)
+        self.y -= PDF_TITLE_SIZE * 2
+        self.canvas.setFont(PDF_FONT, PDF_FONT_SIZE)
+
+    def add(self, text):
+        for line in simpleSplit(
+            text, PDF_FONT, PDF_FONT_SIZE, self.width - 2 * PDF_MARGIN
+        ) or ['']:
+            if self.y < PDF_MARGIN:
+                self.canvas.showPage()
+                self.canvas.setFont(PDF_FONT, PDF_FONT_SIZE)
+                self.y = self.height - PDF_MARGIN
+            self.canvas.drawString(PDF_MARGIN, self.y, line)
+            self.y -= PDF_LINE_HEIGHT
+
+    def finish(self):
+        self.canvas.save()
+        return self.output.getvalue()
+
+
+class ShoppingListPDFRenderer(ShoppingListRowsMixin, BaseRenderer):
+    """Список покупок в PDF.
+
+    Страницы рисуются по мере чтения строк из базы, но файл отдаётся
+    одним куском: таблица ссылок PDF известна только в конце.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    render_style = 'binary'
+    title = 'Список покупок'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        document = ShoppingListPDF(self.title)
+        values = data.values() if isinstance(data, dict) else [data]
+        for value in values:
+            document.add(str(value))
+        return document.finish()
+
+    def render_row(self, idx, item):
+        return (f"{idx}. {item['ingredient__name']} - "
+                f"{item['total_amount']} "
+                f"{item['ingredient__measurement_unit']}")
+
+    def render_rows(self, rows):
+        document = ShoppingListPDF(self.title)
+        for idx, item in enumerate(rows, 1):
+            document.add(self.render_row(idx, item))
+        yield document.finish()
+
+    async def arender_rows(self, rows):
+        document = ShoppingListPDF(self.title)
+        idx = 0
+        async for item in rows:
+            idx += 1
+            document.add(self.render_row(idx, item))
+        yield document.finish()
@@ -0,0 +1,236 @@
+import heapq
+import logging
+import re
+import threading
+from bisect import bisect_left, insort
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from api import versions
+from constants import RECIPE_INDEX_CHANGES_TIMEOUT, RECIPE_INDEX_MAX_CHANGES
+
+from .models import IngredientInRecipe, Recipe
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+')
+# Те же веса, что у A, B и C в ts_rank PostgreSQL.
+NAME_WEIGHT = 1.0
+INGREDIENT_WEIGHT = 0.4
+TEXT_WEIGHT = 0.2
+# Запрос фильтрует набор дважды (ETag и ответ), а популярные запросы
+# повторяются, поэтому последние результаты запоминаются.
+RESULTS_CACHE_SIZE = 128
+# Номер последнего изменения индекса и id рецептов в каждом изменении.
+SEARCH_VERSION_KEY = 'recipes:search:version'
+SEARCH_CHANGE_KEY = 'recipes:search:change:{}'
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.casefold().replace('ё', 'е'))
+
+
+class IndexData:
+    """Слова с весами по рецептам и отсортированный список слов."""
+
+    def __init__(self):
+        self.postings = {}
+        self.recipe_tokens = {}
+        self.keys = []
+
+    def build(self):
+        self.keys = sorted(self._index(
+            Recipe.objects.all(), IngredientInRecipe.objects.all()
+        ))
+        return self
+
+    def refresh(self, recipe_ids):
+        for recipe_id in recipe_ids:
+            for token in self.recipe_tokens.pop(recipe_id, ()):
+                self.postings[token].pop(recipe_id, None)
+        new_tokens = self._index(
+            Recipe.objects.filter(pk__in=recipe_ids),
+            IngredientInRecipe.objects.filter(recipe__in=recipe_ids),
+        )
+        for token in new_tokens:
+            insort(self.keys, token)
+
+    def _index(self, recipes, ingredients):
+        """Индексирует рецепты и возвращает впервые встреченные слова."""
+        new_tokens = []
+        for recipe_id, name, text in recipes.values_list(
+            'id', 'name', 'text'
+        ).order_by().iterator(chunk_size=2000):
+            self._add(recipe_id, text, TEXT_WEIGHT, new_tokens)
+            self._add(recipe_id, name, NAME_WEIGHT, new_tokens)
+        for recipe_id, name in ingredients.values_list(
+            'recipe', 'ingredient__name'
+        ).order_by().iterator(chunk_size=2000):
+            self._add(recipe_id, name, INGREDIENT_WEIGHT, new_tokens)
+        return new_tokens
+
+    def _add(self, recipe_id, text, weight, new_tokens):
+        tokens = self.recipe_tokens.setdefault(recipe_id, set())
+        for token in tokenize(text):
+            recipes = self.postings.get(token)
+            if recipes is None:
+                recipes = self.postings[token] = {}
+                new_tokens.append(token)
+            if recipes.get(recipe_id, 0) < weight:
+                recipes[recipe_id] = weight
+            tokens.add(token)
+
+
+class RecipeSearchIndex:
+    """Обратный индекс рецептов в памяти процесса для баз без FTS.
+
+    Каждому слову сопоставлены рецепты и наибольший вес поля, в котором
+    оно встретилось. Слова запроса ищутся по началу, что заменяет
+    стемминг; рецепт должен содержать все слова запроса.
+
+    Изменённые рецепты переиндексируются сигналами, а номер изменения и
+    id рецептов записываются в общий кэш. Другие процессы перед поиском
+    сверяют номер и переиндексируют только эти рецепты. Если записи
+    изменений вытеснены из кэша или их слишком много, индекс строится
+    заново в фоновом потоке, а запросы до замены отвечают по старому.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._data = None
+        self._version = None
+        self._results = {}
+        # Рецепты, изменённые во время фонового построения.
+        self._pending = None
+
+    def invalidate(self):
+        with self._lock:
+            self._data = self._version = self._pending = None
+            self._results.clear()
+
+    def refresh(self, *recipe_ids):
+        """Переиндексирует рецепты и сообщает о них другим процессам."""
+        with self._lock:
+            self._apply(recipe_ids)
+            version, = versions.bump(SEARCH_VERSION_KEY)
+            cache.set(
+                SEARCH_CHANGE_KEY.format(version), list(recipe_ids),
+                RECIPE_INDEX_CHANGES_TIMEOUT,
+            )
+            # Если между нашими изменениями чужих не было, индекс уже
+            # совпадает с новой версией.
+            if self._version == version - 1:
+                self._version = version
+
+    def _apply(self, recipe_ids):
+        if self._data is None or not recipe_ids:
+            return
+        self._results.clear()
+        self._data.refresh(recipe_ids)
+        if self._pending is not None:
+            self._pending.update(recipe_ids)
+
+    def _sync(self):
+        """Догоняет изменения из других процессов."""
+        version = versions.get(SEARCH_VERSION_KEY)
+        if self._data is None:
+            # Отвечать пока не по чему, первый запрос строит индекс сам.
+            self._data = IndexData().build()
+            self._version = version
+            return
+        if version == self._version or self._pending is not None:
+            return
+        missing = version - self._version
+        if not 0 < missing <= RECIPE_INDEX_MAX_CHANGES:
+            self._rebuild(version)
+            return
+        numbers = range(self._version + 1, version + 1)
+        changes = cache.get_many([
+            SEARCH_CHANGE_KEY.format(number) for number in numbers
+        ])
+        recipe_ids = set()
+        for number in numbers:
+            changed = changes.get(SEARCH_CHANGE_KEY.format(number))
+            if changed is None:
+                break
+            recipe_ids.update(changed)
+            self._version = number
+        self._apply(recipe_ids)
+        # Пропуск посреди журнала означает вытесненную запись. Пропуск в
+        # конце — изменение, которое другой процесс ещё записывает.
+        if self._version < version - 1:
+            self._rebuild(version)
+
+    def _rebuild(self, version):
+        if not settings.RECIPE_INDEX_BACKGROUND:
+            self._data = IndexData().build()
+            self._version = version
+            self._results.clear()
+            return
+        pending = self._pending = set()
+        threading.Thread(
+            target=self._build_and_swap, args=(version, pending),
+            name='recipe-index', daemon=True,
+        ).start()
+
+    def _build_and_swap(self, version, pending):
+        try:
+            data = IndexData().build()
+            with self._lock:
+                if self._pending is not pending:
+                    return
+                data.refresh(pending)
+                self._data, self._version = data, version
+                self._results.clear()
+        except Exception:
+            logger.exception('Ошибка построения поискового индекса')
+        finally:
+            with self._lock:
+                if self._pending is pending:
+                    self._pending = None
+            connections.close_all()
+
+    def search(self, query, limit):
+        """Возвращает до limit пар (id рецепта, вес) по убыванию веса."""
+        terms = tuple(sorted(set(tokenize(query))))
+        with self._lock:
+            self._sync()
+            key = (terms, limit)
+            if key not in self._results:
+                if len(self._results) >= RESULTS_CACHE_SIZE:
+                    self._results.clear()
+                self._results[key] = self._search(terms, limit)
+            return self._results[key]
+
+    def _search(self, terms, limit):
+        postings, keys = self._data.postings, self._data.keys
+        scores = None
+        for term in terms:
+            matched = {}
+            start = bisect_left(keys, term)
+            for idx in range(start, len(keys)):
+                if not keys[idx].startswith(term):
+                    break
+                for recipe_id, weight in postings[keys[idx]].items():
+                    if matched.get(recipe_id, 0) < weight:
+                        matched[recipe_id] = weight
+            if scores is None:
+                scores = matched
+            else:
+                scores = {
+                    recipe_id: score + matched[recipe_id]
+                    for recipe_id, score in scores.items()
+                    if recipe_id in matched
+                }
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        return heapq.nsmallest(
+            limit, scores.items(), key=lambda item: (-item[1], -item[0])
+        )
+
+
+recipe_index = RecipeSearchIndex()
@@ -1,14 +1,22 @@
+from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
-from drf_extra_fields.fields import Base64ImageField
+from django.db import transaction
 from rest_framework import serializers
 
+from api.counters import change_counter
+from api.fields import StreamingBase64ImageField
 from ingredients.models import Ingredient
 from users.serializers import PublicUserSerializer
 
-from .models import Recipe, IngredientInRecipe, FavoriteRecipe, ShoppingCart
+from .models import (
+    Recipe, IngredientInRecipe, FavoriteRecipe, ShoppingCart,
+    ShoppingListItem,
+)
 
 from constants import MIN_INGREDIENT_AMOUNT
 
+User = get_user_model()
+
 
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     id = serializers.IntegerField(source='ingredient.id')
@@ -22,7 +30,38 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class RecipeImageVariantsMixin(serializers.Serializer):
+    """Ссылки на уменьшенные копии фотографии рецепта.
+
+    Поля отдаются только по запросу с ?image_variants=1, чтобы ответ по
+    умолчанию совпадал со спецификацией API. Пока копии не готовы,
+    image_thumb указывает на оригинал, а srcset пуст.
+    """
+    image_thumb = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if not request or request.query_params.get('image_variants') != '1':
+            fields.pop('image_thumb')
+            fields.pop('srcset')
+        return fields
+
+    def build_url(self, url):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+    def get_image_thumb(self, obj):
+        url = obj.image_thumb_url()
+        return self.build_url(url) if url else ''
+
+    def get_srcset(self, obj):
+        return obj.image_srcset(self.build_url)
+
+
+class RecipeListSerializer(RecipeImageVariantsMixin,
+                           serializers.ModelSerializer):
     author = PublicUserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         source='ingredients_in_recipe', many=True, read_only=True
@@ -35,8 +74,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = (
             'id', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text',
-            'cooking_time',
+            'is_in_shopping_cart', 'name', 'image', 'image_thumb', 'srcset',
+            'text', 'cooking_time',
         )
 
     def get_image(self, obj):
@@ -49,12 +88,16 @@ class RecipeListSerializer(serializers.ModelSerializer):
         return model.objects.filter(user=user, recipe=recipe).exists()
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         return not user.is_anonymous and self._flag_exists(
             FavoriteRecipe, user, obj
         )
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         return not user.is_anonymous and self._flag_exists(
             ShoppingCart, user, obj
@@ -86,7 +129,7 @@ class AddIngredientSerializer(serializers.ModelSerializer):
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     author = PublicUserSerializer(read_only=True)
     ingredients = AddIngredientSerializer(many=True)
-    image = Base64ImageField(required=True)
+    image = StreamingBase64ImageField(required=True)
 
     class Meta:
         model = Recipe
@@ -126,20 +169,35 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             ) for item in ingredients
         ]
         IngredientInRecipe.objects.bulk_create(objs)
+        Recipe.objects.filter(pk=recipe.pk).update_ingredient_ids()
 
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         author = self.context['request'].user
-        recipe = Recipe.objects.create(author=author, **validated_data)
-        self._bulk_create_ingredients(recipe, ingredients)
+        with transaction.atomic():
+            recipe = Recipe.objects.create(author=author, **validated_data)
+            self._bulk_create_ingredients(recipe, ingredients)
+            change_counter(
+                User.objects.filter(pk=author.pk), 'recipes_count', 1
+            )
         return recipe
 
     def update(self, instance, validated_data):
-        if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            IngredientInRecipe.objects.filter(recipe=instance).delete()
-            self._bulk_create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        with transaction.atomic():
+            if 'ingredients' in validated_data:
+                ingredients = validated_data.pop('ingredients')
+                changed = {item['ingredient'].pk for item in ingredients}
+                changed.update(
+                    IngredientInRecipe.objects.filter(
+                        recipe=instance
+                    ).values_list('ingredient', flat=True)
+                )
+                IngredientInRecipe.objects.filter(recipe=instance).delete()
+                self._bulk_create_ingredients(instance, ingredients)
+                ShoppingListItem.objects.refresh(
+                    instance.in_shopping_carts.values('user'), changed
+                )
+            return super().update(instance, validated_data)
 
     def to_representation(self, recipe):
         return RecipeListSerializer(recipe, context=self.context).data
@@ -159,7 +217,10 @@ class ShortLinkSerializer(serializers.Serializer):
         return {'short-link': self.get_short_link(instance)}
 
 
-class RecipeMinifiedSerializer(serializers.ModelSerializer):
+class RecipeMinifiedSerializer(RecipeImageVariantsMixin,
+                               serializers.ModelSerializer):
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = (
+            'id', 'name', 'image', 'image_thumb', 'srcset', 'cooking_time'
+        )
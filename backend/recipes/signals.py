@@ -0,0 +1,100 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.images import process_image, schedule
+from ingredients.models import Ingredient
+
+from . import cache
+from .models import (
+    IngredientInRecipe, Recipe, ShoppingCart, ShoppingListItem,
+)
+from .search import recipe_index
+
+User = get_user_model()
+
+AUTHOR_FIELDS = {
+    'email', 'username', 'first_name', 'last_name', 'profile_image'
+}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def invalidate_recipe(instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: cache.invalidate(pk))
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes(instance, created, update_fields=None,
+                              **kwargs):
+    if created:
+        return
+    if update_fields is not None and not AUTHOR_FIELDS & set(update_fields):
+        return
+    recipe_ids = list(instance.recipes.values_list('pk', flat=True))
+    if recipe_ids:
+        transaction.on_commit(lambda: cache.invalidate(*recipe_ids))
+
+
+def update_search(*recipe_ids):
+    Recipe.objects.filter(pk__in=recipe_ids).update_search_vector()
+    recipe_index.refresh(*recipe_ids)
+
+
+def ingredients_changed(*recipe_ids):
+    """Пересобирает производные поля рецептов после правки ингредиентов.
+
+    У IngredientInRecipe нет обработчиков сигналов: с ними каскадное
+    удаление и queryset.delete() шли бы по одной строке. Код, который
+    меняет ингредиенты в обход сериализатора (админка), вызывает эту
+    функцию сам в своей транзакции. Прежний состав уже неизвестен,
+    поэтому списки покупок владельцев корзин с этими рецептами
+    пересчитываются целиком сразу, остальное — один раз на рецепт после
+    коммита.
+    """
+    recipe_ids = set(recipe_ids)
+    users = list(ShoppingCart.objects.filter(
+        recipe__in=recipe_ids
+    ).values_list('user', flat=True).distinct())
+    if users:
+        ShoppingListItem.objects.refresh(users)
+
+    def rebuild():
+        Recipe.objects.filter(pk__in=recipe_ids).update_ingredient_ids()
+        update_search(*recipe_ids)
+        cache.invalidate(*recipe_ids)
+
+    transaction.on_commit(rebuild)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def update_recipe_search(instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: update_search(pk))
+
+
+@receiver(post_save, sender=Ingredient)
+def update_ingredient_search(instance, created, **kwargs):
+    if created:
+        return
+    recipe_ids = list(
+        IngredientInRecipe.objects.filter(
+            ingredient=instance
+        ).values_list('recipe', flat=True)
+    )
+    if recipe_ids:
+        transaction.on_commit(lambda: update_search(*recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def schedule_image_variants(instance, **kwargs):
+    if not instance.image or instance.image_variants_ready:
+        return
+    pk = instance.pk
+    transaction.on_commit(lambda: schedule(
+        process_image, Recipe, pk, 'image', 'image_variants',
+        on_ready=cache.invalidate,
+    ))
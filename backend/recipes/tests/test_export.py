@@ -0,0 +1,84 @@
+import csv
+import io
+import json
+import re
+
+from api.budgets import read_streaming
+from api.tests.base import FoodgramTestCase
+from recipes.models import ShoppingCart
+
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingListExportTest(FoodgramTestCase):
+    """Список покупок выгружается во всех форматах."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = cls.create_user('buyer')
+        ingredients = [
+            cls.create_ingredient(f'Ингредиент {idx:03}') for idx in range(120)
+        ]
+        recipe = cls.create_recipe(cls.user, {
+            ingredient: idx + 1 for idx, ingredient in enumerate(ingredients)
+        })
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        cls.finish_test_data()
+
+    def download(self, export_format):
+        response = self.client_for(self.user).get(
+            DOWNLOAD_URL, {'format': export_format}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['Content-Disposition'],
+            f'attachment; filename=shopping_list.{export_format}',
+        )
+        return response, read_streaming(response)
+
+    def test_txt(self):
+        response, content = self.download('txt')
+        self.assertEqual(
+            response['Content-Type'], 'text/plain; charset=utf-8'
+        )
+        lines = content.decode().splitlines()
+        self.assertEqual(lines[0], 'Список покупок:')
+        self.assertEqual(lines[2], '1. Ингредиент 000 - 1 г')
+        self.assertEqual(len(lines), 122)
+
+    def test_csv(self):
+        _, content = self.download('csv')
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(rows[0], ['Ингредиент', 'Количество', 'Единица'])
+        self.assertEqual(rows[-1], ['Ингредиент 119', '120', 'г'])
+
+    def test_json(self):
+        _, content = self.download('json')
+        items = json.loads(content)
+        self.assertEqual(len(items), 120)
+        self.assertEqual(items[0], {
+            'name': 'Ингредиент 000', 'amount': 1, 'measurement_unit': 'г',
+        })
+
+    def test_pdf(self):
+        response, content = self.download('pdf')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(content.startswith(b'%PDF-'))
+        self.assertTrue(content.rstrip().endswith(b'%%EOF'))
+        # Кириллица возможна только со встроенным шрифтом.
+        self.assertIn(b'DejaVuSans', content)
+        pages = re.findall(rb'/Type /Page\b', content)
+        self.assertGreater(len(pages), 1)
+
+    def test_empty_list(self):
+        self.client_for(self.user).delete(
+            '/api/recipes/shopping_cart/',
+            {'ids': list(self.user.shopping_cart.values_list(
+                'recipe', flat=True
+            ))},
+            format='json',
+        )
+        _, content = self.download('pdf')
+        self.assertTrue(content.startswith(b'%PDF-'))
+        _, content = self.download('json')
+        self.assertEqual(json.loads(content), [])
@@ -0,0 +1,148 @@
+from api.tests.base import FoodgramTestCase
+from constants import BULK_ACTION_LIMIT
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+
+MISSING = 10 ** 6
+
+
+class RecipeLinkToggleTest(FoodgramTestCase):
+    """Одиночные избранное и корзина: ответ по числу изменённых строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        salt = cls.create_ingredient('соль')
+        cls.user = cls.create_user('user')
+        cls.recipe = cls.create_recipe(cls.create_user('author'), {salt: 1})
+        cls.finish_test_data()
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.client_for(self.user)
+
+    def counters(self):
+        return Recipe.objects.values_list(
+            'favorites_count', 'in_carts_count'
+        ).get(pk=self.recipe.pk)
+
+    def test_favorite(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        response = self.api.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['id'], self.recipe.pk)
+        self.assertEqual(self.counters(), (1, 0))
+        response = self.api.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data['detail'], 'Рецепт уже в избранном!')
+        self.assertEqual(self.counters(), (1, 0))
+        self.assertEqual(self.api.delete(url).status_code, 204)
+        self.assertEqual(self.counters(), (0, 0))
+        self.assertEqual(self.api.delete(url).status_code, 400)
+        self.assertEqual(self.counters(), (0, 0))
+        self.assert_counters_consistent()
+
+    def test_shopping_cart(self):
+        url = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        self.assertEqual(self.api.post(url).status_code, 201)
+        self.assertEqual(self.api.post(url).status_code, 400)
+        self.assertEqual(self.counters(), (0, 1))
+        self.assertEqual(self.shopping_list(self.user), {'соль': 1})
+        self.assertEqual(self.api.delete(url).status_code, 204)
+        self.assertEqual(self.api.delete(url).status_code, 400)
+        self.assertEqual(self.counters(), (0, 0))
+        self.assertEqual(self.shopping_list(self.user), {})
+        self.assert_counters_consistent()
+
+    def test_missing_recipe(self):
+        for action in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{MISSING}/{action}/'
+            with self.subTest(action):
+                self.assertEqual(self.api.post(url).status_code, 404)
+                self.assertEqual(self.api.delete(url).status_code, 404)
+                url = f'/api/recipes/abc/{action}/'
+                self.assertEqual(self.api.post(url).status_code, 404)
+
+    def test_anonymous(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        self.assertEqual(self.client_for().post(url).status_code, 401)
+        self.assertEqual(self.counters(), (0, 0))
+
+
+class RecipeBulkLinksTest(FoodgramTestCase):
+    """Пакетные избранное и корзина: результат по каждому id."""
+
+    @classmethod
+    def setUpTestData(cls):
+        salt = cls.create_ingredient('соль')
+        cls.user = cls.create_user('user')
+        cls.other = cls.create_user('other')
+        author = cls.create_user('author')
+        cls.recipes = [
+            cls.create_recipe(author, {salt: idx + 1}) for idx in range(3)
+        ]
+        first = cls.recipes[0]
+        FavoriteRecipe.objects.create(user=cls.user, recipe=first)
+        FavoriteRecipe.objects.create(user=cls.other, recipe=first)
+        ShoppingCart.objects.create(user=cls.user, recipe=first)
+        ShoppingCart.objects.create(user=cls.other, recipe=first)
+        cls.finish_test_data()
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.client_for(self.user)
+        self.ids = [recipe.pk for recipe in self.recipes]
+
+    def bulk(self, method, action, ids):
+        response = getattr(self.api, method)(
+            f'/api/recipes/{action}/', {'ids': ids}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        return [
+            (item['id'], item['status']) for item in response.data['results']
+        ]
+
+    def counts(self, field):
+        return list(Recipe.objects.filter(pk__in=self.ids).order_by(
+            'pk'
+        ).values_list(field, flat=True))
+
+    def test_partial_add(self):
+        first, second, third = self.ids
+        results = self.bulk(
+            'post', 'favorite', [first, second, MISSING, second, third]
+        )
+        self.assertEqual(results, [
+            (first, 400), (second, 201), (MISSING, 404), (third, 201),
+        ])
+        self.assertEqual(self.counts('favorites_count'), [2, 1, 1])
+        self.assert_counters_consistent()
+
+    def test_partial_remove(self):
+        first, second, third = self.ids
+        results = self.bulk('delete', 'favorite', [second, first, MISSING])
+        self.assertEqual(
+            results, [(second, 400), (first, 204), (MISSING, 404)]
+        )
+        self.assertEqual(self.counts('favorites_count'), [1, 0, 0])
+        self.assert_counters_consistent()
+
+    def test_cart_updates_shopping_list(self):
+        first, second, third = self.ids
+        results = self.bulk('post', 'shopping_cart', [first, second, third])
+        self.assertEqual(results, [(first, 400), (second, 201), (third, 201)])
+        self.assertEqual(self.shopping_list(self.user), {'соль': 6})
+        self.assertEqual(self.counts('in_carts_count'), [2, 1, 1])
+        results = self.bulk('delete', 'shopping_cart', [first, third])
+        self.assertEqual(results, [(first, 204), (third, 204)])
+        self.assertEqual(self.shopping_list(self.user), {'соль': 2})
+        self.assertEqual(self.counts('in_carts_count'), [1, 1, 0])
+        self.assert_counters_consistent()
+        self.assert_shopping_lists_consistent()
+
+    def test_invalid_ids(self):
+        for ids in ([], [0], ['abc'], list(range(1, BULK_ACTION_LIMIT + 2))):
+            with self.subTest(ids=ids[:3]):
+                response = self.api.post(
+                    '/api/recipes/favorite/', {'ids': ids}, format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.counts('favorites_count'), [2, 0, 0])
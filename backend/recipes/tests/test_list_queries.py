@@ -0,0 +1,111 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from ingredients.models import Ingredient
+from recipes.models import (FavoriteRecipe, IngredientInRecipe, Recipe,
+                            ShoppingCart)
+from users.models import Follow, User
+
+RECIPES_URL = '/api/recipes/'
+
+
+@override_settings(IMAGE_WORKERS=0)
+class RecipeListQueriesTest(TestCase):
+    """Число запросов списка рецептов не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {idx}', measurement_unit='г')
+            for idx in range(10)
+        )
+        cls.reader, *authors = User.objects.bulk_create(
+            User(
+                email=f'user{idx}@test.local',
+                username=f'user{idx}',
+                first_name='Имя',
+                last_name='Фамилия',
+            ) for idx in range(5)
+        )
+        # bulk_create не вызывает сигналы, поэтому файлы и варианты
+        # изображений не нужны.
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=authors[idx % len(authors)],
+                name=f'Рецепт {idx}',
+                text='Описание',
+                cooking_time=10,
+                image='recipe_image/test.png',
+            ) for idx in range(60)
+        )
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                recipe=recipe,
+                ingredient=ingredients[(recipe.pk + shift) % 10],
+                amount=shift + 1,
+            )
+            for recipe in recipes for shift in range(3)
+        )
+        Follow.objects.bulk_create(
+            Follow(follower=cls.reader, following=author)
+            for author in authors[:2]
+        )
+        for model in (FavoriteRecipe, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=cls.reader, recipe=recipe)
+                for recipe in recipes[::3]
+            )
+        Recipe.objects.update_ingredient_ids()
+        cls.token = Token.objects.create(user=cls.reader)
+
+    def setUp(self):
+        cache.clear()
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+
+    def assert_queries(self, client, queries, query=''):
+        for limit in (6, 50):
+            with self.subTest(limit=limit, query=query):
+                with self.assertNumQueries(queries):
+                    response = client.get(
+                        f'{RECIPES_URL}?limit={limit}{query}'
+                    )
+                self.assertEqual(response.status_code, 200)
+                results = response.json()['results']
+                self.assertEqual(len(results), limit)
+                self.assertTrue(all(
+                    len(recipe['ingredients']) == 3 for recipe in results
+                ))
+
+    def test_authenticated_list(self):
+        # Токен, ETag, COUNT, рецепты, авторы с подписками, ингредиенты.
+        self.assert_queries(self.client, 6)
+
+    def test_authenticated_cursor_list(self):
+        # Курсорная страница обходится без COUNT.
+        self.assert_queries(self.client, 5, '&cursor=')
+
+    def test_anonymous_list(self):
+        # COUNT, рецепты, авторы, ингредиенты; повтор берётся из кэша.
+        self.assert_queries(self.anonymous, 4)
+
+    def test_anonymous_list_cached(self):
+        for limit in (6, 50):
+            self.anonymous.get(f'{RECIPES_URL}?limit={limit}')
+            with self.subTest(limit=limit), self.assertNumQueries(0):
+                self.anonymous.get(f'{RECIPES_URL}?limit={limit}')
+
+    def test_user_flags(self):
+        response = self.client.get(f'{RECIPES_URL}?limit=60')
+        favorited = {
+            recipe['id'] for recipe in response.json()['results']
+            if recipe['is_favorited'] and recipe['is_in_shopping_cart']
+        }
+        self.assertEqual(favorited, set(
+            FavoriteRecipe.objects.filter(
+                user=self.reader
+            ).values_list('recipe', flat=True)
+        ))
@@ -0,0 +1,56 @@
+from api.tests.base import FoodgramTestCase
+
+RECIPES_URL = '/api/recipes/'
+
+
+class RecipeCursorPaginationTest(FoodgramTestCase):
+    """Курсор идёт по дате создания и не сочетается с другим порядком."""
+
+    @classmethod
+    def setUpTestData(cls):
+        salt = cls.create_ingredient('соль')
+        author = cls.create_user('author')
+        cls.recipes = [
+            cls.create_recipe(author, {salt: 1}, name=f'Суп {idx}')
+            for idx in range(5)
+        ]
+        cls.finish_test_data()
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.client_for()
+
+    def walk(self, params):
+        ids, url = [], RECIPES_URL
+        while url:
+            response = self.api.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(item['id'] for item in response.data['results'])
+            url, params = response.data['next'], None
+        return ids
+
+    def test_cursor_walks_newest_first(self):
+        expected = [recipe.pk for recipe in reversed(self.recipes)]
+        self.assertEqual(self.walk({'cursor': '', 'limit': 2}), expected)
+        self.assertEqual(
+            self.walk({'cursor': '', 'limit': 2, 'ordering': '-created'}),
+            expected,
+        )
+
+    def test_cursor_rejects_own_ordering(self):
+        for params in (
+            {'ordering': '-popular'},
+            {'ordering': 'created'},
+            {'search': 'суп'},
+            {'cook_with': self.recipes[0].ingredients.get().pk},
+        ):
+            with self.subTest(params=params):
+                response = self.api.get(RECIPES_URL, {'cursor': '', **params})
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(list(response.data), list(params))
+                response = self.api.get(RECIPES_URL, params)
+                self.assertEqual(response.status_code, 200)
+
+    def test_blank_search_is_not_a_conflict(self):
+        response = self.api.get(RECIPES_URL, {'cursor': '', 'search': ' '})
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,95 @@
+import threading
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+
+from api.tests.base import FoodgramTestCase
+from recipes.models import Recipe
+from recipes.search import (SEARCH_CHANGE_KEY, SEARCH_VERSION_KEY, IndexData,
+                            RecipeSearchIndex)
+
+
+def found(index, query):
+    return [pk for pk, _ in index.search(query, 10)]
+
+
+class RecipeSearchIndexSyncTest(FoodgramTestCase):
+    """Индекс догоняет изменения других процессов по журналу в кэше.
+
+    Два экземпляра индекса с общим кэшем играют роль двух воркеров.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        salt = cls.create_ingredient('соль')
+        author = cls.create_user('author')
+        cls.soup = cls.create_recipe(author, {salt: 1}, name='Томатный суп')
+        cls.pie = cls.create_recipe(author, {salt: 1}, name='Яблочный пирог')
+
+    def setUp(self):
+        super().setUp()
+        self.worker = RecipeSearchIndex()
+        self.other = RecipeSearchIndex()
+        self.assertEqual(found(self.worker, 'суп'), [self.soup.pk])
+        self.assertEqual(found(self.other, 'суп'), [self.soup.pk])
+
+    def rename(self, recipe, name):
+        Recipe.objects.filter(pk=recipe.pk).update(name=name)
+        self.other.refresh(recipe.pk)
+
+    def test_changes_replayed_without_rebuild(self):
+        self.rename(self.pie, 'Грибной суп')
+        self.rename(self.soup, 'Томатный соус')
+        with mock.patch.object(IndexData, 'build') as build:
+            self.assertEqual(found(self.worker, 'суп'), [self.pie.pk])
+            self.assertEqual(found(self.other, 'суп'), [self.pie.pk])
+        build.assert_not_called()
+
+    def test_own_changes_do_not_trigger_rebuild(self):
+        self.worker.refresh(self.pie.pk)
+        with mock.patch.object(IndexData, 'build') as build, \
+                mock.patch.object(cache, 'get_many') as get_many:
+            found(self.worker, 'суп')
+        build.assert_not_called()
+        get_many.assert_not_called()
+
+    def test_evicted_change_rebuilds(self):
+        self.rename(self.pie, 'Грибной суп')
+        self.rename(self.soup, 'Томатный соус')
+        version = cache.get(SEARCH_VERSION_KEY)
+        cache.delete(SEARCH_CHANGE_KEY.format(version - 1))
+        self.assertEqual(found(self.worker, 'суп'), [self.pie.pk])
+
+    def test_change_being_written_waits(self):
+        Recipe.objects.filter(pk=self.pie.pk).update(name='Грибной суп')
+        cache.incr(SEARCH_VERSION_KEY)
+        with mock.patch.object(IndexData, 'build') as build:
+            self.assertEqual(found(self.worker, 'суп'), [self.soup.pk])
+        build.assert_not_called()
+        version = cache.get(SEARCH_VERSION_KEY)
+        cache.set(SEARCH_CHANGE_KEY.format(version), [self.pie.pk])
+        self.assertEqual(
+            sorted(found(self.worker, 'суп')), [self.soup.pk, self.pie.pk]
+        )
+
+
+@override_settings(RECIPE_INDEX_BACKGROUND=True)
+class RecipeSearchIndexBackgroundTest(TransactionTestCase):
+    """Полное построение идёт в фоне, запросы отвечают по старому индексу."""
+
+    def test_rebuild_in_background(self):
+        author = FoodgramTestCase.create_user('author')
+        ingredient = FoodgramTestCase.create_ingredient('соль')
+        soup = FoodgramTestCase.create_recipe(
+            author, {ingredient: 1}, name='Томатный суп'
+        )
+        index = RecipeSearchIndex()
+        self.assertEqual(found(index, 'суп'), [soup.pk])
+        Recipe.objects.filter(pk=soup.pk).update(name='Томатный соус')
+        cache.clear()
+        self.assertEqual(found(index, 'суп'), [soup.pk])
+        for thread in threading.enumerate():
+            if thread.name == 'recipe-index':
+                thread.join()
+        self.assertEqual(found(index, 'суп'), [])
@@ -0,0 +1,249 @@
+from django import forms
+from django.contrib import admin
+from django.test import Client
+
+from api.tests.base import IMAGE_DATA, PASSWORD, FoodgramTestCase
+from recipes.models import IngredientInRecipe, Recipe, ShoppingCart
+from users.models import User
+
+
+class ShoppingListSyncTest(FoodgramTestCase):
+    """Каждый путь изменения корзин и рецептов сохраняет списки покупок.
+
+    После действия список сверяется с пересчётом по корзинам командой
+    rebuild_shopping_lists --verify.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.salt = cls.create_ingredient('соль')
+        cls.flour = cls.create_ingredient('мука')
+        cls.egg = cls.create_ingredient('яйцо', 'шт')
+        cls.author = cls.create_user('author')
+        cls.buyer = cls.create_user('buyer')
+        cls.other = cls.create_user('other')
+        cls.admin = cls.create_user('admin', is_staff=True,
+                                    is_superuser=True)
+        cls.soup = cls.create_recipe(
+            cls.author, {cls.salt: 10, cls.flour: 200}
+        )
+        cls.omelette = cls.create_recipe(
+            cls.author, {cls.salt: 5, cls.egg: 2}
+        )
+        cls.bread = cls.create_recipe(cls.other, {cls.flour: 100})
+        ShoppingCart.objects.bulk_create([
+            ShoppingCart(user=cls.buyer, recipe=cls.soup),
+            ShoppingCart(user=cls.buyer, recipe=cls.bread),
+            ShoppingCart(user=cls.other, recipe=cls.soup),
+            ShoppingCart(user=cls.other, recipe=cls.omelette),
+        ])
+        cls.finish_test_data()
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.client_for(self.buyer)
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def cart_url(self, recipe):
+        return f'/api/recipes/{recipe.pk}/shopping_cart/'
+
+    def test_initial_lists(self):
+        self.assertEqual(
+            self.shopping_list(self.buyer), {'соль': 10, 'мука': 300}
+        )
+        self.assert_shopping_lists_consistent()
+
+    def test_toggle_adds_and_subtracts(self):
+        self.assertEqual(
+            self.api.post(self.cart_url(self.omelette)).status_code, 201
+        )
+        self.assertEqual(
+            self.shopping_list(self.buyer),
+            {'соль': 15, 'мука': 300, 'яйцо': 2},
+        )
+        self.assertEqual(
+            self.api.delete(self.cart_url(self.soup)).status_code, 204
+        )
+        self.assertEqual(
+            self.shopping_list(self.buyer),
+            {'соль': 5, 'мука': 100, 'яйцо': 2},
+        )
+        self.assert_shopping_lists_consistent()
+
+    def test_repeated_toggle_changes_nothing(self):
+        self.assertEqual(
+            self.api.post(self.cart_url(self.soup)).status_code, 400
+        )
+        self.api.delete(self.cart_url(self.bread))
+        self.assertEqual(
+            self.api.delete(self.cart_url(self.bread)).status_code, 400
+        )
+        self.assertEqual(
+            self.shopping_list(self.buyer), {'соль': 10, 'мука': 200}
+        )
+        self.assert_shopping_lists_consistent()
+
+    def test_bulk_toggle(self):
+        ids = [self.omelette.pk, self.soup.pk, 10 ** 6]
+        self.api.post('/api/recipes/shopping_cart/', {'ids': ids},
+                      format='json')
+        self.assert_shopping_lists_consistent()
+        self.api.delete('/api/recipes/shopping_cart/', {'ids': ids},
+                        format='json')
+        self.assertEqual(self.shopping_list(self.buyer), {'мука': 100})
+        self.assert_shopping_lists_consistent()
+
+    def test_recipe_update(self):
+        response = self.client_for(self.author).patch(
+            f'/api/recipes/{self.soup.pk}/',
+            {
+                'image': IMAGE_DATA,
+                'ingredients': [
+                    {'id': self.salt.pk, 'amount': 1},
+                    {'id': self.egg.pk, 'amount': 3},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.shopping_list(self.buyer),
+            {'соль': 1, 'мука': 100, 'яйцо': 3},
+        )
+        self.assert_shopping_lists_consistent()
+
+    def test_recipe_delete(self):
+        response = self.client_for(self.author).delete(
+            f'/api/recipes/{self.soup.pk}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.shopping_list(self.buyer), {'мука': 100})
+        self.assert_shopping_lists_consistent()
+
+    def test_author_account_delete(self):
+        response = self.client_for(self.author).delete(
+            f'/api/users/{self.author.pk}/',
+            {'current_password': PASSWORD},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Recipe.objects.filter(author=self.author).exists())
+        self.assertEqual(self.shopping_list(self.buyer), {'мука': 100})
+        self.assertEqual(self.shopping_list(self.other), {})
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_recipe_delete(self):
+        response = self.admin_client.post(
+            f'/admin/recipes/recipe/{self.soup.pk}/delete/', {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.shopping_list(self.buyer), {'мука': 100})
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_recipe_bulk_delete(self):
+        response = self.admin_client.post('/admin/recipes/recipe/', {
+            'action': 'delete_selected',
+            admin.helpers.ACTION_CHECKBOX_NAME: [
+                self.soup.pk, self.omelette.pk,
+            ],
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.shopping_list(self.other), {})
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_user_delete(self):
+        response = self.admin_client.post(
+            f'/admin/users/user/{self.author.pk}/delete/', {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertEqual(self.shopping_list(self.buyer), {'мука': 100})
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_inline_ingredients_edit(self):
+        url = f'/admin/recipes/recipe/{self.soup.pk}/change/'
+        data = form_data(self.admin_client.get(url))
+        prefix = 'ingredients_in_recipe'
+        for idx in range(int(data[f'{prefix}-TOTAL_FORMS'])):
+            ingredient = data.get(f'{prefix}-{idx}-ingredient')
+            if ingredient == self.salt.pk:
+                data[f'{prefix}-{idx}-amount'] = '40'
+            elif ingredient:
+                data[f'{prefix}-{idx}-DELETE'] = 'on'
+        response = self.admin_client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            self.shopping_list(self.buyer), {'соль': 40, 'мука': 100}
+        )
+        self.assert_shopping_lists_consistent()
+        # Последующее удаление из корзины вычитает уже новый состав.
+        self.api.delete(self.cart_url(self.soup))
+        self.assertEqual(self.shopping_list(self.buyer), {'мука': 100})
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_ingredient_row_delete(self):
+        row = IngredientInRecipe.objects.get(
+            recipe=self.soup, ingredient=self.flour
+        )
+        response = self.admin_client.post(
+            f'/admin/recipes/ingredientinrecipe/{row.pk}/delete/',
+            {'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            self.shopping_list(self.buyer), {'соль': 10, 'мука': 100}
+        )
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_cart_add_and_reassign(self):
+        response = self.admin_client.post(
+            '/admin/recipes/shoppingcart/add/',
+            {'user': self.buyer.pk, 'recipe': self.omelette.pk},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.shopping_list(self.buyer)['яйцо'], 2)
+        cart = ShoppingCart.objects.get(user=self.buyer, recipe=self.soup)
+        response = self.admin_client.post(
+            f'/admin/recipes/shoppingcart/{cart.pk}/change/',
+            {'user': self.author.pk, 'recipe': self.soup.pk},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            self.shopping_list(self.author), {'соль': 10, 'мука': 200}
+        )
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_cart_delete(self):
+        cart = ShoppingCart.objects.get(user=self.buyer, recipe=self.soup)
+        response = self.admin_client.post(
+            f'/admin/recipes/shoppingcart/{cart.pk}/delete/', {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.shopping_list(self.buyer), {'мука': 100})
+        self.assert_shopping_lists_consistent()
+
+
+def form_data(response):
+    """Данные формы админки со всеми инлайнами, как их отправит браузер."""
+    context = response.context
+    bound = [context['adminform'].form]
+    for inline in context['inline_admin_formsets']:
+        bound.append(inline.formset.management_form)
+        bound.extend(inline.formset.forms)
+    data = {}
+    for form in bound:
+        for name, field in form.fields.items():
+            value = form[name].value()
+            if (value is None or field.disabled
+                    or isinstance(field, forms.FileField)):
+                continue
+            if isinstance(value, (list, tuple)):
+                value = [str(item) for item in value]
+            elif isinstance(value, bool):
+                if not value:
+                    continue
+                value = 'on'
+            data[form.add_prefix(name)] = value
+    return data
@@ -1,28 +1,152 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from functools import partial
+
+from adrf.viewsets import GenericViewSet as AsyncGenericViewSet
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Prefetch
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import viewsets, permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from api.bulk import (
+    BulkIdsSerializer, BulkLinks, insert_or_ignore, lock_rows,
+)
+from api.conditional import (
+    aconditional_get, aget_changes, conditional_get, get_changes,
+)
+from api.counters import change_counter
+from api.prometheus import SHOPPING_LIST_EXPORT, timed_stream
+from api.pagination import CursorPaginationMixin
+
+from . import cache
 from .filters import RecipeFilter
-from .models import Recipe, FavoriteRecipe, ShoppingCart, IngredientInRecipe
-from .pagination import RecipesPagination
+from .models import (
+    Recipe, FavoriteRecipe, ShoppingCart, IngredientInRecipe,
+    ShoppingListItem,
+)
+from .pagination import RecipesCursorPagination, RecipesPagination
 from .permissions import IsAdminOrAuthorOrReadOnly
+from .renderers import (
+    ShoppingListCSVRenderer, ShoppingListJSONRenderer,
+    ShoppingListPDFRenderer, ShoppingListTextRenderer,
+)
 from .serializers import (
     RecipeListSerializer, RecipeCreateUpdateSerializer,
     ShortLinkSerializer, RecipeMinifiedSerializer
 )
 
+from constants import SHOPPING_LIST_CHUNK_SIZE
 
-class RecipeViewSet(viewsets.ModelViewSet):
+User = get_user_model()
+
+
+class RecipeViewSet(CursorPaginationMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     pagination_class = RecipesPagination
+    cursor_pagination_class = RecipesCursorPagination
     permission_classes = [IsAdminOrAuthorOrReadOnly]
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        user = self.request.user
+        # Вектор и набор ингредиентов нужны только фильтрам, в ответ они
+        # не попадают, а save() их не пишет, см. DerivedFieldsMixin.
+        return Recipe.objects.defer(
+            'search_vector', 'ingredient_ids'
+        ).with_user_flags(user).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.with_is_subscribed(user),
+            ),
+            Prefetch(
+                'ingredients_in_recipe',
+                queryset=IngredientInRecipe.objects.select_related(
+                    'ingredient'
+                ),
+            ),
+        )
+
+    def get_validators(self, state, last_modified=None):
+        if self.request.user.is_authenticated:
+            return (state, get_changes(**self.get_user_changes())), None
+        return state, last_modified
+
+    def get_detail_aggregates(self):
+        return {
+            'total': Count('pk'),
+            'updated_at': Max('updated_at'),
+            'author_updated_at': Max('author__updated_at'),
+        }
+
+    def get_user_changes(self):
+        user = self.request.user
+        return {
+            'favorites': (user.favorites.all(), 'added_at'),
+            'carts': (user.shopping_cart.all(), 'added_at'),
+            'follows': (user.following_set.all(), 'followed_at'),
+        }
+
+    def get_last_modified(self, state):
+        return max(
+            filter(None, (state['updated_at'], state['author_updated_at'])),
+            default=None,
+        )
+
+    def list(self, request, *args, **kwargs):
+        # ETag строится из версий кэша, которые сдвигают те же сигналы,
+        # что сбрасывают кэш ответов, а не из агрегата по всей таблице.
+        # Last-Modified не отдаётся: удаление рецепта его не меняет.
+        state = cache.list_state(request)
+        etag_source, _ = self.get_validators(state)
+        return conditional_get(
+            request,
+            lambda: self._build_list(request, state, *args, **kwargs),
+            etag_source,
+        )
+
+    def _build_list(self, request, state, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        return Response(cache.get_or_build(
+            cache.list_key(request, state),
+            lambda: super(RecipeViewSet, self).list(
+                request, *args, **kwargs
+            ).data,
+        ))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not kwargs['pk'].isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        state = Recipe.objects.filter(pk=kwargs['pk']).aggregate(
+            **self.get_detail_aggregates()
+        )
+        etag_source, last_modified = self.get_validators(
+            state, self.get_last_modified(state)
+        )
+        return conditional_get(
+            request,
+            lambda: self._build_retrieve(request, *args, **kwargs),
+            etag_source,
+            last_modified,
+        )
+
+    def _build_retrieve(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().retrieve(request, *args, **kwargs)
+        return Response(cache.get_or_build(
+            cache.detail_key(request, int(kwargs['pk'])),
+            lambda: super(RecipeViewSet, self).retrieve(
+                request, *args, **kwargs
+            ).data,
+        ))
+
+    def perform_destroy(self, instance):
+        Recipe.objects.filter(pk=instance.pk).delete_with_derived()
+
     def get_serializer_class(self):
         if self.action in ('create', 'update', 'partial_update'):
             return RecipeCreateUpdateSerializer
@@ -42,34 +166,28 @@ class RecipeViewSet(viewsets.ModelViewSet):
         )
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAdminUser],
+        url_path='cache-stats',
+        url_name='cache_stats'
+    )
+    def cache_stats(self, request):
+        return Response(cache.stats(), status=status.HTTP_200_OK)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
         permission_classes=[permissions.IsAuthenticated]
     )
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
-        if request.method == 'POST':
-            if FavoriteRecipe.objects.filter(
-                    user=request.user, recipe=recipe
-            ).exists():
-                return Response(
-                    {'detail': 'Рецепт уже в избранном!'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            FavoriteRecipe.objects.create(user=request.user, recipe=recipe)
-            serializer = RecipeMinifiedSerializer(recipe)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        favorite = FavoriteRecipe.objects.filter(
-            user=request.user, recipe=recipe
+        return self._toggle_link(
+            request, pk, FavoriteRecipe, 'favorites_count', {
+                'exists': 'Рецепт уже в избранном!',
+                'absent': 'Рецепта нет в избранном!',
+            }
         )
-        if not favorite.exists():
-            return Response(
-                {'detail': 'Рецепта нет в избранном!'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        favorite.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
         detail=True,
@@ -77,58 +195,246 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[permissions.IsAuthenticated]
     )
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
+        return self._toggle_link(
+            request, pk, ShoppingCart, 'in_carts_count', {
+                'exists': 'Этот рецепт уже добавлен в вашу корзину!',
+                'absent': 'Этот рецепт отсутствует в вашей корзине!',
+            },
+            on_change=ShoppingListItem.objects.change,
+        )
 
+    def _toggle_link(self, request, pk, model, counter, messages,
+                     on_change=None):
+        """Добавляет или удаляет связь одним INSERT или DELETE.
+
+        Ответ определяется числом затронутых строк, поэтому повторный
+        запрос, пришедший одновременно с первым, получает 400, а не
+        ошибку уникальности. on_change(user, recipe_ids, add) вызывается
+        в той же транзакции, если связь изменилась; строка пользователя
+        при этом заблокирована, и его изменения идут по очереди.
+        """
+        if not pk.isdigit():
+            raise Http404
+        recipes = Recipe.objects.filter(pk=pk)
+        owner = User.objects.filter(pk=request.user.pk)
         if request.method == 'POST':
-            if (ShoppingCart.objects.filter
-                (user=request.user,
-                 recipe=recipe
-                 ).exists()):
+            recipe = get_object_or_404(recipes.minified())
+            with transaction.atomic():
+                if on_change:
+                    lock_rows(owner)
+                created = insert_or_ignore(
+                    model(user=request.user, recipe=recipe)
+                )
+                change_counter(recipes, counter, created)
+                if created and on_change:
+                    on_change(request.user, [recipe.pk], True)
+            if not created:
                 return Response(
-                    {'detail': 'Этот рецепт уже добавлен в вашу корзину!'},
+                    {'detail': messages['exists']},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            ShoppingCart.objects.create(user=request.user, recipe=recipe)
+            cache.touch_counters()
             serializer = RecipeMinifiedSerializer(recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        cart_item = ShoppingCart.objects.filter(
-            user=request.user,
-            recipe=recipe
-        )
-        if not cart_item.exists():
+        with transaction.atomic():
+            if on_change:
+                lock_rows(owner)
+            deleted, _ = model.objects.filter(
+                user=request.user, recipe_id=pk
+            ).delete()
+            change_counter(recipes, counter, -deleted)
+            if deleted and on_change:
+                on_change(request.user, [int(pk)], False)
+        if not deleted:
+            if not recipes.exists():
+                raise Http404
             return Response(
-                {'detail': 'Этот рецепт отсутствует в вашей корзине!'},
+                {'detail': messages['absent']},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        cart_item.delete()
+        cache.touch_counters()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='favorite',
+        url_name='bulk_favorite'
+    )
+    def bulk_favorite(self, request):
+        results, _ = self._bulk_links(
+            request, FavoriteRecipe, 'favorites_count', {
+                'exists': 'Рецепт уже в избранном!',
+                'absent': 'Рецепта нет в избранном!',
+            }
+        )
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='shopping_cart',
+        url_name='bulk_shopping_cart'
+    )
+    def bulk_shopping_cart(self, request):
+        results, _ = self._bulk_links(
+            request, ShoppingCart, 'in_carts_count', {
+                'exists': 'Этот рецепт уже добавлен в вашу корзину!',
+                'absent': 'Этот рецепт отсутствует в вашей корзине!',
+            },
+            on_change=ShoppingListItem.objects.change,
+        )
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    def _bulk_links(self, request, model, counter, messages,
+                    on_change=None):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        links = BulkLinks(
+            Recipe.objects.all(),
+            model.objects.filter(user=user),
+            'recipe',
+            counter,
+            {'not_found': 'Рецепт не найден.', **messages},
+            owner=User.objects.filter(pk=user.pk) if on_change else None,
+            on_change=partial(on_change, user) if on_change else None,
+        )
+        results, changed = links.apply(
+            serializer.validated_data['ids'],
+            add=request.method == 'POST',
+            build=lambda pk: model(user=request.user, recipe_id=pk),
+        )
+        if changed:
+            cache.touch_counters()
+        return results, changed
+
     @action(
         detail=False,
         methods=['get'],
-        permission_classes=[permissions.IsAuthenticated]
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+            ShoppingListPDFRenderer,
+        ],
     )
     def download_shopping_cart(self, request):
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__in_shopping_carts__user=request.user
+        renderer = request.accepted_renderer
+        return self._shopping_list_response(renderer, renderer.render_rows(
+            self._shopping_list_rows(request.user).iterator(
+                chunk_size=SHOPPING_LIST_CHUNK_SIZE
+            )
+        ))
+
+    def _shopping_list_rows(self, user):
+        return ShoppingListItem.objects.filter(
+            user=user
         ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(
-            total_amount=Sum('amount')
+            'ingredient__name', 'ingredient__measurement_unit', 'total_amount'
         ).order_by('ingredient__name')
 
-        shopping_list = "Список покупок:\n\n"
-        for idx, item in enumerate(ingredients, 1):
-            shopping_list += (f"{idx}. {item['ingredient__name']} - "
-                              f"{item['total_amount']} "
-                              f"{item['ingredient__measurement_unit']}\n")
-
-        response = HttpResponse(
-            shopping_list,
-            content_type='text/plain; charset=utf-8'
+    def _shopping_list_response(self, renderer, content):
+        response = StreamingHttpResponse(
+            timed_stream(
+                content, SHOPPING_LIST_EXPORT.labels(renderer.format)
+            ),
+            content_type=(
+                renderer.media_type if renderer.render_style == 'binary'
+                else f'{renderer.media_type}; charset=utf-8'
+            )
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename=shopping_list.{renderer.format}'
         )
-        response['Content-Disposition'] = \
-            'attachment; filename=shopping_list.txt'
 
         return response
+
+
+class AsyncRecipeViewSet(AsyncGenericViewSet, RecipeViewSet):
+    """RecipeViewSet для режима ASGI с асинхронными горячими чтениями.
+
+    Списки, карточка рецепта и выгрузка списка покупок ходят в базу через
+    асинхронный ORM и не держат поток воркера, пока ждут ответа базы.
+    Остальные действия — синхронные методы RecipeViewSet, которые adrf
+    выполняет через sync_to_async.
+    """
+
+    async def aget_validators(self, state, last_modified=None):
+        if self.request.user.is_authenticated:
+            return (
+                state, await aget_changes(**self.get_user_changes())
+            ), None
+        return state, last_modified
+
+    async def list(self, request, *args, **kwargs):
+        state = await cache.alist_state(request)
+        etag_source, _ = await self.aget_validators(state)
+        return await aconditional_get(
+            request, lambda: self._abuild_list(request, state), etag_source
+        )
+
+    async def _abuild_list(self, request, state):
+        if request.user.is_authenticated:
+            return Response(await self._alist_data())
+        return Response(await cache.aget_or_build(
+            await cache.alist_key(request, state), self._alist_data
+        ))
+
+    async def _alist_data(self):
+        page = await self.apaginate_queryset(
+            await self.afilter_queryset(self.get_queryset())
+        )
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        ).data
+
+    async def retrieve(self, request, *args, **kwargs):
+        if not kwargs['pk'].isdigit():
+            raise Http404
+        state = await Recipe.objects.filter(pk=kwargs['pk']).aaggregate(
+            **self.get_detail_aggregates()
+        )
+        etag_source, last_modified = await self.aget_validators(
+            state, self.get_last_modified(state)
+        )
+        return await aconditional_get(
+            request,
+            lambda: self._abuild_retrieve(request, int(kwargs['pk'])),
+            etag_source,
+            last_modified,
+        )
+
+    async def _abuild_retrieve(self, request, pk):
+        if request.user.is_authenticated:
+            return Response(await self._aretrieve_data())
+        return Response(await cache.aget_or_build(
+            await cache.adetail_key(request, pk), self._aretrieve_data
+        ))
+
+    async def _aretrieve_data(self):
+        return self.get_serializer(await self.aget_object()).data
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[permissions.IsAuthenticated],
+        renderer_classes=[
+            ShoppingListTextRenderer,
+            ShoppingListCSVRenderer,
+            ShoppingListJSONRenderer,
+            ShoppingListPDFRenderer,
+        ],
+    )
+    async def download_shopping_cart(self, request):
+        # Под ASGI синхронный итератор был бы прочитан в память целиком.
+        renderer = request.accepted_renderer
+        return self._shopping_list_response(renderer, renderer.arender_rows(
+            self._shopping_list_rows(request.user).aiterator(
+                chunk_size=SHOPPING_LIST_CHUNK_SIZE
+            )
+        ))
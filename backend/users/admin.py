@@ -1,12 +1,15 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db import transaction
+
 from .models import User, Follow
 
 
 @admin.register(User)
 class UserAdmin(BaseUserAdmin):
     model = User
-    list_display = ('email', 'username', 'first_name', 'last_name', 'is_staff')
+    list_display = ('email', 'username', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count', 'is_staff')
     list_filter = ('is_staff', 'is_superuser', 'is_active')
     search_fields = ('email', 'username', 'first_name', 'last_name')
     ordering = ('email',)
@@ -30,6 +33,12 @@ class UserAdmin(BaseUserAdmin):
     )
     filter_horizontal = ('groups', 'user_permissions',)
 
+    def delete_model(self, request, obj):
+        User.objects.filter(pk=obj.pk).delete_with_derived()
+
+    def delete_queryset(self, request, queryset):
+        queryset.delete_with_derived()
+
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
@@ -38,3 +47,23 @@ class FollowAdmin(admin.ModelAdmin):
                      'follower__email', 'following__email')
     list_filter = ('followed_at',)
     ordering = ('-followed_at',)
+
+    # Подписку могли перенести на другого автора, пересчитываются оба.
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            User.objects.filter(pk__in={
+                obj.following_id,
+                form.initial.get('following', obj.following_id),
+            }).reconcile_counters()
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            super().delete_model(request, obj)
+            User.objects.filter(pk=obj.following_id).reconcile_counters()
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            authors = set(queryset.values_list('following', flat=True))
+            super().delete_queryset(request, queryset)
+            User.objects.filter(pk__in=authors).reconcile_counters()
@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-18 18:03
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def copy_date_joined(apps, schema_editor):
+    apps.get_model('users', 'User').objects.update(updated_at=F('date_joined'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_alter_user_managers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.RunPython(copy_date_joined, migrations.RunPython.noop),
+    ]
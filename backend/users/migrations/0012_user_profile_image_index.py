@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 20:06
+
+import api.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0011_image_storage'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='profile_image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=api.storage.image_storage, upload_to='user_avatars/', verbose_name='Фотография профиля'),
+        ),
+    ]
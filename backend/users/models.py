@@ -1,8 +1,14 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.contrib.auth.validators import UnicodeUsernameValidator
-from django.db import models
+from django.apps import apps
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Value
 
+from api.bulk import lock_rows
+from api.counters import DerivedFieldsMixin, reconcile_counters, related_count
+from api.storage import image_storage
 from constants import (
     USER_IMAGE_UPLOAD_PATH,
     MAX_USERNAME_LENGTH,
@@ -11,7 +17,63 @@ from constants import (
 )
 
 
-class User(AbstractUser):
+class UserQuerySet(models.QuerySet):
+
+    def with_is_subscribed(self, user):
+        if not user.is_authenticated:
+            return self.annotate(is_subscribed=Value(False))
+        return self.annotate(
+            is_subscribed=Exists(
+                Follow.objects.filter(follower=user, following=OuterRef('pk'))
+            )
+        )
+
+    def delete_with_derived(self):
+        """Удаляет пользователей и правит данные, которые от них зависят.
+
+        Их рецепты удаляются через Recipe.objects.delete_with_derived(),
+        чтобы пересчитать списки покупок тех, у кого они в корзине.
+        Вместе с пользователями каскадно уходят их избранное, корзины и
+        подписки, поэтому счётчики затронутых рецептов и авторов
+        пересчитываются в той же транзакции.
+        """
+        from recipes import cache
+
+        Recipe = apps.get_model('recipes', 'Recipe')
+        pks = list(self.values_list('pk', flat=True))
+        if not pks:
+            return
+        with transaction.atomic():
+            lock_rows(self.model.objects.filter(pk__in=pks))
+            Recipe.objects.filter(author__in=pks).delete_with_derived()
+            recipes = set()
+            for name in ('FavoriteRecipe', 'ShoppingCart'):
+                recipes.update(apps.get_model('recipes', name).objects.filter(
+                    user__in=pks
+                ).values_list('recipe', flat=True))
+            authors = list(Follow.objects.filter(
+                follower__in=pks
+            ).exclude(following__in=pks).values_list('following', flat=True))
+            self.model.objects.filter(pk__in=pks).delete()
+            Recipe.objects.filter(pk__in=recipes).reconcile_counters()
+            self.model.objects.filter(pk__in=authors).reconcile_counters()
+            if recipes:
+                transaction.on_commit(cache.touch_counters)
+
+    def reconcile_counters(self, dry_run=False):
+        return reconcile_counters(self, {
+            'recipes_count': related_count(
+                apps.get_model('recipes', 'Recipe'), 'author'
+            ),
+            'followers_count': related_count(Follow, 'following'),
+        }, dry_run)
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
+class User(DerivedFieldsMixin, AbstractUser):
     email = models.EmailField(
         unique=True,
         max_length=MAX_EMAIL_LENGTH,
@@ -33,10 +95,29 @@ class User(AbstractUser):
     )
     profile_image = models.ImageField(
         upload_to=USER_IMAGE_UPLOAD_PATH,
+        storage=image_storage,
         null=True,
         blank=True,
+        db_index=True,
         verbose_name='Фотография профиля',
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
+
+    objects = UserManager()
+    derived_fields = ('recipes_count', 'followers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -72,6 +153,16 @@ class Follow(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Список подписок'
         ordering = ['-followed_at']
+        indexes = [
+            models.Index(
+                fields=['follower', '-followed_at'],
+                name='follow_follower_followed_idx',
+            ),
+            models.Index(
+                fields=['following', 'follower'],
+                name='follow_following_follower_idx',
+            ),
+        ]
         constraints = [
             models.UniqueConstraint(
                 fields=['follower', 'following'],
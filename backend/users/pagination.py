@@ -1,4 +1,4 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from constants import USER_PAGE_SIZE
 
@@ -6,3 +6,9 @@ from constants import USER_PAGE_SIZE
 class UserPagination(PageNumberPagination):
     page_size = USER_PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class SubscriptionsCursorPagination(CursorPagination):
+    page_size = USER_PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = ('-followed_at', '-id')
@@ -1,11 +1,20 @@
 from django.contrib.auth import get_user_model
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
 
+from api.fields import StreamingBase64ImageField
+
 User = get_user_model()
 
 
+def get_recipes_limit(request):
+    try:
+        recipes_limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return None
+    return recipes_limit if recipes_limit > 0 else None
+
+
 class RegisterUserSerializer(UserCreateSerializer):
     password = serializers.CharField(
         write_only=True,
@@ -34,6 +43,8 @@ class PublicUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return obj.following_set.filter(follower=request.user).exists()
@@ -49,7 +60,7 @@ class PublicUserSerializer(UserSerializer):
 
 
 class SetAvatarSerializer(serializers.ModelSerializer):
-    avatar = Base64ImageField(source='profile_image')
+    avatar = StreamingBase64ImageField(source='profile_image')
 
     class Meta:
         model = User
@@ -58,7 +69,6 @@ class SetAvatarSerializer(serializers.ModelSerializer):
 
 class UserWithRecipesSerializer(PublicUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
@@ -75,19 +85,14 @@ class UserWithRecipesSerializer(PublicUserSerializer):
         )
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        recipes_limit = request.query_params.get('recipes_limit')
-        recipes = obj.recipes.all()
-
-        if recipes_limit:
-            try:
-                recipes = recipes[:int(recipes_limit)]
-            except (TypeError, ValueError):
-                pass
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes_limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipes.all()
+            if recipes_limit:
+                recipes = recipes[:recipes_limit]
         from recipes.serializers import RecipeMinifiedSerializer
         return RecipeMinifiedSerializer(
             recipes, many=True, context=self.context
         ).data
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
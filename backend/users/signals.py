@@ -0,0 +1,26 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api import versions
+
+from .models import User
+
+# Версия списка пользователей для ETag, см. ExtendedUserViewSet.list.
+USERS_VERSION_KEY = 'users:list:version'
+PUBLIC_FIELDS = {
+    'email', 'username', 'first_name', 'last_name', 'profile_image'
+}
+
+
+@receiver(post_save, sender=User)
+def bump_users_version(instance, created, update_fields=None, **kwargs):
+    if (not created and update_fields is not None
+            and not PUBLIC_FIELDS & set(update_fields)):
+        return
+    transaction.on_commit(lambda: versions.bump(USERS_VERSION_KEY))
+
+
+@receiver(post_delete, sender=User)
+def bump_users_version_on_delete(instance, **kwargs):
+    transaction.on_commit(lambda: versions.bump(USERS_VERSION_KEY))
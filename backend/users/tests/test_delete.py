@@ -0,0 +1,140 @@
+from django.contrib import admin
+from django.test import Client
+
+from api.tests.base import PASSWORD, FoodgramTestCase
+from recipes.models import FavoriteRecipe, Recipe, ShoppingCart
+from users.models import Follow, User
+
+
+class UserDeleteCountersTest(FoodgramTestCase):
+    """Удаление пользователя и правки связей в админке не сбивают счётчики.
+
+    Вместе с пользователем каскадно удаляются его избранное, корзина и
+    подписки, после каждого пути счётчики сверяются командой
+    reconcile_counters --verify.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        salt = cls.create_ingredient('соль')
+        cls.author = cls.create_user('author')
+        cls.reader = cls.create_user('reader')
+        cls.fan = cls.create_user('fan')
+        cls.admin = cls.create_user('admin', is_staff=True,
+                                    is_superuser=True)
+        cls.soup = cls.create_recipe(cls.author, {salt: 10})
+        cls.salad = cls.create_recipe(cls.author, {salt: 2})
+        cls.fan_recipe = cls.create_recipe(cls.fan, {salt: 1})
+        for user in (cls.reader, cls.fan):
+            FavoriteRecipe.objects.create(user=user, recipe=cls.soup)
+            ShoppingCart.objects.create(user=user, recipe=cls.soup)
+            Follow.objects.create(follower=user, following=cls.author)
+        FavoriteRecipe.objects.create(user=cls.reader, recipe=cls.fan_recipe)
+        Follow.objects.create(follower=cls.author, following=cls.fan)
+        cls.finish_test_data()
+
+    def setUp(self):
+        super().setUp()
+        self.admin_client = Client()
+        self.admin_client.force_login(self.admin)
+
+    def counters(self, recipe):
+        return Recipe.objects.values_list(
+            'favorites_count', 'in_carts_count'
+        ).get(pk=recipe.pk)
+
+    def followers(self, user):
+        return User.objects.values_list(
+            'followers_count', flat=True
+        ).get(pk=user.pk)
+
+    def test_api_account_delete(self):
+        response = self.client_for(self.reader).delete(
+            f'/api/users/{self.reader.pk}/',
+            {'current_password': PASSWORD},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.counters(self.soup), (1, 1))
+        self.assertEqual(self.counters(self.fan_recipe), (0, 0))
+        self.assertEqual(self.followers(self.author), 1)
+        self.assert_counters_consistent()
+        self.assert_shopping_lists_consistent()
+
+    def test_api_delete_requires_password(self):
+        response = self.client_for(self.reader).delete(
+            f'/api/users/{self.reader.pk}/',
+            {'current_password': 'wrong'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(User.objects.filter(pk=self.reader.pk).exists())
+
+    def test_author_delete_updates_followed_authors(self):
+        response = self.admin_client.post(
+            f'/admin/users/user/{self.author.pk}/delete/', {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.followers(self.fan), 0)
+        self.assert_counters_consistent()
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_bulk_user_delete(self):
+        response = self.admin_client.post('/admin/users/user/', {
+            'action': 'delete_selected',
+            admin.helpers.ACTION_CHECKBOX_NAME: [
+                self.reader.pk, self.fan.pk,
+            ],
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.counters(self.soup), (0, 0))
+        self.assertEqual(self.followers(self.author), 0)
+        self.assert_counters_consistent()
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_favorite_edits(self):
+        favorite = FavoriteRecipe.objects.get(
+            user=self.reader, recipe=self.soup
+        )
+        response = self.admin_client.post(
+            f'/admin/recipes/favoriterecipe/{favorite.pk}/change/',
+            {'user': self.reader.pk, 'recipe': self.salad.pk},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.counters(self.soup), (1, 2))
+        self.assertEqual(self.counters(self.salad), (1, 0))
+        response = self.admin_client.post(
+            f'/admin/recipes/favoriterecipe/{favorite.pk}/delete/',
+            {'post': 'yes'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.counters(self.salad), (0, 0))
+        self.assert_counters_consistent()
+
+    def test_admin_cart_bulk_delete(self):
+        response = self.admin_client.post('/admin/recipes/shoppingcart/', {
+            'action': 'delete_selected',
+            admin.helpers.ACTION_CHECKBOX_NAME: list(
+                ShoppingCart.objects.values_list('pk', flat=True)
+            ),
+            'post': 'yes',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.counters(self.soup), (2, 0))
+        self.assert_counters_consistent()
+        self.assert_shopping_lists_consistent()
+
+    def test_admin_follow_edits(self):
+        response = self.admin_client.post('/admin/users/follow/add/', {
+            'follower': self.reader.pk, 'following': self.fan.pk,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.followers(self.fan), 2)
+        follow = Follow.objects.get(follower=self.fan, following=self.author)
+        response = self.admin_client.post(
+            f'/admin/users/follow/{follow.pk}/delete/', {'post': 'yes'}
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.followers(self.author), 1)
+        self.assert_counters_consistent()
@@ -0,0 +1,107 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.tests.base import FoodgramTestCase
+from users.models import Follow, User
+
+MISSING = 10 ** 6
+
+
+class SubscribeTest(FoodgramTestCase):
+    """Подписки по одной и списком, число подписчиков автора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        salt = cls.create_ingredient('соль')
+        cls.user = cls.create_user('user')
+        cls.authors = [cls.create_user(f'author{idx}') for idx in range(3)]
+        for author in cls.authors:
+            cls.create_recipe(author, {salt: 1})
+        Follow.objects.create(follower=cls.user, following=cls.authors[0])
+        cls.finish_test_data()
+
+    def setUp(self):
+        super().setUp()
+        self.api = self.client_for(self.user)
+
+    def followers(self):
+        return list(User.objects.filter(
+            pk__in=[author.pk for author in self.authors]
+        ).order_by('pk').values_list('followers_count', flat=True))
+
+    def test_toggle(self):
+        url = f'/api/users/{self.authors[1].pk}/subscribe/'
+        response = self.api.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['recipes_count'], 1)
+        self.assertEqual(self.api.post(url).status_code, 400)
+        self.assertEqual(self.followers(), [1, 1, 0])
+        self.assertEqual(self.api.delete(url).status_code, 204)
+        self.assertEqual(self.api.delete(url).status_code, 400)
+        self.assertEqual(self.followers(), [1, 0, 0])
+        self.assert_counters_consistent()
+
+    def test_self_and_missing(self):
+        url = f'/api/users/{self.user.pk}/subscribe/'
+        self.assertEqual(self.api.post(url).status_code, 400)
+        self.assertFalse(Follow.objects.filter(following=self.user).exists())
+        url = f'/api/users/{MISSING}/subscribe/'
+        self.assertEqual(self.api.post(url).status_code, 404)
+        self.assertEqual(self.api.delete(url).status_code, 404)
+
+    def test_bulk(self):
+        first, second, third = (author.pk for author in self.authors)
+        response = self.api.post('/api/users/subscribe/', {
+            'ids': [first, second, self.user.pk, MISSING, second, third],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = [
+            (item['id'], item['status']) for item in response.data['results']
+        ]
+        self.assertEqual(results, [
+            (first, 400), (second, 201), (self.user.pk, 400),
+            (MISSING, 404), (third, 201),
+        ])
+        self.assertEqual(self.followers(), [1, 1, 1])
+        response = self.api.delete('/api/users/subscribe/', {
+            'ids': [third, first],
+        }, format='json')
+        self.assertEqual(
+            [item['status'] for item in response.data['results']], [204, 204]
+        )
+        self.assertEqual(self.followers(), [0, 1, 0])
+        self.assert_counters_consistent()
+
+
+class SubscriptionsTest(FoodgramTestCase):
+    """Список подписок с ограниченным числом рецептов автора."""
+
+    @classmethod
+    def setUpTestData(cls):
+        salt = cls.create_ingredient('соль')
+        cls.user = cls.create_user('user')
+        cls.author = cls.create_user('author')
+        cls.recipes = [
+            cls.create_recipe(cls.author, {salt: 1}) for _ in range(3)
+        ]
+        Follow.objects.create(follower=cls.user, following=cls.author)
+        cls.finish_test_data()
+
+    def test_recipes_limit_loads_only_listed_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_for(self.user).get(
+                '/api/users/subscriptions/', {'recipes_limit': 2}
+            )
+        self.assertEqual(response.status_code, 200)
+        author = response.data['results'][0]
+        self.assertEqual(author['recipes_count'], 3)
+        self.assertEqual(len(author['recipes']), 2)
+        self.assertEqual(
+            set(author['recipes'][0]), {'id', 'name', 'image', 'cooking_time'}
+        )
+        recipe_queries = [
+            query['sql'] for query in queries.captured_queries
+            if 'FROM "recipes_recipe"' in query['sql']
+        ]
+        self.assertEqual(len(recipe_queries), 1)
+        self.assertNotIn('"recipes_recipe"."text"', recipe_queries[0])
@@ -1,25 +1,82 @@
 from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Max, Prefetch, Value
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
 from rest_framework import permissions, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
+from api import versions
+from api.bulk import BulkIdsSerializer, BulkLinks, insert_or_ignore
+from api.conditional import conditional_get, get_changes
+from api.counters import change_counter
+from api.pagination import CursorPaginationMixin
+from recipes.models import Recipe
+
 from .models import Follow
-from .pagination import UserPagination
+from .pagination import SubscriptionsCursorPagination, UserPagination
 from .serializers import (
-    PublicUserSerializer, SetAvatarSerializer, UserWithRecipesSerializer
+    PublicUserSerializer, SetAvatarSerializer, UserWithRecipesSerializer,
+    get_recipes_limit,
 )
+from .signals import USERS_VERSION_KEY
 
 User = get_user_model()
 
 
-class ExtendedUserViewSet(UserViewSet):
+class ExtendedUserViewSet(CursorPaginationMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = PublicUserSerializer
     pagination_class = UserPagination
+    cursor_pagination_class = SubscriptionsCursorPagination
+    cursor_actions = ('subscriptions',)
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
+    def get_validators(self, state, last_modified=None):
+        user = self.request.user
+        if user.is_authenticated:
+            return (state, get_changes(
+                follows=(user.following_set.all(), 'followed_at'),
+            )), None
+        return state, last_modified
+
+    def list(self, request, *args, **kwargs):
+        # ETag строится из версии, которую сдвигают сигналы сохранения и
+        # удаления пользователей, без агрегата по всей таблице.
+        # Last-Modified не отдаётся: удаление пользователя его не меняет.
+        etag_source, _ = self.get_validators(versions.get(USERS_VERSION_KEY))
+        return conditional_get(
+            request,
+            lambda: super(ExtendedUserViewSet, self).list(
+                request, *args, **kwargs
+            ),
+            etag_source,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        user_id = kwargs[self.lookup_field]
+        if not user_id.isdigit():
+            return super().retrieve(request, *args, **kwargs)
+        state = self.get_queryset().filter(pk=user_id).aggregate(
+            total=Count('pk'), updated_at=Max('updated_at')
+        )
+        etag_source, last_modified = self.get_validators(
+            state, state['updated_at']
+        )
+        return conditional_get(
+            request,
+            lambda: super(ExtendedUserViewSet, self).retrieve(
+                request, *args, **kwargs
+            ),
+            etag_source,
+            last_modified,
+        )
+
+    def perform_destroy(self, instance):
+        User.objects.filter(pk=instance.pk).delete_with_derived()
+
     def update_avatar(self, user, data, request):
         if 'avatar' not in data:
             return Response(
@@ -52,7 +109,10 @@ class ExtendedUserViewSet(UserViewSet):
     def delete_avatar(self, user):
         try:
             if user.profile_image:
-                user.profile_image.delete(save=True)
+                # Файл может быть общим с другими строками, его удалит
+                # сигнал, когда на него не останется ссылок.
+                user.profile_image = None
+                user.save(update_fields=['profile_image', 'updated_at'])
             return Response(status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             return Response(
@@ -89,7 +149,18 @@ class ExtendedUserViewSet(UserViewSet):
         permission_classes=[permissions.IsAuthenticated]
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(follower_set__follower=request.user)
+        recipes = Recipe.objects.minified()
+        recipes_limit = get_recipes_limit(request)
+        if recipes_limit:
+            recipes = recipes[:recipes_limit]
+        queryset = User.objects.filter(
+            follower_set__follower=request.user
+        ).annotate(
+            is_subscribed=Value(True),
+            followed_at=F('follower_set__followed_at'),
+        ).order_by('username').prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+        )
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = UserWithRecipesSerializer(
@@ -110,36 +181,85 @@ class ExtendedUserViewSet(UserViewSet):
     )
     def subscribe(self, request, **kwargs):
         author_id = kwargs.get('id') or kwargs.get('pk')
-        author = get_object_or_404(User, id=author_id)
-
-        if request.user == author:
+        if not author_id.isdigit():
+            raise Http404
+        if int(author_id) == request.user.pk:
             return Response(
                 {'detail': 'Нельзя подписаться на самого себя!'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        authors = User.objects.filter(pk=author_id)
 
         if request.method == 'POST':
-            if Follow.objects.filter(
-                    follower=request.user,
-                    following=author
-            ).exists():
+            author = get_object_or_404(authors.only(
+                'id', 'email', 'username', 'first_name', 'last_name',
+                'profile_image', 'recipes_count',
+            ))
+            with transaction.atomic():
+                created = insert_or_ignore(
+                    Follow(follower=request.user, following=author)
+                )
+                change_counter(authors, 'followers_count', created)
+            if not created:
                 return Response(
                     {'detail': 'Вы уже подписаны на этого автора!'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Follow.objects.create(follower=request.user, following=author)
-
+            author.is_subscribed = True
+            recipes = author.recipes.minified()
+            recipes_limit = get_recipes_limit(request)
+            author.limited_recipes = (
+                recipes[:recipes_limit] if recipes_limit else recipes
+            )
             serializer = UserWithRecipesSerializer(
                 author,
                 context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        follow = Follow.objects.filter(follower=request.user, following=author)
-        if not follow.exists():
+        with transaction.atomic():
+            deleted, _ = Follow.objects.filter(
+                follower=request.user, following_id=author_id
+            ).delete()
+            change_counter(authors, 'followers_count', -deleted)
+        if not deleted:
+            if not authors.exists():
+                raise Http404
             return Response(
                 {'detail': 'Вы не подписаны на этого автора!'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        follow.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        permission_classes=[permissions.IsAuthenticated],
+        url_path='subscribe',
+        url_name='bulk_subscribe'
+    )
+    def bulk_subscribe(self, request):
+        serializer = BulkIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        links = BulkLinks(
+            User.objects.all(),
+            Follow.objects.filter(follower=request.user),
+            'following',
+            'followers_count',
+            {
+                'not_found': 'Пользователь не найден.',
+                'exists': 'Вы уже подписаны на этого автора!',
+                'absent': 'Вы не подписаны на этого автора!',
+            },
+            rejected={
+                request.user.pk: 'Нельзя подписаться на самого себя!'
+            },
+        )
+        results, _ = links.apply(
+            serializer.validated_data['ids'],
+            add=request.method == 'POST',
+            build=lambda pk: Follow(
+                follower=request.user, following_id=pk
+            ),
+        )
+        return Response({'results': results}, status=status.HTTP_200_OK)